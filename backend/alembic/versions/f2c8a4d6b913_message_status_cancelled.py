@@ -0,0 +1,29 @@
+"""message status cancelled
+
+Revision ID: f2c8a4d6b913
+Revises: e7b3d9f2a614
+Create Date: 2025-03-10 10:41:27.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8a4d6b913'
+down_revision: Union[str, None] = 'e7b3d9f2a614'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ALTER TYPE ... ADD VALUE không chạy được trong transaction (PostgreSQL < 12)
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE \"MessageStatusEnum\" ADD VALUE IF NOT EXISTS 'CANCELLED'")
+
+
+def downgrade() -> None:
+    # PostgreSQL không xoá được giá trị của enum: chỉ chuyển dữ liệu về ERROR
+    op.execute("UPDATE message SET status = 'ERROR' WHERE status = 'CANCELLED'")
@@ -0,0 +1,90 @@
+"""
+Local stand-in for the NCBI E-utilities used by PubMedClient.
+
+    python example/pubmed_stub_server.py --port 8765 --delay 0.2
+    PUBMED_EUTILS_URL=http://127.0.0.1:8765 poetry run start
+
+esearch.fcgi returns deterministic ids derived from the search term and
+efetch.fcgi returns a batched <pmc-articleset> for the requested ids.
+tests/test_pubmed_client.py runs PubMedClient against it.
+"""
+
+import argparse
+import hashlib
+import textwrap
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+def fake_ids(term: str, retmax: int):
+    digest = hashlib.sha256(term.lower().encode()).hexdigest()
+    return [str(int(chunk, 16)) for chunk in textwrap.wrap(digest, 6)[:retmax]]
+
+
+def esearch_xml(ids):
+    id_list = "".join(f"<Id>{_id}</Id>" for _id in ids)
+    return (
+        "<?xml version='1.0'?><eSearchResult>"
+        f"<Count>{len(ids)}</Count><IdList>{id_list}</IdList></eSearchResult>"
+    )
+
+
+def efetch_xml(ids):
+    articles = "".join(
+        "<article><front>"
+        f"<journal-meta><journal-title>Stub Journal</journal-title></journal-meta>"
+        "<article-meta>"
+        f'<article-id pub-id-type="pmc">{_id}</article-id>'
+        f"<title-group><article-title>Stub article {_id}</article-title>"
+        "</title-group></article-meta></front>"
+        f"<body><p>{escape(f'Body of stub article {_id}.')}</p></body></article>"
+        for _id in ids
+    )
+    return f"<?xml version='1.0'?><pmc-articleset>{articles}</pmc-articleset>"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    requests_served = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.delay)
+        StubHandler.requests_served += 1
+
+        if url.path.endswith("/esearch.fcgi"):
+            body = esearch_xml(
+                fake_ids(params.get("term", ""), int(params.get("retmax", 2)))
+            )
+        elif url.path.endswith("/efetch.fcgi"):
+            body = efetch_xml([i for i in params.get("id", "").split(",") if i])
+        else:
+            self.send_error(404)
+            return
+
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PubMed E-utilities stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"PubMed stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,6 @@ from cachetools import TTLCache, cached
 from llama_index.core import SimpleDirectoryReader, load_index_from_storage
 from llama_index.core.storage import StorageContext
 from llama_index.core.vector_stores.types import VectorStore
-from qdrant_client import QdrantClient
 
 
 @cached(
@@ -49,26 +48,40 @@ def insert_into_index(index, filepath):
         print(f"Error during document insertion: {e}", exc_info=True)
 
 
-def main():
-    from llama_index.core import VectorStoreIndex
-    from llama_index.vector_stores.qdrant import QdrantVectorStore
+async def sync_vector_store(data_dir: str = "./data/", delete_missing: bool = True):
+    """
+    Incrementally sync `data_dir` into the document collection: unchanged files
+    are skipped, modified files only re-embed their changed chunks and removed
+    files are deleted from Qdrant (see IngestionManifest).
+    """
+    from qllm.core.vector_store import (
+        get_async_qdrant_client,
+        get_vector_store,
+        run_init_vector_store,
+    )
+    from qllm.init_setting import init_openai
+    from qllm.services.ingestion_manifest import IngestionManifest, sync_documents
 
-    documents = SimpleDirectoryReader("./data/").load_data()
+    init_openai()
+    documents = SimpleDirectoryReader(data_dir, filename_as_id=True).load_data()
 
-    client = QdrantClient(host="localhost", port=6333)
-    vector_store = QdrantVectorStore(
-        "document",
-        client=client,
-        batch_size=20,
-    )
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    index = VectorStoreIndex.from_documents(
+    # Cùng vector store với API (hybrid, quantization, search params)
+    vector_store = get_vector_store()
+    await run_init_vector_store()
+    plan = await sync_documents(
         documents,
-        storage_context=storage_context,
+        vector_store,
+        IngestionManifest.from_settings(),
+        delete_missing=delete_missing,
     )
-    index.storage_context.persist("/storage")
+    await get_async_qdrant_client().close()
+    print(f"Successfully. {plan.summary()}")
+
+
+def main():
+    import asyncio
 
-    print("Successfully.")
+    asyncio.run(sync_vector_store())
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 import logging
-from typing import Annotated, AsyncGenerator, Generator
+from typing import Annotated, AsyncGenerator, Generator, Optional
 
 from fastapi import Depends
 from llama_index.core.vector_stores.types import VectorStore
@@ -7,8 +7,11 @@ from llama_index.vector_stores.qdrant import QdrantVectorStore
 from qdrant_client import AsyncQdrantClient, QdrantClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from qllm.chat.engine import ChatEngineFactory
+from qllm.chat.engine import get_chat_engine_factory as get_shared_chat_engine_factory
 from qllm.core.database import async_session_maker
 from qllm.core.vector_store import get_vector_store
+from qllm.services import ingestion
 
 logger = logging.getLogger("uvicorn")
 
@@ -20,6 +23,20 @@ def get_qdrant_vector_store() -> VectorStore:
     return get_vector_store()
 
 
+def get_chat_engine_factory() -> Optional[ChatEngineFactory]:
+    """
+    Dependency to provide the process-wide ChatEngineFactory built at startup.
+    """
+    return get_shared_chat_engine_factory()
+
+
+def get_ingestion_pipeline() -> Optional[ingestion.IngestionPipeline]:
+    """
+    Dependency to provide the process-wide IngestionPipeline started at startup.
+    """
+    return ingestion.get_ingestion_pipeline()
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
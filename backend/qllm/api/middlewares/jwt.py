@@ -10,8 +10,10 @@ from sqlalchemy.orm import Session
 
 from qllm.api.deps import get_db
 from qllm.api.schemas.auth import TokenData
+from qllm.core.concurrency import BoundedExecutor
 from qllm.core.config import settings
 from qllm.models.model import User
+from qllm.services.user_cache import get_user_cache
 
 # Cấu hình bảo mật
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -25,6 +27,20 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt tốn ~100-300ms CPU mỗi lần, chạy trên pool riêng để không chặn event loop
+password_hasher = BoundedExecutor(
+    "password_hash", max_concurrency=settings.PASSWORD_HASH_CONCURRENCY
+)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -77,11 +93,20 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
     except JWTError:
         raise credentials_exception
 
+    cache = get_user_cache()
+    if cache is not None:
+        user = await cache.get(token_data.email)
+        if user is not None:
+            return user
+
     result = await db.execute(select(User).where(User.email == token_data.email))
     user = result.scalar_one_or_none()
 
     if user is None:
         raise credentials_exception
+
+    if cache is not None:
+        await cache.set(token_data.email, user)
     return user
 
 
@@ -8,13 +8,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from qllm.api.deps import get_db
 from qllm.api.middlewares.jwt import (
+    aget_password_hash,
+    averify_password,
     create_access_token,
     get_current_active_user,
-    get_password_hash,
-    verify_password,
 )
 from qllm.api.schemas.auth import Token, User, UserCreate, UserLogin
 from qllm.core.config import settings
+from qllm.services.user_cache import get_user_cache
 
 from ...models.model import User as UserModel
 
@@ -33,7 +34,7 @@ async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         )
 
     # Tạo user mới
-    password_hash = get_password_hash(user_data.password)
+    password_hash = await aget_password_hash(user_data.password)
     db_user = UserModel(
         email=user_data.email,
         password_hash=password_hash,
@@ -41,6 +42,10 @@ async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
+
+    user_cache = get_user_cache()
+    if user_cache is not None:
+        await user_cache.invalidate(db_user.email)
     return db_user
 
 
@@ -52,7 +57,7 @@ async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     )
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(user_data.password, user.password_hash):
+    if not user or not await averify_password(user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email hoặc mật khẩu không chính xác",
@@ -1,32 +1,66 @@
+import asyncio
+import base64
 import datetime
 import json
 import logging
-from datetime import UTC, datetime, timezone
-from typing import AsyncGenerator, Optional
-from uuid import UUID
+import time
+from datetime import UTC, datetime, timedelta, timezone
+from typing import AsyncGenerator, Callable, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-from llama_index.core.llms import ChatMessage
-from llama_index.core.vector_stores.types import VectorStore
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from starlette.background import BackgroundTask
 
-from qllm.api.deps import get_db, get_qdrant_vector_store
+from qllm.api.deps import get_chat_engine_factory, get_db
 from qllm.api.middlewares.jwt import CurrentUser
-from qllm.api.schemas.conversation import ConversationRenameRequest
+from qllm.api.schemas.conversation import (
+    ConversationRenameRequest,
+    ConversationWithMessages,
+    MessageSchema,
+)
 from qllm.api.schemas.message import ChatRequest, ChatResponse
-from qllm.chat.engine import get_chat_engine
+from qllm.chat.engine import ChatEngineFactory
+from qllm.chat.history import fetch_recent_messages
+from qllm.core.concurrency import AdmissionController, AdmissionRejected
+from qllm.core.config import settings
+from qllm.core.database import async_session_maker
+from qllm.core.metrics import metrics
 from qllm.models import model
+from qllm.services.message_writer import MessageStream, active_streams, message_writer
 
 logger = logging.getLogger("uvicorn")
 
 conversation_route = r = APIRouter()
 
+# Giới hạn số câu trả lời được sinh cùng lúc (LLM, PubMed, Qdrant, DB pool)
+chat_admission = AdmissionController(
+    "chat_admission",
+    max_concurrency=settings.CHAT_MAX_CONCURRENCY,
+    max_queue=settings.CHAT_MAX_QUEUE,
+    max_queue_per_key=settings.CHAT_MAX_QUEUE_PER_USER,
+    timeout=settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+    retry_after=settings.CHAT_RETRY_AFTER_SECONDS,
+)
+
+streams_cancelled = metrics.counter(
+    "chat_streams_cancelled_total",
+    "Streamed answers cancelled because the client disconnected",
+)
+cancelled_tokens = metrics.counter(
+    "chat_cancelled_tokens_total",
+    "Tokens generated for answers whose client disconnected",
+)
+cancelled_after_seconds = metrics.histogram(
+    "chat_stream_cancelled_after_seconds",
+    "How long an answer had been generating when its client disconnected",
+)
+
 
 async def fetch_conversation(
-    db: AsyncSession, conversation_id: str
+    db: AsyncSession, conversation_id: UUID
 ) -> Optional[model.Conversation]:
     """
     Fetch a conversation
@@ -39,33 +73,44 @@ async def fetch_conversation(
     return conversation
 
 
-async def fetch_conversation_with_messages(
-    db: AsyncSession, conversation_id: str
-) -> Optional[model.Conversation]:
-    """
-    Fetch a conversation with its messages + messagesubprocesses
-    return None if the conversation with the given id does not exist
-    """
-    # Eagerly load required relationships
-    stmt = (
-        select(model.Conversation)
-        .options(
-            joinedload(model.Conversation.messages).subqueryload(
-                model.Message.sub_processes
-            )
-        )
-        .options(
-            joinedload(model.Conversation.conversation_document).subqueryload(
-                model.ConversationDocument.document
-            )
+def encode_cursor(message: model.Message) -> str:
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, message_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
         )
-        .where(model.Conversation.id == conversation_id)
-    )
+        return datetime.fromisoformat(created_at), UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    result = await db.execute(stmt)
-    conversation = result.scalars().first()
 
-    return conversation
+def conversation_response(
+    conversation: model.Conversation,
+    messages: Sequence[model.Message] = (),
+    next_cursor: Optional[str] = None,
+) -> ConversationWithMessages:
+    """
+    Build the response from the columns and a page of messages. Không đọc
+    relationship `Conversation.messages`: lazy load trong AsyncSession sẽ lỗi
+    MissingGreenlet (và sẽ tải toàn bộ message).
+    """
+    return ConversationWithMessages(
+        id=conversation.id,
+        title=conversation.title,
+        user_id=conversation.user_id,
+        document_id=conversation.document_id,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        messages=[
+            MessageSchema.model_validate(message, from_attributes=True)
+            for message in messages
+        ],
+        next_cursor=next_cursor,
+    )
 
 
 @r.get("")
@@ -90,25 +135,50 @@ async def create_chat_conversation(
     db.add(conversation)
     await db.commit()
     await db.refresh(conversation)
-    return await fetch_conversation_with_messages(db, str(conversation.id))
+    return conversation_response(conversation)
 
 
-@r.get("/{conversation_id}")
+@r.get("/{conversation_id}", response_model=ConversationWithMessages)
 async def get_conversation(
-    conversation_id: UUID, current_user: CurrentUser, db: AsyncSession = Depends(get_db)
+    conversation_id: UUID,
+    current_user: CurrentUser,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(
+        default=settings.CONVERSATION_PAGE_SIZE,
+        ge=1,
+        le=settings.CONVERSATION_MAX_PAGE_SIZE,
+    ),
+    before: Optional[str] = None,
 ):
-    """Get all chat histories of a user."""
-    conversations = await fetch_conversation_with_messages(db, str(conversation_id))
+    """
+    Get a conversation with a page of its messages (oldest first).
+    Pass `next_cursor` back as `before` to load older messages.
+    """
+    conversation = await fetch_conversation(db, conversation_id)
 
-    if not conversations:
+    if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    if conversations.user_id != current_user.id:
+    if conversation.user_id != current_user.id:
         raise HTTPException(
             status_code=403, detail="Not authorized to access this conversation"
         )
 
-    return conversations
+    # Lấy thêm một message để biết còn trang cũ hơn hay không
+    messages = await fetch_recent_messages(
+        db,
+        conversation_id,
+        limit=limit + 1,
+        before=decode_cursor(before) if before else None,
+    )
+    has_more = len(messages) > limit
+    messages = messages[-limit:]
+
+    return conversation_response(
+        conversation,
+        messages=messages,
+        next_cursor=encode_cursor(messages[0]) if has_more else None,
+    )
 
 
 @r.delete("/{conversation_id}")
@@ -116,7 +186,7 @@ async def delete_conversation(
     conversation_id: UUID, current_user: CurrentUser, db: AsyncSession = Depends(get_db)
 ):
     """Delete conversation."""
-    conversation = await fetch_conversation(db, str(conversation_id))
+    conversation = await fetch_conversation(db, conversation_id)
 
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation is not found.")
@@ -142,7 +212,7 @@ async def rename_conversation(
 ):
     """Rename a conversation title."""
     # Lấy cuộc hội thoại từ database
-    conversation = await fetch_conversation(db, str(conversation_id))
+    conversation = await fetch_conversation(db, conversation_id)
 
     # Kiểm tra xem cuộc hội thoại có tồn tại không
     if not conversation:
@@ -168,146 +238,306 @@ async def chat_handler(
     payload: ChatRequest,
     current_user: CurrentUser,
     db: AsyncSession = Depends(get_db),
-    vector_store: VectorStore = Depends(get_qdrant_vector_store),
+    chat_engine_factory: Optional[ChatEngineFactory] = Depends(get_chat_engine_factory),
 ):
-    logger.info("Get chat engine with Qdrant vector store")
-    chat_engine = get_chat_engine(vector_store=vector_store)
-    if chat_engine is None:
+    if chat_engine_factory is None:
         raise HTTPException(status_code=500, detail="Chat Engine is not found.")
+    release = await admit_chat(current_user.id)
+    try:
+        chat_engine = chat_engine_factory.create()
 
-    conversation = await fetch_conversation_with_messages(db, str(conversation_id))
+        conversation = await fetch_conversation(db, conversation_id)
 
-    if conversation.user_id != current_user.id:
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        if conversation.user_id != current_user.id:
+            raise HTTPException(
+                status_code=403, detail="Not authorized to access this conversation"
+            )
+
+        chat_history = await chat_engine.load_history(db, conversation)
+        message = payload.message
+        user_message = model.Message(
+            id=uuid4(),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            conversation_id=conversation_id,
+            content=message,
+            role=model.MessageRoleEnum.USER,
+            status=model.MessageStatusEnum.SUCCESS,
+        )
+
+        chat_response = await chat_engine.achat(
+            message, chat_history, user_id=str(current_user.id)
+        )
+
+        final_status = model.MessageStatusEnum.SUCCESS
+        assis_message = model.Message(
+            id=uuid4(),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            conversation_id=conversation_id,
+            content=chat_response.response,
+            role=model.MessageRoleEnum.ASSISTANT,
+            status=final_status,
+        )
+
+        # Ghi qua MessageWriter, chỉ chờ commit khi cấu hình flush_before_done
+        written = await message_writer.insert(user_message, assis_message)
+        if settings.MESSAGE_PERSISTENCE_MODE == "flush_before_done":
+            await written
+
+        # Construct the response
+        response = ChatResponse(
+            conversation_id=str(conversation_id),
+            response=assis_message.content,
+            history=chat_history,
+        )
+        return response
+    finally:
+        release()
+
+
+async def admit_chat(user_id: UUID) -> Callable[[], None]:
+    """
+    Wait for a chat slot (fair across users) and return its release function,
+    or reject with 429 when the queue is full.
+    """
+    try:
+        return await chat_admission.acquire(str(user_id))
+    except AdmissionRejected as e:
         raise HTTPException(
-            status_code=403, detail="Not authorized to access this conversation"
+            status_code=429,
+            detail="Hệ thống đang trả lời nhiều câu hỏi, vui lòng thử lại sau",
+            headers={"Retry-After": str(e.retry_after)},
         )
 
-    histories = conversation.messages
-    message = payload.message
-    user_message = model.Message(
-        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        conversation_id=conversation_id,
-        content=message,
-        role=model.MessageRoleEnum.USER,
-        status=model.MessageStatusEnum.SUCCESS,
-    )
 
-    chat_history = []
-    if histories:
-        chat_history = [
-            ChatMessage(role=message.role, content=message.content)
-            for message in histories
-        ]
-    chat_response = await chat_engine.achat(message, chat_history)
-
-    final_status = model.MessageStatusEnum.SUCCESS
-    assis_message = model.Message(
-        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        conversation_id=conversation_id,
-        content=chat_response.response,
-        role=model.MessageRoleEnum.ASSISTANT,
-        status=final_status,
-    )
+async def produce_tokens(chat_response: AsyncGenerator, queue: asyncio.Queue) -> None:
+    """
+    Run the chat engine in its own task so it can be cancelled as a whole;
+    tokens go to `queue`, followed by None.
+    """
+    try:
+        async for token in chat_response:
+            queue.put_nowait(token)
+    finally:
+        queue.put_nowait(None)
 
-    db.add(user_message)
-    db.add(assis_message)
-    await db.commit()
 
-    # Construct the response
-    response = ChatResponse(
-        conversation_id=str(conversation_id),
-        response=assis_message.content,
-        history=chat_history,
-    )
-    return response
+async def cancel_on_disconnect(
+    request: Request,
+    task: asyncio.Task,
+    poll_seconds: float = settings.STREAM_DISCONNECT_POLL_SECONDS,
+) -> None:
+    """
+    Cancel `task` once the client of `request` has disconnected. Needed because
+    nothing is sent to the client (so no disconnect is noticed) while the
+    agent plans, retrieves or calls tools.
+    """
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling the answer")
+            task.cancel()
+            return
+        await asyncio.sleep(poll_seconds)
 
 
 async def stream_chat_response(
-    conversation_id: UUID,
-    message: str,
+    request: Request,
+    user_message: model.Message,
+    assis_message: model.Message,
     chat_response: AsyncGenerator,
-    db: AsyncSession,
+    release: Optional[Callable[[], None]] = None,
 ) -> AsyncGenerator[str, None]:
     """Stream the chat response and save messages to database"""
-    user_message = model.Message(
-        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        conversation_id=conversation_id,
-        content=message,
-        role=model.MessageRoleEnum.USER,
-        status=model.MessageStatusEnum.SUCCESS,
-    )
-
-    assis_message = model.Message(
-        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
-        conversation_id=conversation_id,
-        content="",
-        role=model.MessageRoleEnum.ASSISTANT,
-        status=model.MessageStatusEnum.PENDING,
-    )
-
-    db.add(user_message)
-    db.add(assis_message)
-    await db.commit()
-
-    full_response = ""
+    # Insert được xếp hàng cho MessageWriter, token đầu tiên không phải chờ commit
+    await message_writer.insert(user_message, assis_message)
+    wait = settings.MESSAGE_PERSISTENCE_MODE == "flush_before_done"
+
+    # Token được gom trong MessageStream và ghi checkpoint ở background
+    stream = MessageStream(assis_message.id, assis_message.conversation_id).start()
+    started = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(produce_tokens(chat_response, queue))
+    watcher = asyncio.create_task(cancel_on_disconnect(request, producer))
     try:
-        async for token in chat_response:
-            full_response += token
+        while (token := await queue.get()) is not None:
+            stream.append(token)
             # Send token and space info as JSON
             response_data = {
                 "p": token,
             }
             yield f"data: {json.dumps(response_data)}\n\n"
 
-        assis_message.content = full_response
-        assis_message.status = model.MessageStatusEnum.SUCCESS
-        await db.commit()
+        await asyncio.wait({producer})
+        if producer.cancelled():
+            # Client đã ngắt kết nối, không còn ai để gửi
+            return
+        producer.result()
 
+        await stream.finish(model.MessageStatusEnum.SUCCESS, wait=wait)
         yield "data: [DONE]\n\n"
     except Exception as e:
-        assis_message.status = model.MessageStatusEnum.ERROR
-        await db.commit()
+        await stream.finish(model.MessageStatusEnum.ERROR)
         yield f"data: Error: {str(e)}\n\n"
+    finally:
+        if release is not None:
+            release()
+        watcher.cancel()
+        # Generator bị đóng (client ngắt kết nối khi đang gửi token): huỷ cả
+        # agent, tool call và LLM call đang chạy
+        if not producer.done():
+            producer.cancel()
+        if not stream.done:
+            streams_cancelled.inc()
+            cancelled_tokens.inc(len(stream.tokens))
+            cancelled_after_seconds.observe(time.perf_counter() - started)
+            # Lưu phần đã sinh với trạng thái CANCELLED
+            stream.finish_in_background(model.MessageStatusEnum.CANCELLED)
 
 
 @r.post("/{conversation_id}/stream")
 async def stream_chat_handler(
     conversation_id: UUID,
     payload: ChatRequest,
+    request: Request,
     current_user: CurrentUser,
     db: AsyncSession = Depends(get_db),
-    vector_store: VectorStore = Depends(get_qdrant_vector_store),
+    chat_engine_factory: Optional[ChatEngineFactory] = Depends(get_chat_engine_factory),
 ):
-    logger.info("Get chat engine with Qdrant vector store")
-    chat_engine = get_chat_engine(vector_store=vector_store)
-    if chat_engine is None:
+    if chat_engine_factory is None:
         raise HTTPException(status_code=500, detail="Chat Engine is not found.")
+    # Slot được giữ tới khi stream kết thúc và trả lại trong stream_chat_response
+    release = await admit_chat(current_user.id)
+    try:
+        chat_engine = chat_engine_factory.create()
 
-    conversation = await fetch_conversation_with_messages(db, str(conversation_id))
+        conversation = await fetch_conversation(db, conversation_id)
 
-    if conversation.user_id != current_user.id:
-        raise HTTPException(
-            status_code=403, detail="Not authorized to access this conversation"
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        if conversation.user_id != current_user.id:
+            raise HTTPException(
+                status_code=403, detail="Not authorized to access this conversation"
+            )
+
+        chat_history = await chat_engine.load_history(db, conversation)
+        message = payload.message
+
+        user_message = model.Message(
+            id=uuid4(),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            conversation_id=conversation_id,
+            content=message,
+            role=model.MessageRoleEnum.USER,
+            status=model.MessageStatusEnum.SUCCESS,
+        )
+        assis_message = model.Message(
+            id=uuid4(),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            conversation_id=conversation_id,
+            content="",
+            role=model.MessageRoleEnum.ASSISTANT,
+            status=model.MessageStatusEnum.PENDING,
         )
 
-    histories = conversation.messages
-    message = payload.message
+        # Lấy streaming response từ chat engine
+        chat_response = chat_engine.astream_chat(
+            message, chat_history, user_id=str(current_user.id)
+        )
+    except BaseException:
+        release()
+        raise
+
+    return StreamingResponse(
+        stream_chat_response(
+            request, user_message, assis_message, chat_response, release
+        ),
+        media_type="text/event-stream",
+        # Client dùng id này để resume nếu bị mất kết nối
+        headers={"X-Message-Id": str(assis_message.id)},
+        # Phòng khi generator không bao giờ được chạy (client đi trước khi
+        # response bắt đầu); release chỉ có tác dụng ở lần gọi đầu tiên
+        background=BackgroundTask(release),
+    )
+
+
+async def resume_chat_response(
+    message_id: UUID, offset: int
+) -> AsyncGenerator[str, None]:
+    """
+    Replay an assistant answer from character `offset` and keep following it
+    until it is finished.
+    """
+    stream = active_streams.get(message_id)
+    if stream is not None:
+        # Câu trả lời đang được sinh trong process này
+        async for chunk in stream.follow(offset):
+            yield f"data: {json.dumps({'p': chunk})}\n\n"
+        status = stream.status
+    else:
+        # Sinh ở worker khác (hoặc worker đã chết): đọc các checkpoint trong DB
+        while True:
+            async with async_session_maker() as db:
+                message = await db.get(model.Message, message_id)
+            content = message.content or ""
+            if content[offset:]:
+                yield f"data: {json.dumps({'p': content[offset:]})}\n\n"
+                offset = len(content)
+
+            status = message.status
+            stale = message.updated_at < datetime.now(timezone.utc).replace(
+                tzinfo=None
+            ) - timedelta(seconds=settings.STREAM_STALE_SECONDS)
+            if status != model.MessageStatusEnum.PENDING or stale:
+                break
+            await asyncio.sleep(settings.STREAM_CHECKPOINT_SECONDS)
+
+    if status == model.MessageStatusEnum.SUCCESS:
+        yield "data: [DONE]\n\n"
+    else:
+        yield "data: Error: The answer was interrupted before it was completed\n\n"
+
 
-    chat_history = []
-    if histories:
-        chat_history = [
-            ChatMessage(role=message.role, content=message.content)
-            for message in histories
-        ]
+@r.get("/{conversation_id}/messages/{message_id}/stream")
+async def resume_stream_handler(
+    conversation_id: UUID,
+    message_id: UUID,
+    current_user: CurrentUser,
+    offset: int = Query(default=0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Resume a streamed answer after a reconnect. `offset` is the number of
+    characters the client already received.
+    """
+    conversation = await fetch_conversation(db, conversation_id)
 
-    # Lấy streaming response từ chat engine
-    chat_response = chat_engine.astream_chat(message, chat_history)
+    # Câu trả lời đang stream có thể chưa được MessageWriter ghi vào DB
+    stream = active_streams.get(message_id)
+    if stream is not None:
+        message_conversation_id = stream.conversation_id
+    else:
+        message = await db.get(model.Message, message_id)
+        if message is not None and message.role != model.MessageRoleEnum.ASSISTANT:
+            raise HTTPException(status_code=400, detail="Only answers can be resumed")
+        message_conversation_id = message.conversation_id if message else None
+
+    if not conversation or message_conversation_id != conversation.id:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    if conversation.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to access this conversation"
+        )
 
     return StreamingResponse(
-        stream_chat_response(conversation_id, payload.message, chat_response, db),
+        resume_chat_response(message_id, offset),
         media_type="text/event-stream",
+        headers={"X-Message-Id": str(message_id)},
     )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, status
+
+from qllm.core.metrics import metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get(
+    "/",
+    tags=["metrics"],
+    summary="In-process metrics snapshot",
+    status_code=status.HTTP_200_OK,
+)
+def get_metrics() -> dict:
+    """
+    Return a snapshot of the counters, gauges and histograms recorded by this worker.
+    """
+    return metrics.snapshot()
@@ -1,8 +1,157 @@
-from fastapi import APIRouter
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from qllm.api.deps import get_db, get_ingestion_pipeline
+from qllm.api.middlewares.jwt import CurrentUser
+from qllm.api.schemas.medical_record import MedicalRecordSchema
+from qllm.core.config import settings
+from qllm.models import model
+from qllm.services.ingestion import IngestionJob, IngestionPipeline, IngestionQueueFull
+
+logger = logging.getLogger("uvicorn")
 
 upload_router = r = APIRouter()
 
+RETRY_AFTER_SECONDS = "30"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _write_chunks(path: Path, chunks: List[bytes], mode: str) -> None:
+    with open(path, mode) as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+async def save_request_body(request: Request, path: Path) -> int:
+    """
+    Stream the request body to `path`, writing about UPLOAD_CHUNK_BYTES at a time
+    on a thread so the file is never held in memory. Returns the size in bytes.
+    """
+    size = 0
+    buffered = 0
+    chunks: List[bytes] = []
+    mode = "wb"
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.UPLOAD_MAX_BYTES:
+            raise UploadTooLarge()
+        chunks.append(chunk)
+        buffered += len(chunk)
+        if buffered >= settings.UPLOAD_CHUNK_BYTES:
+            await asyncio.to_thread(_write_chunks, path, chunks, mode)
+            chunks, buffered, mode = [], 0, "ab"
+    await asyncio.to_thread(_write_chunks, path, chunks, mode)
+    return size
+
+
+def _remove(path: Path) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@r.post("", response_model=MedicalRecordSchema, status_code=202)
+async def post_upload_handler(
+    request: Request,
+    current_user: CurrentUser,
+    file_name: str = Query(..., max_length=255),
+    description: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    pipeline: Optional[IngestionPipeline] = Depends(get_ingestion_pipeline),
+):
+    """
+    Upload a medical record as the raw request body. The file is streamed to
+    disk and queued for indexing; poll GET /upload/{id} for its status.
+    """
+    if pipeline is None:
+        raise HTTPException(status_code=500, detail="Ingestion pipeline is not found.")
+
+    suffix = Path(file_name).suffix.lower()
+    if suffix not in settings.UPLOAD_ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=415, detail=f"Không hỗ trợ định dạng file {suffix or file_name}"
+        )
+
+    # Từ chối sớm khi hàng đợi đầy, trước khi nhận cả file
+    if pipeline.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="Hệ thống đang xử lý nhiều file, vui lòng thử lại sau",
+            headers={"Retry-After": RETRY_AFTER_SECONDS},
+        )
+
+    record_id = uuid4()
+    upload_dir = Path(settings.UPLOAD_DIR) / str(current_user.id)
+    await asyncio.to_thread(upload_dir.mkdir, parents=True, exist_ok=True)
+    file_path = upload_dir / f"{record_id}{suffix}"
+
+    try:
+        size = await save_request_body(request, file_path)
+    except UploadTooLarge:
+        await asyncio.to_thread(_remove, file_path)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File vượt quá {settings.UPLOAD_MAX_BYTES // (1024 * 1024)}MB",
+        )
+    except BaseException:
+        # Client ngắt kết nối giữa chừng
+        await asyncio.to_thread(_remove, file_path)
+        raise
+    if size == 0:
+        await asyncio.to_thread(_remove, file_path)
+        raise HTTPException(status_code=400, detail="File rỗng")
+
+    record = model.MedicalRecord(
+        id=record_id,
+        user_id=current_user.id,
+        file_name=file_name,
+        file_path=str(file_path),
+        description=description,
+        status=model.MedicalRecordStatusEnum.PENDING,
+    )
+    db.add(record)
+    await db.commit()
+    await db.refresh(record)
+
+    try:
+        pipeline.submit(
+            IngestionJob(
+                record_id=record_id,
+                user_id=current_user.id,
+                file_path=str(file_path),
+                file_name=file_name,
+            )
+        )
+    except IngestionQueueFull:
+        await db.delete(record)
+        await db.commit()
+        await asyncio.to_thread(_remove, file_path)
+        raise HTTPException(
+            status_code=503,
+            detail="Hệ thống đang xử lý nhiều file, vui lòng thử lại sau",
+            headers={"Retry-After": RETRY_AFTER_SECONDS},
+        )
+
+    logger.info(f"Queued medical record {record_id} ({size} bytes) for ingestion")
+    return record
+
 
-@r.post("")
-async def post_upload_handler():
-    return "UPLOAD"
+@r.get("/{record_id}", response_model=MedicalRecordSchema)
+async def get_upload_status(
+    record_id: UUID, current_user: CurrentUser, db: AsyncSession = Depends(get_db)
+):
+    record = await db.get(model.MedicalRecord, record_id)
+    if record is None or record.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Medical record not found")
+    return record
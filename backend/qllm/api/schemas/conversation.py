@@ -1,5 +1,39 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
 from pydantic import BaseModel
 
+from qllm.models.model import MessageRoleEnum, MessageStatusEnum
+
 
 class ConversationRenameRequest(BaseModel):
     title: str
+
+
+class MessageSchema(BaseModel):
+    id: UUID
+    conversation_id: UUID
+    content: Optional[str] = None
+    role: MessageRoleEnum
+    status: MessageStatusEnum
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationWithMessages(BaseModel):
+    id: UUID
+    title: str
+    user_id: UUID
+    document_id: Optional[UUID] = None
+    created_at: datetime
+    updated_at: datetime
+    # Một trang message (cũ nhất trước), next_cursor dùng để lấy trang cũ hơn
+    messages: List[MessageSchema] = []
+    next_cursor: Optional[str] = None
+
+    class Config:
+        from_attributes = True
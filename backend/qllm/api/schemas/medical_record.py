@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from qllm.models.model import MedicalRecordStatusEnum
+
+
+class MedicalRecordSchema(BaseModel):
+    id: UUID
+    file_name: str
+    description: Optional[str] = None
+    status: MedicalRecordStatusEnum
+    chunk_count: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
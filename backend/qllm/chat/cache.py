@@ -0,0 +1,180 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.settings import Settings
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+GLOBAL_SCOPE = "global"
+
+# Các tool truy cập dữ liệu riêng của bệnh nhân, câu trả lời dùng các tool này
+# chỉ được cache trong phạm vi của chính user đó.
+PRIVATE_TOOL_NAMES = {"medical_records", "medical_records_engine"}
+
+cache_hits = metrics.counter(
+    "semantic_cache_hits_total", "Chat answers served from the semantic cache"
+)
+cache_misses = metrics.counter(
+    "semantic_cache_misses_total", "Chat requests not found in the semantic cache"
+)
+cache_evictions = metrics.counter(
+    "semantic_cache_evictions_total", "Entries evicted from the semantic cache (LRU)"
+)
+metrics.gauge(
+    "semantic_cache_hit_ratio",
+    "Hits / (hits + misses) of the semantic cache",
+    fn=lambda: cache_hits.value / max(cache_hits.value + cache_misses.value, 1),
+)
+
+
+def user_scope(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    response: str
+    embedding: np.ndarray
+    scope: str
+    expires_at: float
+
+
+class SemanticResponseCache:
+    """
+    LRU + TTL cache of chat answers keyed by the (normalized) query embedding.
+    A lookup is a hit when the cosine similarity with a cached query is above
+    `similarity_threshold`. Entries live either in the global scope or in the
+    scope of a single user.
+    """
+
+    def __init__(
+        self,
+        embed_model: Optional[BaseEmbedding] = None,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+    ):
+        self._embed_model = embed_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._scopes: Dict[str, Dict[str, None]] = {}
+
+        metrics.gauge(
+            "semantic_cache_entries",
+            "Entries currently held by the semantic cache",
+            fn=lambda: len(self._entries),
+        )
+
+    @classmethod
+    def from_settings(cls) -> "SemanticResponseCache":
+        return cls(
+            similarity_threshold=settings.SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        )
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model or Settings.embed_model
+
+    async def embed(self, query: str) -> np.ndarray:
+        embedding = np.asarray(
+            await self.embed_model.aget_query_embedding(query.strip().lower()),
+            dtype=np.float32,
+        )
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def get(
+        self, embedding: np.ndarray, user_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Return the cached answer closest to `embedding` among the global entries
+        and the entries of `user_id`, or None.
+        """
+        scopes = [GLOBAL_SCOPE] + ([user_scope(user_id)] if user_id else [])
+        candidates = list(self._live_entries(scopes))
+        if not candidates:
+            cache_misses.inc()
+            return None
+
+        matrix = np.stack([entry.embedding for _, entry in candidates])
+        similarities = matrix @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            cache_misses.inc()
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        cache_hits.inc()
+        logger.info(
+            f"Semantic cache hit ({similarities[best]:.3f}) for query: {entry.query}"
+        )
+        return entry.response
+
+    def put(
+        self,
+        embedding: np.ndarray,
+        query: str,
+        response: str,
+        scope: str = GLOBAL_SCOPE,
+    ) -> None:
+        key = uuid4().hex
+        self._entries[key] = CacheEntry(
+            query=query,
+            response=response,
+            embedding=embedding,
+            scope=scope,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._scopes.setdefault(scope, {})[key] = None
+
+        while len(self._entries) > self.max_entries:
+            old_key, old_entry = self._entries.popitem(last=False)
+            self._forget(old_key, old_entry.scope)
+            cache_evictions.inc()
+
+    def _live_entries(self, scopes: Iterable[str]) -> List[Tuple[str, CacheEntry]]:
+        now = time.monotonic()
+        live = []
+        for scope in scopes:
+            for key in list(self._scopes.get(scope, {})):
+                entry = self._entries.get(key)
+                if entry is None or entry.expires_at < now:
+                    self._entries.pop(key, None)
+                    self._forget(key, scope)
+                    continue
+                live.append((key, entry))
+        return live
+
+    def _forget(self, key: str, scope: str) -> None:
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._scopes[scope]
+
+
+def resolve_cache_scope(
+    tool_names: Iterable[str], user_id: Optional[str]
+) -> Optional[str]:
+    """
+    Decide where an answer may be cached. Answers that used a private tool are
+    scoped to the user (or not cached at all without a user).
+    """
+    if PRIVATE_TOOL_NAMES.intersection(tool_names):
+        return user_scope(user_id) if user_id else None
+    return GLOBAL_SCOPE
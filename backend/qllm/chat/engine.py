@@ -1,66 +1,239 @@
-import os
-from datetime import UTC, datetime
-from typing import AsyncGenerator, Dict, List, Optional
+import asyncio
+import logging
+import re
+import time
+from typing import AsyncGenerator, List, Optional, Tuple
 
-from llama_index.core.agent import ReActAgent
-from llama_index.core.base.llms.types import ChatMessage
+import numpy as np
+from llama_index.core.agent import AgentRunner, ReActAgent
+from llama_index.core.base.agent.types import BaseAgentWorker
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
 from llama_index.core.callbacks import CallbackManager
-from llama_index.core.query_engine import SubQuestionQueryEngine
+from llama_index.core.chat_engine.types import AgentChatResponse
+from llama_index.core.llms import LLM
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.query_engine import RetrieverQueryEngine, SubQuestionQueryEngine
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.core.settings import Settings
-from llama_index.core.tools import QueryEngineTool, ToolMetadata
+from llama_index.core.tools import QueryEngineTool, ToolMetadata, ToolOutput
 from llama_index.core.vector_stores.types import VectorStore
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from qllm.chat.index import IndexConfig, get_index
+from qllm.chat.cache import SemanticResponseCache, resolve_cache_scope
+from qllm.chat.history import count_tokens, fetch_recent_messages, window_chat_history
+from qllm.chat.index import IndexConfig, UserScopedRetriever, current_user_id, get_index
+from qllm.chat.planner import ParallelPlanner
+from qllm.chat.router import QueryRouter, Route, route_counters, route_seconds
 from qllm.chat.synthesizer import get_medical_response_synth
 from qllm.chat.tools.pubmed_tool import get_tools as get_pubmed_tools
-from qllm.models.model import Document as DocumentSchema
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+from qllm.models import model
 from qllm.prompts import PromptRegistry
 from qllm.services.memory_service import MemoryService
 
+logger = logging.getLogger("uvicorn")
+
+RECORDS_TOOL_NAME = "medical_records"
+
+factory_build_seconds = metrics.gauge(
+    "chat_engine_factory_build_seconds",
+    "Time spent building the shared chat engine resources",
+)
+engine_acquire_seconds = metrics.histogram(
+    "chat_engine_acquire_seconds",
+    "Time spent creating a per-request chat engine from the shared factory",
+)
+engine_construction_saved_seconds = metrics.counter(
+    "chat_engine_construction_saved_seconds",
+    "Construction time avoided by reusing the shared chat engine resources",
+)
+engines_created = metrics.counter(
+    "chat_engines_created_total", "Per-request chat engines handed out"
+)
+summaries_updated = metrics.counter(
+    "conversation_summaries_updated_total",
+    "Times older messages were folded into a conversation summary",
+)
+summary_seconds = metrics.histogram(
+    "conversation_summary_seconds", "Latency of updating a conversation summary"
+)
+records_fallbacks = metrics.counter(
+    "chat_route_records_fallbacks_total",
+    "Record lookups that found no chunks and were answered by the agent",
+)
+
+
+class ConversationSummaryMemory:
+    """
+    Rolling summary memory: the newest messages are sent verbatim, older ones
+    are folded (once) into `Conversation.summary` whenever the history goes over
+    `token_budget`, so each turn's prompt stays bounded.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[LLM] = None,
+        token_budget: int = settings.CHAT_HISTORY_MAX_TOKENS,
+        keep_messages: int = settings.CHAT_SUMMARY_KEEP_MESSAGES,
+        window: int = settings.CHAT_HISTORY_WINDOW,
+    ):
+        self._llm = llm
+        self.token_budget = token_budget
+        self.keep_messages = keep_messages
+        self.window = window
+        self.prompt = PromptRegistry.get("summary")
+
+    @property
+    def llm(self) -> LLM:
+        return self._llm or Settings.llm
+
+    async def aload(
+        self, db: AsyncSession, conversation: model.Conversation
+    ) -> List[ChatMessage]:
+        """
+        Build the chat history for the next turn: the summary (if any) followed
+        by the newest `window` messages that are not summarized yet.
+        """
+        messages = await self._unsummarized_messages(db, conversation)
+        messages = [message for message in messages if message.content]
+
+        summary_tokens = count_tokens(conversation.summary or "")
+        history_tokens = sum(count_tokens(message.content) for message in messages)
+        if (
+            summary_tokens + history_tokens > self.token_budget
+            and len(messages) > self.keep_messages
+        ):
+            # Gộp mọi message chưa tóm tắt (không chỉ trong cửa sổ), mỗi lần
+            # `window` message, để summarized_until không bỏ qua message nào
+            split = len(messages) - self.keep_messages
+            for start in range(0, split, self.window):
+                end = min(start + self.window, split)
+                await self._fold(db, conversation, messages[start:end])
+            messages = messages[split:]
+            summary_tokens = count_tokens(conversation.summary or "")
+
+        window = self.window
+        chat_history = window_chat_history(
+            messages[-window:], max(self.token_budget - summary_tokens, 0)
+        )
+        if conversation.summary:
+            chat_history.insert(
+                0,
+                ChatMessage(
+                    role=MessageRole.SYSTEM,
+                    content=(
+                        "Tóm tắt cuộc trò chuyện trước đó:\n" f"{conversation.summary}"
+                    ),
+                ),
+            )
+        return chat_history
+
+    async def _unsummarized_messages(
+        self, db: AsyncSession, conversation: model.Conversation
+    ) -> List[model.Message]:
+        """
+        Every message after `summarized_until` (oldest first), fetched in pages
+        of `window` messages.
+        """
+        pages: List[List[model.Message]] = []
+        before = None
+        while True:
+            page = await fetch_recent_messages(
+                db,
+                conversation.id,
+                limit=self.window,
+                before=before,
+                after=conversation.summarized_until,
+            )
+            pages.append(page)
+            if len(page) < self.window:
+                break
+            before = (page[0].created_at, page[0].id)
+        return [message for page in reversed(pages) for message in page]
+
+    async def _fold(
+        self,
+        db: AsyncSession,
+        conversation: model.Conversation,
+        messages: List[model.Message],
+    ) -> None:
+        """
+        Gộp các message cũ vào bản tóm tắt và lưu lại cùng Conversation.
+        """
+        transcript = "\n".join(
+            f"{message.role.value}: {message.content}" for message in messages
+        )
+        with summary_seconds.time():
+            response = await self.llm.acomplete(
+                self.prompt.format(
+                    summary=conversation.summary or "(chưa có)", messages=transcript
+                )
+            )
+
+        conversation.summary = response.text.strip()
+        conversation.summarized_until = messages[-1].created_at
+        await db.commit()
+        summaries_updated.inc()
+        logger.info(
+            f"Folded {len(messages)} messages into the summary of conversation "
+            f"{conversation.id}"
+        )
+
+
+class ChatEngineFactory:
+    """
+    Build the immutable parts of the chat engine once (prompt, synthesizer, index,
+    query engine tools, planner or agent worker) and hand out cheap per-request
+    ChatEngines. The SubQuestionQueryEngines and the ReAct agent are only built
+    in CHAT_ENGINE_MODE=agent.
+    """
 
-class ChatEngine:
     def __init__(
         self,
         vector_store: Optional[VectorStore] = None,
-        db: Optional[AsyncSession] = None,
-        documents: Optional[List[DocumentSchema]] = None,
         filters=None,
         params=None,
         event_handlers=None,
     ):
+        start = time.perf_counter()
+
+        self.vector_store = vector_store
+
         # Lấy system prompt từ registry
         self.system_prompt = PromptRegistry.get("system").format()
-        self.TOP_K = int(os.getenv("TOP_K", "0"))
 
         # Khởi tạo các components
         self.callback_manager = CallbackManager(handlers=event_handlers)
 
-        if db and vector_store:
-            self.memory_service = MemoryService(
-                db=db, vector_store=vector_store, embed_model=Settings.embed_model
-            )
-
         # Khởi tạo response synthesizer
-        # self.response_synth = get_medical_response_synth(documents or [])
         self.response_synth = get_medical_response_synth()
+        self.stream_response_synth = get_medical_response_synth(streaming=True)
 
         # Khởi tạo vector store query engine
         vector_query_tools = []
+        self.records_query_engine: Optional[RetrieverQueryEngine] = None
         if vector_store is not None:
             index_config = IndexConfig(
                 callback_managers=self.callback_manager, **(params or {})
             )
             index = get_index(vector_store, index_config)
             if index is not None:
-                medical_records_engine = index.as_query_engine(
-                    filters=filters,
+                # Engine dùng chung cho mọi request nên bộ lọc theo bệnh nhân
+                # được áp dụng lúc retrieve, không phải lúc khởi tạo
+                medical_records_engine = RetrieverQueryEngine.from_args(
+                    UserScopedRetriever(
+                        index, filters=filters, **index_config.retriever_kwargs()
+                    ),
+                    node_postprocessors=index_config.node_postprocessors(),
+                    callback_manager=self.callback_manager,
                 )
+                self.records_query_engine = medical_records_engine
                 vector_query_tools.append(
                     QueryEngineTool(
                         query_engine=medical_records_engine,
                         metadata=ToolMetadata(
-                            name="medical_records",
+                            name=RECORDS_TOOL_NAME,
                             description="Công cụ tìm kiếm trong hồ sơ y tế của bệnh nhân. Sử dụng khi cần tra cứu thông tin về bệnh án, kết quả xét nghiệm, và lịch sử điều trị.",
                         ),
                     )
@@ -69,48 +242,136 @@ class ChatEngine:
         # Khởi tạo PubMed tools
         pubmed_tools = get_pubmed_tools()
 
-        # Tạo SubQuestionQueryEngine cho medical records
-        self.medical_records_engine = SubQuestionQueryEngine.from_defaults(
-            query_engine_tools=vector_query_tools,
-            response_synthesizer=self.response_synth,
-            verbose=True,
-            use_async=True,
-        )
+        self.planner: Optional[ParallelPlanner] = None
+        self.tools: List[QueryEngineTool] = []
+        self.agent_worker: Optional[BaseAgentWorker] = None
+        if settings.CHAT_ENGINE_MODE == "planner":
+            # Một lần lập kế hoạch cho mọi nguồn thay vì ReAct agent lồng
+            # SubQuestionQueryEngine của từng nguồn
+            self.planner = ParallelPlanner(
+                vector_query_tools + pubmed_tools, self.system_prompt
+            )
+        else:
+            # Chế độ agent: ReAct agent trên SubQuestionQueryEngine của từng nguồn.
+            # Tạo SubQuestionQueryEngine cho medical records
+            self.medical_records_engine = SubQuestionQueryEngine.from_defaults(
+                query_engine_tools=vector_query_tools,
+                response_synthesizer=self.response_synth,
+                verbose=True,
+                use_async=True,
+            )
 
-        # Tạo SubQuestionQueryEngine cho PubMed
-        self.pubmed_engine = SubQuestionQueryEngine.from_defaults(
-            query_engine_tools=pubmed_tools,
-            response_synthesizer=self.response_synth,
-            verbose=True,
-            use_async=True,
-        )
+            # Tạo SubQuestionQueryEngine cho PubMed
+            self.pubmed_engine = SubQuestionQueryEngine.from_defaults(
+                query_engine_tools=pubmed_tools,
+                response_synthesizer=self.response_synth,
+                verbose=True,
+                use_async=True,
+            )
 
-        # Tạo top-level tools cho ReActAgent
-        self.tools = [
-            QueryEngineTool(
-                query_engine=self.medical_records_engine,
-                metadata=ToolMetadata(
-                    name="medical_records_engine",
-                    description="Công cụ truy vấn hồ sơ y tế. Sử dụng khi cần tìm kiếm thông tin từ hồ sơ bệnh án của bệnh nhân.",
+            # Tạo top-level tools cho agent
+            self.tools = [
+                QueryEngineTool(
+                    query_engine=self.medical_records_engine,
+                    metadata=ToolMetadata(
+                        name="medical_records_engine",
+                        description="Công cụ truy vấn hồ sơ y tế. Sử dụng khi cần tìm kiếm thông tin từ hồ sơ bệnh án của bệnh nhân.",
+                    ),
                 ),
-            ),
-            QueryEngineTool(
-                query_engine=self.pubmed_engine,
-                metadata=ToolMetadata(
-                    name="pubmed_engine",
-                    description="Công cụ tìm kiếm thông tin y khoa từ PubMed. Sử dụng khi cần tra cứu thông tin về bệnh lý, phương pháp điều trị, và nghiên cứu y học.",
+                QueryEngineTool(
+                    query_engine=self.pubmed_engine,
+                    metadata=ToolMetadata(
+                        name="pubmed_engine",
+                        description="Công cụ tìm kiếm thông tin y khoa từ PubMed. Sử dụng khi cần tra cứu thông tin về bệnh lý, phương pháp điều trị, và nghiên cứu y học.",
+                    ),
                 ),
-            ),
-        ]
+            ]
+
+            # Agent worker không giữ state của cuộc hội thoại nên có thể dùng chung,
+            # mỗi request chỉ cần một AgentRunner với memory riêng.
+            self.agent_worker = ReActAgent.from_llm(
+                llm=Settings.llm,
+                tools=self.tools,
+                callback_manager=self.callback_manager,
+                system_prompt=self.system_prompt,
+                verbose=True,
+            ).agent_worker
+
+        self.response_cache: Optional[SemanticResponseCache] = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            self.response_cache = SemanticResponseCache.from_settings()
+
+        self.summary_memory: Optional[ConversationSummaryMemory] = None
+        if settings.CHAT_SUMMARY_ENABLED:
+            self.summary_memory = ConversationSummaryMemory()
+
+        self.router: Optional[QueryRouter] = None
+        if settings.ROUTER_ENABLED:
+            self.router = QueryRouter()
+
+        self.build_seconds = time.perf_counter() - start
+        factory_build_seconds.set(self.build_seconds)
+        logger.info(f"Chat engine factory built in {self.build_seconds:.3f}s")
+
+    def create(self, db: Optional[AsyncSession] = None) -> "ChatEngine":
+        """
+        Create a per-request ChatEngine over the shared tools.
+        """
+        with engine_acquire_seconds.time():
+            agent = None
+            if self.agent_worker is not None:
+                memory = ChatMemoryBuffer.from_defaults(llm=Settings.llm)
+                agent = AgentRunner(
+                    agent_worker=self.agent_worker,
+                    memory=memory,
+                    llm=Settings.llm,
+                    verbose=True,
+                )
+            chat_engine = ChatEngine(factory=self, agent=agent, db=db)
+
+        engines_created.inc()
+        engine_construction_saved_seconds.inc(self.build_seconds)
+        return chat_engine
+
+
+class ChatEngine:
+    """
+    Per-request chat state (agent memory, chat history) on top of a shared
+    ChatEngineFactory.
+    """
+
+    def __init__(
+        self,
+        factory: ChatEngineFactory,
+        agent: Optional[AgentRunner],
+        db: Optional[AsyncSession] = None,
+    ):
+        self.factory = factory
+        self.agent = agent
+        self.system_prompt = factory.system_prompt
+        self.tools = factory.tools
+        self.response_cache = factory.response_cache
+        self.summary_memory = factory.summary_memory
+        self.router = factory.router
+        self.planner = factory.planner
+        self.records_query_engine = factory.records_query_engine
+
+        if db and factory.vector_store:
+            self.memory_service = MemoryService(db=db, embed_model=Settings.embed_model)
 
-        # Khởi tạo ReActAgent
-        self.agent = ReActAgent.from_llm(
-            llm=Settings.llm,
-            tools=self.tools,
-            callback_manager=self.callback_manager,
-            system_prompt=self.system_prompt,
-            verbose=True,
+    async def load_history(
+        self, db: AsyncSession, conversation: model.Conversation
+    ) -> List[ChatMessage]:
+        """
+        Lịch sử trò chuyện gửi cho agent, giới hạn theo CHAT_HISTORY_MAX_TOKENS.
+        """
+        if self.summary_memory is not None:
+            return await self.summary_memory.aload(db, conversation)
+
+        messages = await fetch_recent_messages(
+            db, conversation.id, limit=settings.CHAT_HISTORY_WINDOW
         )
+        return window_chat_history(messages, settings.CHAT_HISTORY_MAX_TOKENS)
 
     async def achat(
         self,
@@ -121,29 +382,231 @@ class ChatEngine:
         """
         Xử lý tin nhắn của người dùng với query transform và memory.
         """
-        # Transform query thành các subqueries
+        # Mỗi request chạy trong task riêng nên giá trị không lẫn giữa các request
+        current_user_id.set(user_id)
+        embedding = await self._cache_embedding(message, chat_history)
+        if embedding is not None:
+            cached = self.response_cache.get(embedding, user_id)
+            if cached is not None:
+                return AgentChatResponse(response=cached)
 
-        final_response = await self.agent.achat(message, chat_history)
+        route, query_bundle, nodes = await self._route(message, chat_history, embedding)
+        with route_seconds[route].time():
+            if route == Route.AGENT and self.planner is not None:
+                final_response = await self.planner.achat(message, chat_history)
+            elif route == Route.AGENT:
+                final_response = await self.agent.achat(message, chat_history)
+            elif route == Route.GREETING:
+                response = await Settings.llm.achat(
+                    self._direct_messages(message, chat_history)
+                )
+                final_response = AgentChatResponse(
+                    response=response.message.content or ""
+                )
+            else:
+                response = await self.factory.response_synth.asynthesize(
+                    query_bundle, nodes
+                )
+                final_response = AgentChatResponse(
+                    response=str(response),
+                    sources=[self._records_source(query_bundle, response)],
+                    source_nodes=response.source_nodes,
+                )
 
+        if embedding is not None:
+            self._cache_response(
+                embedding,
+                message,
+                final_response.response,
+                [source.tool_name for source in final_response.sources],
+                user_id,
+            )
         return final_response
 
     async def astream_chat(
         self,
         message: str,
         chat_history: Optional[List[ChatMessage]] = None,
+        user_id: Optional[str] = None,
     ) -> AsyncGenerator[str, None]:
         """
         Phiên bản streaming của phương thức chat.
         Trả về một async generator để stream từng token của response.
         """
-        response_stream = await self.agent.astream_chat(message, chat_history)
+        # Mỗi request chạy trong task riêng nên giá trị không lẫn giữa các request
+        current_user_id.set(user_id)
+        embedding = await self._cache_embedding(message, chat_history)
+        if embedding is not None:
+            cached = self.response_cache.get(embedding, user_id)
+            if cached is not None:
+                # Phát lại câu trả lời đã cache theo từng token
+                for token in re.findall(r"\S+\s*|\s+", cached):
+                    yield token
+                return
+
+        route, query_bundle, nodes = await self._route(message, chat_history, embedding)
+        tokens = []
+        tool_names: List[str] = []
+        background: Optional[asyncio.Task] = None
+        # Thời gian của route tính tới token cuối cùng
+        with route_seconds[route].time():
+            if route == Route.AGENT and self.planner is not None:
+                outputs = await self.planner.aprepare(message, chat_history)
+                token_gen = self.planner.astream_synthesize(
+                    message, chat_history, outputs
+                )
+                tool_names = [output.tool_name for output in outputs]
+            elif route == Route.AGENT:
+                response_stream = await self.agent.astream_chat(message, chat_history)
+                token_gen = response_stream.async_response_gen()
+                # ReAct agent sinh câu trả lời trong một task riêng
+                background = response_stream.awrite_response_to_history_task
+            elif route == Route.GREETING:
+                token_gen = self._direct_stream(message, chat_history)
+            else:
+                response = await self.factory.stream_response_synth.asynthesize(
+                    query_bundle, nodes
+                )
+                token_gen = response.async_response_gen()
+                tool_names.append(RECORDS_TOOL_NAME)
+
+            try:
+                async for token in token_gen:
+                    tokens.append(token)
+                    yield token
+            finally:
+                # Request bị huỷ (client ngắt kết nối): dừng cả task của agent
+                if background is not None and not background.done():
+                    background.cancel()
+
+        if route == Route.AGENT and self.planner is None:
+            tool_names = [source.tool_name for source in response_stream.sources]
+        if embedding is not None:
+            self._cache_response(
+                embedding, message, "".join(tokens), tool_names, user_id
+            )
+
+    async def _route(
+        self,
+        message: str,
+        chat_history: Optional[List[ChatMessage]],
+        embedding: Optional[np.ndarray],
+    ) -> Tuple[Route, Optional[QueryBundle], List[NodeWithScore]]:
+        """
+        Route of the message, with the retrieved record chunks for a lookup.
+        A lookup that finds no chunks goes to the agent: the records QA prompt
+        forbids prior knowledge and could only answer "Empty Response".
+        """
+        route = Route.AGENT
+        if self.router is not None:
+            route = await self.router.route(message, chat_history, embedding)
+        if (
+            route in (Route.LOOKUP, Route.FOLLOW_UP)
+            and self.records_query_engine is None
+        ):
+            # Không có vector store thì chỉ agent (PubMed) trả lời được
+            route = Route.AGENT
+
+        query_bundle = None
+        nodes: List[NodeWithScore] = []
+        if route in (Route.LOOKUP, Route.FOLLOW_UP):
+            query_bundle = self._records_query(route, message, chat_history)
+            nodes = await self.records_query_engine.aretrieve(query_bundle)
+            if not nodes:
+                records_fallbacks.inc()
+                route = Route.AGENT
+        route_counters[route].inc()
+        return route, query_bundle, nodes
+
+    def _direct_messages(
+        self, message: str, chat_history: Optional[List[ChatMessage]]
+    ) -> List[ChatMessage]:
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt),
+            *(chat_history or []),
+            ChatMessage(role=MessageRole.USER, content=message),
+        ]
+
+    async def _direct_stream(
+        self, message: str, chat_history: Optional[List[ChatMessage]]
+    ) -> AsyncGenerator[str, None]:
+        response_gen = await Settings.llm.astream_chat(
+            self._direct_messages(message, chat_history)
+        )
+        async for response in response_gen:
+            yield response.delta or ""
+
+    @staticmethod
+    def _records_query(
+        route: Route, message: str, chat_history: Optional[List[ChatMessage]]
+    ) -> QueryBundle:
+        if route == Route.FOLLOW_UP:
+            previous = next(
+                (
+                    m.content
+                    for m in reversed(chat_history or [])
+                    if m.role == MessageRole.USER
+                ),
+                None,
+            )
+            if previous:
+                # Câu hỏi nối tiếp ("còn liều dùng thì sao?") cần ngữ cảnh của
+                # câu hỏi trước để truy xuất đúng
+                return QueryBundle(f"Câu hỏi trước: {previous}\nCâu hỏi: {message}")
+        return QueryBundle(message)
+
+    @staticmethod
+    def _records_source(query_bundle: QueryBundle, response) -> ToolOutput:
+        # Nguồn mang tên tool hồ sơ để semantic cache giới hạn theo user
+        return ToolOutput(
+            content=str(response),
+            tool_name=RECORDS_TOOL_NAME,
+            raw_input={"input": query_bundle.query_str},
+            raw_output=response,
+        )
+
+    async def _cache_embedding(
+        self, message: str, chat_history: Optional[List[ChatMessage]]
+    ):
+        # Câu hỏi nối tiếp phụ thuộc vào lịch sử trò chuyện nên không dùng cache
+        if self.response_cache is None or chat_history:
+            return None
+        try:
+            return await self.response_cache.embed(message)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled for this request: {e}")
+            return None
+
+    def _cache_response(self, embedding, message, answer, tool_names, user_id) -> None:
+        if not answer:
+            return
+        scope = resolve_cache_scope(tool_names, user_id)
+        if scope is not None:
+            self.response_cache.put(embedding, message, answer, scope)
+
+
+chat_engine_factory: Optional[ChatEngineFactory] = None
+
+
+def init_chat_engine_factory(**kwargs) -> ChatEngineFactory:
+    """
+    Build the process-wide ChatEngineFactory. Called once from the app lifespan.
+    """
+    global chat_engine_factory
+    chat_engine_factory = ChatEngineFactory(**kwargs)
+    return chat_engine_factory
+
 
-        async for response in response_stream.async_response_gen():
-            yield response
+def get_chat_engine_factory() -> Optional[ChatEngineFactory]:
+    return chat_engine_factory
 
 
-def get_chat_engine(**kwargs):
+def get_chat_engine(db: Optional[AsyncSession] = None, **kwargs) -> ChatEngine:
     """
     Factory function để tạo ChatEngine.
+    Reuses the process-wide factory when it exists, otherwise builds one.
     """
-    return ChatEngine(**kwargs)
+    factory = chat_engine_factory
+    if factory is None or kwargs:
+        factory = ChatEngineFactory(**kwargs)
+    return factory.create(db=db)
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.settings import Settings
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from qllm.models import model
+
+
+async def fetch_recent_messages(
+    db: AsyncSession,
+    conversation_id: UUID,
+    limit: int,
+    before: Optional[Tuple[datetime, UUID]] = None,
+    after: Optional[datetime] = None,
+) -> List[model.Message]:
+    """
+    Fetch the `limit` most recent messages of a conversation (oldest first),
+    optionally only those older than the `before` (created_at, id) cursor
+    and/or created after `after`.
+    """
+    stmt = select(model.Message).where(model.Message.conversation_id == conversation_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(model.Message.created_at, model.Message.id) < before)
+    if after is not None:
+        stmt = stmt.where(model.Message.created_at > after)
+    stmt = stmt.order_by(
+        model.Message.created_at.desc(), model.Message.id.desc()
+    ).limit(limit)
+
+    messages = list((await db.scalars(stmt)).all())
+    messages.reverse()
+    return messages
+
+
+def count_tokens(text: str) -> int:
+    return len(Settings.tokenizer(text))
+
+
+def window_chat_history(
+    messages: Sequence[model.Message], max_tokens: int
+) -> List[ChatMessage]:
+    """
+    Convert the most recent messages (oldest first) into ChatMessages, keeping
+    only the newest ones that fit in `max_tokens`.
+    """
+    chat_history = []
+    used_tokens = 0
+    for message in reversed(messages):
+        # Bỏ qua các message chưa có nội dung (PENDING / ERROR)
+        if not message.content:
+            continue
+
+        used_tokens += count_tokens(message.content)
+        if used_tokens > max_tokens:
+            break
+        chat_history.append(ChatMessage(role=message.role, content=message.content))
+
+    chat_history.reverse()
+    return chat_history
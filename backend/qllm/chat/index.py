@@ -1,21 +1,37 @@
 import logging
 import os
+from contextvars import ContextVar
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from cachetools import TTLCache, cached
 from fsspec.asyn import AsyncFileSystem
 from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
 from llama_index.core.callbacks import CallbackManager
-from llama_index.core.vector_stores.types import VectorStore
+from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStore,
+)
 from pydantic import BaseModel, Field
 
+from qllm.chat.postprocessor import ContextBudgetPostprocessor
+from qllm.chat.rerank import CrossEncoderRerank
 from qllm.core.config import settings
+from qllm.services.qdrant_service import TENANT_FIELD
 
 logger = logging.getLogger("uvicorn")
 
 STORAGE_DIR: str = settings.STORAGE_DIR or "storage"
 
+# Bệnh nhân của request hiện tại, ChatEngine đặt giá trị trước khi chạy agent
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
 
 class IndexConfig(BaseModel):
     persist_dir: Optional[str] = Field(
@@ -26,6 +42,57 @@ class IndexConfig(BaseModel):
         default=None,
     )
 
+    similarity_top_k: int = Field(default=settings.TOP_K, gt=0)
+    candidate_pool: int = Field(default=settings.RETRIEVAL_CANDIDATE_POOL, gt=0)
+    score_cutoff: Optional[float] = Field(default=settings.RETRIEVAL_SCORE_CUTOFF)
+    mmr: bool = Field(default=settings.RETRIEVAL_MMR_ENABLED)
+    mmr_threshold: float = Field(
+        default=settings.RETRIEVAL_MMR_THRESHOLD, ge=0.0, le=1.0
+    )
+    max_context_tokens: Optional[int] = Field(
+        default=settings.RETRIEVAL_MAX_CONTEXT_TOKENS
+    )
+    hybrid: bool = Field(default=settings.QDRANT_HYBRID_ENABLED)
+    rerank: bool = Field(default=settings.RERANK_ENABLED)
+
+    def retriever_kwargs(self) -> Dict[str, Any]:
+        """
+        Arguments of `index.as_retriever` for this configuration.
+        """
+        # Khi rerank, retriever lấy cả pool rồi cross-encoder chọn top-k
+        top_k = self.candidate_pool if self.rerank else self.similarity_top_k
+        kwargs: Dict[str, Any] = {"similarity_top_k": top_k}
+        if self.mmr:
+            # Vector store tự lấy ứng viên bằng hybrid nếu collection hỗ trợ
+            kwargs["vector_store_query_mode"] = "mmr"
+            kwargs["vector_store_kwargs"] = {
+                "mmr_threshold": self.mmr_threshold,
+                "mmr_candidates": max(self.candidate_pool, top_k),
+            }
+        elif self.hybrid:
+            # Mã ICD, tên thuốc, chỉ số xét nghiệm cần khớp từ khoá (BM25)
+            kwargs["vector_store_query_mode"] = "hybrid"
+        if self.hybrid:
+            kwargs["sparse_top_k"] = self.candidate_pool
+        return kwargs
+
+    def node_postprocessors(self) -> List[BaseNodePostprocessor]:
+        """
+        Rerank, score cutoff, then the context token budget.
+        """
+        postprocessors: List[BaseNodePostprocessor] = []
+        if self.rerank:
+            postprocessors.append(CrossEncoderRerank(top_n=self.similarity_top_k))
+        if self.score_cutoff is not None:
+            postprocessors.append(
+                SimilarityPostprocessor(similarity_cutoff=self.score_cutoff)
+            )
+        if self.max_context_tokens:
+            postprocessors.append(
+                ContextBudgetPostprocessor(max_tokens=self.max_context_tokens)
+            )
+        return postprocessors
+
 
 def get_index(
     vector_store: Optional[VectorStore] = None,
@@ -61,3 +128,46 @@ def get_storage_context(
 ):
     logger.info("Creating new storage context.")
     return StorageContext.from_defaults(vector_store=vector_store)
+
+
+class UserScopedRetriever(BaseRetriever):
+    """
+    Retrieve only the nodes of the user in `current_user_id`.
+
+    The filter on the tenant field is pushed down to the vector store, where it
+    is served by the keyword payload index. Without a current user nothing is
+    returned, so a shared engine never leaks another patient's records.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        filters: Optional[MetadataFilters] = None,
+        **retriever_kwargs,
+    ):
+        self._index = index
+        self._filters = filters
+        self._retriever_kwargs = retriever_kwargs
+        super().__init__(callback_manager=index._callback_manager)
+
+    def _scoped_retriever(self) -> Optional[BaseRetriever]:
+        user_id = current_user_id.get()
+        if user_id is None:
+            logger.warning("No current user, skipping medical records retrieval.")
+            return None
+
+        user_filter = MetadataFilter(
+            key=TENANT_FIELD, value=str(user_id), operator=FilterOperator.EQ
+        )
+        filters = MetadataFilters(filters=[user_filter])
+        if self._filters is not None:
+            filters.filters.append(self._filters)
+        return self._index.as_retriever(filters=filters, **self._retriever_kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        retriever = self._scoped_retriever()
+        return retriever.retrieve(query_bundle) if retriever else []
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        retriever = self._scoped_retriever()
+        return await retriever.aretrieve(query_bundle) if retriever else []
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import AsyncGenerator, List, Optional
+
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.chat_engine.types import AgentChatResponse
+from llama_index.core.llms import LLM
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import MetadataMode, QueryBundle
+from llama_index.core.settings import Settings
+from llama_index.core.tools import QueryEngineTool, ToolOutput
+
+from qllm.chat.query_transform import QueryTransformer, SubQuery
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+from qllm.prompts import PromptRegistry
+
+logger = logging.getLogger("uvicorn")
+
+plan_seconds = metrics.histogram(
+    "planner_plan_seconds", "Latency of the planning LLM call"
+)
+plan_subqueries = metrics.histogram(
+    "planner_subqueries",
+    "Sub-queries planned per message",
+    buckets=(1, 2, 3, 4, 6, 8),
+)
+execute_seconds = metrics.histogram(
+    "planner_execute_seconds",
+    "Latency of running all sub-queries of a message concurrently",
+)
+subquery_errors = metrics.counter(
+    "planner_subquery_errors_total", "Sub-queries that failed and were skipped"
+)
+
+
+class ParallelPlanner:
+    """
+    Single planning stage in place of the ReAct agent over SubQuestionQueryEngines.
+
+    One LLM call splits the message into sub-queries tagged with a source
+    (tool name), all sub-queries run concurrently (at most `max_concurrency`
+    at a time) and one LLM call writes the answer from their results. Record
+    sub-queries only retrieve chunks, so a turn costs two LLM calls whatever
+    the number of sub-queries.
+    """
+
+    def __init__(
+        self,
+        tools: List[QueryEngineTool],
+        system_prompt: str,
+        llm: Optional[LLM] = None,
+        max_concurrency: int = settings.PLANNER_MAX_CONCURRENCY,
+    ):
+        self.tools = {tool.metadata.name: tool for tool in tools}
+        self.system_prompt = system_prompt
+        self._llm = llm
+        self.max_concurrency = max_concurrency
+        self.transformer = QueryTransformer(
+            {name: tool.metadata.description for name, tool in self.tools.items()}
+        )
+        self.synthesis_prompt = PromptRegistry.get("synthesis")
+
+    @property
+    def llm(self) -> LLM:
+        return self._llm or Settings.llm
+
+    async def achat(
+        self, message: str, chat_history: Optional[List[ChatMessage]] = None
+    ) -> AgentChatResponse:
+        outputs = await self.aprepare(message, chat_history)
+        response = await self.llm.achat(
+            self._synthesis_messages(message, chat_history, outputs)
+        )
+        return AgentChatResponse(
+            response=response.message.content or "",
+            sources=outputs,
+            source_nodes=[
+                node
+                for output in outputs
+                if isinstance(output.raw_output, list)
+                for node in output.raw_output
+            ],
+        )
+
+    async def aprepare(
+        self, message: str, chat_history: Optional[List[ChatMessage]] = None
+    ) -> List[ToolOutput]:
+        """
+        Plan the message and run its sub-queries; the results feed synthesis.
+        """
+        with plan_seconds.time():
+            subqueries = await self.transformer.transform(message, chat_history)
+        if not subqueries:
+            # Không tách được câu hỏi phụ: hỏi nguồn đầu tiên bằng câu hỏi gốc
+            subqueries = [SubQuery(next(iter(self.tools)), message)]
+        plan_subqueries.observe(len(subqueries))
+        logger.info(f"Planned sub-queries: {subqueries}")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(subquery: SubQuery) -> Optional[ToolOutput]:
+            async with semaphore:
+                try:
+                    return await self._run(subquery)
+                except Exception as e:
+                    # Một nguồn lỗi (PubMed quá tải...) không làm hỏng cả câu trả lời
+                    subquery_errors.inc()
+                    logger.warning(f"Sub-query {subquery} failed: {e}")
+                    return None
+
+        with execute_seconds.time():
+            outputs = await asyncio.gather(*(run(subquery) for subquery in subqueries))
+        return [output for output in outputs if output is not None]
+
+    async def astream_synthesize(
+        self,
+        message: str,
+        chat_history: Optional[List[ChatMessage]],
+        outputs: List[ToolOutput],
+    ) -> AsyncGenerator[str, None]:
+        response_gen = await self.llm.astream_chat(
+            self._synthesis_messages(message, chat_history, outputs)
+        )
+        async for response in response_gen:
+            yield response.delta or ""
+
+    async def _run(self, subquery: SubQuery) -> ToolOutput:
+        query_engine = self.tools[subquery.source].query_engine
+        if isinstance(query_engine, RetrieverQueryEngine):
+            # Chỉ lấy các đoạn hồ sơ, việc tổng hợp làm một lần ở cuối
+            nodes = await query_engine.aretrieve(QueryBundle(subquery.query))
+            content = "\n\n".join(
+                node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes
+            )
+            raw_output = nodes
+        else:
+            response = await query_engine.aquery(subquery.query)
+            content = str(response)
+            raw_output = response
+        return ToolOutput(
+            content=content or "Không tìm thấy thông tin liên quan.",
+            tool_name=subquery.source,
+            raw_input={"input": subquery.query},
+            raw_output=raw_output,
+        )
+
+    def _synthesis_messages(
+        self,
+        message: str,
+        chat_history: Optional[List[ChatMessage]],
+        outputs: List[ToolOutput],
+    ) -> List[ChatMessage]:
+        sub_responses = "\n\n".join(
+            f"[{output.tool_name}] {output.raw_input['input']}\n{output.content}"
+            for output in outputs
+        )
+        prompt = self.synthesis_prompt.format(
+            query=message, sub_responses=sub_responses or "(không có)"
+        )
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt),
+            *(chat_history or []),
+            ChatMessage(role=MessageRole.USER, content=prompt),
+        ]
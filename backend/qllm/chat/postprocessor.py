@@ -0,0 +1,60 @@
+import logging
+from typing import List, Optional
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from pydantic import Field
+
+from qllm.chat.history import count_tokens
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+context_chunks = metrics.histogram(
+    "retrieval_context_chunks",
+    "Chunks kept for synthesis after the context token budget",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+)
+context_tokens = metrics.histogram(
+    "retrieval_context_tokens",
+    "Tokens of retrieved context sent to synthesis",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+context_chunks_dropped = metrics.counter(
+    "retrieval_context_chunks_dropped_total",
+    "Retrieved chunks dropped because the context token budget was full",
+)
+
+
+class ContextBudgetPostprocessor(BaseNodePostprocessor):
+    """
+    Adaptive top-k: keep the best-scored chunks until `max_tokens` of context
+    is used. Short chunks let more of the retrieved top-k through, long ones
+    fewer; the first chunk is always kept so a query never loses its context.
+    """
+
+    max_tokens: int = Field(gt=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextBudgetPostprocessor"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        kept = []
+        used_tokens = 0
+        # Node đã được sắp xếp theo độ liên quan giảm dần
+        for node in nodes:
+            tokens = count_tokens(node.node.get_content(metadata_mode=MetadataMode.LLM))
+            if kept and used_tokens + tokens > self.max_tokens:
+                break
+            kept.append(node)
+            used_tokens += tokens
+
+        context_chunks.observe(len(kept))
+        context_tokens.observe(used_tokens)
+        context_chunks_dropped.inc(len(nodes) - len(kept))
+        return kept
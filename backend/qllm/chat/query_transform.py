@@ -1,28 +1,50 @@
-from typing import List
+import re
+from typing import Dict, List, NamedTuple, Optional
 
 from llama_index.core.base.llms.types import ChatMessage
 from llama_index.core.settings import Settings
 
+from qllm.core.config import settings
 from qllm.prompts import PromptRegistry
 
+# "1. [medical_records] Câu hỏi phụ", nguồn có thể bị thiếu
+SUBQUERY_PATTERN = re.compile(r"^\s*\d+\s*[.)]\s*(?:\[\s*([\w-]+)\s*\])?\s*(.+)$")
+
+
+class SubQuery(NamedTuple):
+    source: str
+    query: str
+
 
 class QueryTransformer:
-    def __init__(self):
+    def __init__(
+        self,
+        sources: Dict[str, str],
+        max_subqueries: int = settings.PLANNER_MAX_SUBQUERIES,
+    ):
+        """
+        Args:
+            sources: Tên nguồn -> mô tả, theo thứ tự ưu tiên. Câu hỏi phụ không
+                ghi nguồn (hoặc ghi sai) được gán cho nguồn đầu tiên.
+            max_subqueries: Số câu hỏi phụ tối đa
+        """
         self.llm = Settings.llm
         self.prompt = PromptRegistry.get("query_transform")
+        self.sources = sources
+        self.max_subqueries = max_subqueries
 
     async def transform(
-        self, query: str, chat_history: List[ChatMessage] = None
-    ) -> List[str]:
+        self, query: str, chat_history: Optional[List[ChatMessage]] = None
+    ) -> List[SubQuery]:
         """
-        Chuyển đổi câu hỏi gốc thành các câu hỏi phụ.
+        Chuyển đổi câu hỏi gốc thành các câu hỏi phụ, mỗi câu gắn với một nguồn.
 
         Args:
             query: Câu hỏi gốc của người dùng
             chat_history: Lịch sử trò chuyện (tùy chọn)
 
         Returns:
-            List[str]: Danh sách các câu hỏi phụ
+            List[SubQuery]: Danh sách các câu hỏi phụ
         """
         chat_history_str = ""
         if chat_history:
@@ -32,19 +54,35 @@ class QueryTransformer:
                     for msg in chat_history[-5:]  # Chỉ lấy 5 tin nhắn gần nhất
                 ]
             )
+        sources_str = "\n".join(
+            f"- {name}: {description}" for name, description in self.sources.items()
+        )
 
-        prompt_str = self.prompt.format(query=query, chat_history=chat_history_str)
+        prompt_str = self.prompt.format(
+            query=query,
+            chat_history=chat_history_str,
+            sources=sources_str,
+            max_subqueries=self.max_subqueries,
+        )
 
         response = await self.llm.acomplete(prompt_str)
+        return self.parse(response.text)
 
-        # Xử lý kết quả để lấy các câu hỏi phụ
+    def parse(self, text: str) -> List[SubQuery]:
+        default_source = next(iter(self.sources))
         subqueries = []
-        for line in response.text.strip().split("\n"):
-            if line and line[0].isdigit():
-                # Loại bỏ số thứ tự và dấu chấm
-                subquery = line.split(".", 1)[1].strip()
-                # Loại bỏ dấu ngoặc vuông nếu có
-                subquery = subquery.strip("[]")
-                subqueries.append(subquery)
-
-        return subqueries
+        for line in text.strip().split("\n"):
+            match = SUBQUERY_PATTERN.match(line)
+            if match is None:
+                continue
+            source, subquery = match.groups()
+            # Loại bỏ dấu ngoặc vuông nếu có
+            subquery = subquery.strip().strip("[]").strip()
+            if not subquery:
+                continue
+            if source not in self.sources:
+                source = default_source
+            subqueries.append(SubQuery(source, subquery))
+
+        # Bỏ câu hỏi phụ trùng lặp
+        return list(dict.fromkeys(subqueries))[: self.max_subqueries]
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Any, List, Optional
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from pydantic import Field, PrivateAttr
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+rerank_seconds = metrics.histogram(
+    "rerank_seconds", "Latency of cross-encoder reranking of the candidate pool"
+)
+rerank_candidates = metrics.histogram(
+    "rerank_candidates",
+    "Candidates scored per rerank call",
+    buckets=(1, 5, 10, 20, 50, 100),
+)
+
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    """
+    Rescore retrieved candidates with a local FastEmbed cross-encoder and keep
+    the best `top_n`. The model is loaded on first use; scoring is CPU-bound
+    and runs on a worker thread in the async path.
+    """
+
+    model: str = Field(default=settings.RERANK_MODEL)
+    top_n: int = Field(default=settings.TOP_K)
+
+    _encoder: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CrossEncoderRerank"
+
+    def _get_encoder(self):
+        if self._encoder is None:
+            try:
+                from fastembed.rerank.cross_encoder import TextCrossEncoder
+            except ImportError as e:
+                raise ImportError(
+                    "Cross-encoder reranking needs fastembed>=0.4.2 "
+                    "(fastembed.rerank.cross_encoder)."
+                ) from e
+            logger.info(f"Loading rerank model {self.model}")
+            self._encoder = TextCrossEncoder(model_name=self.model)
+        return self._encoder
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes[: self.top_n]
+
+        rerank_candidates.observe(len(nodes))
+        with rerank_seconds.time():
+            scores = self._get_encoder().rerank(
+                query_bundle.query_str,
+                [
+                    node.node.get_content(metadata_mode=MetadataMode.EMBED)
+                    for node in nodes
+                ],
+            )
+            reranked = [
+                NodeWithScore(node=node.node, score=float(score))
+                for node, score in zip(nodes, scores)
+            ]
+        reranked.sort(key=lambda node: node.score, reverse=True)
+        return reranked[: self.top_n]
+
+    async def _apostprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        return await asyncio.to_thread(self._postprocess_nodes, nodes, query_bundle)
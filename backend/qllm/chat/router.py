@@ -0,0 +1,178 @@
+import logging
+import re
+from enum import Enum
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.settings import Settings
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+
+class Route(str, Enum):
+    """
+    How a chat message is answered.
+    """
+
+    # Chào hỏi, cảm ơn: một lần gọi LLM, không truy xuất
+    GREETING = "greeting"
+    # Một dữ kiện trong hồ sơ của người dùng: một lần retrieve + một lần tổng hợp
+    LOOKUP = "lookup"
+    # Câu hỏi nối tiếp: như LOOKUP, truy xuất kèm câu hỏi trước đó
+    FOLLOW_UP = "follow_up"
+    # Câu hỏi nhiều bước, so sánh, kiến thức y khoa chung (PubMed) và mọi câu
+    # chưa phân loại được: planner hoặc ReAct agent
+    AGENT = "agent"
+
+
+route_counters = {
+    route: metrics.counter(
+        f"chat_route_{route.value}_total", f"Chat messages routed to {route.value}"
+    )
+    for route in Route
+}
+route_seconds = {
+    route: metrics.histogram(
+        f"chat_route_{route.value}_seconds",
+        f"Latency of answering chat messages routed to {route.value}",
+        buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40),
+    )
+    for route in Route
+}
+
+GREETING_PATTERN = re.compile(
+    r"^\W*(xin chào|chào|alo|hello|hi|hey|cảm ơn|cám ơn|thanks|thank you|ok|oke"
+    r"|tạm biệt|bye|good (morning|afternoon|evening))\b",
+    re.IGNORECASE,
+)
+AGENT_PATTERN = re.compile(
+    r"\b(so sánh|khác nhau|khác biệt|giống nhau|compare|comparison|difference"
+    r"|versus|vs\.?|nghiên cứu|pubmed|bài báo|y văn|study|studies|evidence"
+    r"|guideline|phác đồ|xu hướng|trend|tại sao|vì sao|why|giải thích|explain"
+    r"|lần lượt|từng bước|step by step)\b",
+    re.IGNORECASE,
+)
+# Câu hỏi về hồ sơ của chính người dùng ("của tôi", "lần khám gần nhất"...)
+RECORD_PATTERN = re.compile(
+    r"\b(tôi|mình|của em|my|me|mine|hồ sơ|bệnh án|lần khám|lần xét nghiệm"
+    r"|đơn thuốc|toa thuốc|record|records|prescription|prescribed)\b",
+    re.IGNORECASE,
+)
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\W*(còn|thế còn|vậy|vậy còn|và|nó|cái đó|điều đó|thuốc đó|what about"
+    r"|how about|and|it|that|those|this)\b"
+    r"|\b(nó|đó|ấy|it|that|them|those)\W*$",
+    re.IGNORECASE,
+)
+
+# Câu mẫu cho bộ phân loại bằng embedding
+ROUTE_EXAMPLES: Dict[Route, List[str]] = {
+    Route.GREETING: [
+        "Xin chào bác sĩ",
+        "Cảm ơn bạn nhiều",
+        "Chào buổi sáng",
+        "Hello, how are you?",
+    ],
+    Route.LOOKUP: [
+        "Chỉ số HbA1c lần khám gần nhất của tôi là bao nhiêu?",
+        "Tôi đang dùng thuốc gì?",
+        "Kết quả xét nghiệm cholesterol của tôi",
+        "What was my last blood pressure reading?",
+    ],
+    Route.AGENT: [
+        "So sánh kết quả xét nghiệm đường huyết của tôi qua các năm "
+        "và cho biết xu hướng",
+        "Nghiên cứu mới nhất về điều trị tiểu đường type 2 nói gì "
+        "và có phù hợp với tôi không?",
+        "Thuốc tôi đang dùng có tương tác với nhau không, giải thích cơ chế",
+        "Compare my cholesterol results with current guidelines",
+    ],
+}
+
+
+class QueryRouter:
+    """
+    Cheap local router in front of the ReAct agent.
+
+    Rules catch the clear cases (greetings, comparisons / literature questions,
+    short anaphoric follow-ups, questions about the user's own records).
+    Otherwise, if enabled, the message embedding is compared with the
+    centroids of example messages per route. Anything left goes to the agent:
+    a general medical question ("HbA1c là gì?") must reach PubMed, the records
+    alone cannot answer it.
+    """
+
+    def __init__(
+        self,
+        max_simple_words: int = settings.ROUTER_MAX_SIMPLE_WORDS,
+        embedding_enabled: bool = settings.ROUTER_EMBEDDING_ENABLED,
+        min_similarity: float = settings.ROUTER_EMBEDDING_MIN_SIMILARITY,
+    ):
+        self.max_simple_words = max_simple_words
+        self.embedding_enabled = embedding_enabled
+        self.min_similarity = min_similarity
+        self._centroids: Optional[Dict[Route, np.ndarray]] = None
+
+    def route_by_rules(
+        self, message: str, chat_history: Optional[Sequence[ChatMessage]] = None
+    ) -> Optional[Route]:
+        words = len(message.split())
+        if words <= 6 and GREETING_PATTERN.search(message):
+            return Route.GREETING
+        if (
+            AGENT_PATTERN.search(message)
+            or message.count("?") > 1
+            or words > self.max_simple_words
+        ):
+            return Route.AGENT
+        has_history = any(m.role == MessageRole.USER for m in chat_history or [])
+        if has_history and words <= 12 and FOLLOW_UP_PATTERN.search(message):
+            return Route.FOLLOW_UP
+        if RECORD_PATTERN.search(message):
+            return Route.LOOKUP
+        return None
+
+    async def route(
+        self,
+        message: str,
+        chat_history: Optional[Sequence[ChatMessage]] = None,
+        embedding: Optional[Sequence[float]] = None,
+    ) -> Route:
+        """
+        Pick the route of a message. `embedding` is the message embedding when
+        the caller already has it (semantic cache), otherwise it is computed
+        only if the embedding classifier is enabled and the rules are unsure.
+        """
+        route = self.route_by_rules(message, chat_history)
+        if route is None and self.embedding_enabled:
+            try:
+                route = await self._route_by_embedding(message, embedding)
+            except Exception as e:
+                logger.warning(f"Embedding router unavailable: {e}")
+        return route or Route.AGENT
+
+    async def _route_by_embedding(
+        self, message: str, embedding: Optional[Sequence[float]]
+    ) -> Optional[Route]:
+        if self._centroids is None:
+            self._centroids = {}
+            for route, examples in ROUTE_EXAMPLES.items():
+                vectors = np.array(
+                    await Settings.embed_model.aget_text_embedding_batch(examples)
+                )
+                centroid = vectors.mean(axis=0)
+                self._centroids[route] = centroid / np.linalg.norm(centroid)
+
+        if embedding is None:
+            embedding = await Settings.embed_model.aget_query_embedding(message)
+        vector = np.asarray(embedding, dtype=float)
+        vector = vector / np.linalg.norm(vector)
+        scores = {route: float(vector @ c) for route, c in self._centroids.items()}
+        route = max(scores, key=scores.get)
+        if scores[route] < self.min_similarity:
+            return None
+        return route
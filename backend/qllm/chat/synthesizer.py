@@ -1,15 +1,30 @@
-from typing import List
+from typing import List, Optional
 
+from llama_index.core.indices.prompt_helper import PromptHelper
 from llama_index.core.prompts.prompt_type import PromptType
 from llama_index.core.prompts.prompts import QuestionAnswerPrompt, RefinePrompt
-from llama_index.core.response_synthesizers import BaseSynthesizer
+from llama_index.core.response_synthesizers import BaseSynthesizer, ResponseMode
 from llama_index.core.response_synthesizers.factory import get_response_synthesizer
+from llama_index.core.settings import Settings
 
+from qllm.core.config import settings
 from qllm.models.model import Document as DocumentSchema
 
 
 # def get_medical_response_synth(documents: List[DocumentSchema]) -> BaseSynthesizer:
-def get_medical_response_synth() -> BaseSynthesizer:
+def get_medical_response_synth(
+    streaming: bool = False,
+    mode: str = settings.SYNTHESIS_MODE,
+    max_pack_tokens: Optional[int] = settings.SYNTHESIS_MAX_PACK_TOKENS,
+) -> BaseSynthesizer:
+    """
+    Response synthesizer over the retrieved chunks, see SYNTHESIS_MODE.
+
+    tree_summarize and compact pack the chunks into as few prompts as fit the
+    context window (counted with Settings.tokenizer); compact refines the packs
+    one after another, tree_summarize answers them concurrently and streams the
+    final pass. compact is llama_index's default and what was used before.
+    """
     # doc_titles = "\n".join("- " + doc.title for doc in documents)
 
     refine_template_str = f"""
@@ -56,8 +71,20 @@ Câu trả lời:
         prompt_type=PromptType.QUESTION_ANSWER,
     )
 
+    prompt_helper = None
+    if max_pack_tokens is not None:
+        prompt_helper = PromptHelper.from_llm_metadata(
+            Settings.llm.metadata, chunk_size_limit=max_pack_tokens
+        )
+
     return get_response_synthesizer(
+        prompt_helper=prompt_helper,
         refine_template=refine_prompt,
         text_qa_template=qa_prompt,
+        # Câu trả lời của từng gói ngữ cảnh được gộp lại bằng cùng prompt hỏi đáp
+        summary_template=qa_prompt,
+        response_mode=ResponseMode(mode),
+        use_async=True,
         structured_answer_filtering=False,
+        streaming=streaming,
     )
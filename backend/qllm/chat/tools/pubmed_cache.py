@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+search_hits = metrics.counter(
+    "pubmed_cache_search_hits_total", "PubMed searches served from the disk cache"
+)
+search_misses = metrics.counter(
+    "pubmed_cache_search_misses_total", "PubMed searches sent to NCBI"
+)
+article_hits = metrics.counter(
+    "pubmed_cache_article_hits_total", "PubMed articles served from the disk cache"
+)
+article_misses = metrics.counter(
+    "pubmed_cache_article_misses_total", "PubMed articles fetched from NCBI"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search (
+    query_key TEXT PRIMARY KEY,
+    pmids TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS article (
+    pmid TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_article_last_accessed ON article (last_accessed);
+"""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class PubMedCache:
+    """
+    On-disk (SQLite) cache of PubMed search results (query -> PMIDs) and article
+    bodies (PMID -> article). Entries expire after `ttl_seconds`; articles are
+    evicted least-recently-used once there are more than `max_articles`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_articles: int = 5000,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_articles = max_articles
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_settings(cls) -> "PubMedCache":
+        return cls(
+            path=settings.PUBMED_CACHE_PATH,
+            ttl_seconds=settings.PUBMED_CACHE_TTL_SECONDS,
+            max_articles=settings.PUBMED_CACHE_MAX_ARTICLES,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _search_key(query: str, max_results: int) -> str:
+        return f"{normalize_query(query)}|{max_results}"
+
+    def get_search(self, query: str, max_results: int) -> Optional[List[str]]:
+        cutoff = time.time() - self.ttl_seconds
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT pmids FROM search WHERE query_key = ? AND created_at >= ?",
+                (self._search_key(query, max_results), cutoff),
+            ).fetchone()
+
+        if row is None:
+            search_misses.inc()
+            return None
+        search_hits.inc()
+        return json.loads(row[0])
+
+    def put_search(self, query: str, max_results: int, pmids: List[str]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search (query_key, pmids, created_at) "
+                "VALUES (?, ?, ?)",
+                (self._search_key(query, max_results), json.dumps(pmids), time.time()),
+            )
+
+    def get_articles(self, pmids: Iterable[str]) -> Dict[str, Dict]:
+        pmids = list(pmids)
+        if not pmids:
+            return {}
+
+        now = time.time()
+        placeholders = ",".join("?" * len(pmids))
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                f"SELECT pmid, payload FROM article "
+                f"WHERE pmid IN ({placeholders}) AND created_at >= ?",
+                (*pmids, now - self.ttl_seconds),
+            ).fetchall()
+            conn.execute(
+                f"UPDATE article SET last_accessed = ? WHERE pmid IN ({placeholders})",
+                (now, *pmids),
+            )
+
+        articles = {pmid: json.loads(payload) for pmid, payload in rows}
+        article_hits.inc(len(articles))
+        article_misses.inc(len(pmids) - len(articles))
+        return articles
+
+    def put_articles(self, articles: Dict[str, Dict]) -> None:
+        if not articles:
+            return
+
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO article "
+                "(pmid, payload, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                [
+                    (pmid, json.dumps(article), now, now)
+                    for pmid, article in articles.items()
+                ],
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        cutoff = now - self.ttl_seconds
+        conn.execute("DELETE FROM search WHERE created_at < ?", (cutoff,))
+        conn.execute("DELETE FROM article WHERE created_at < ?", (cutoff,))
+
+        (count,) = conn.execute("SELECT COUNT(*) FROM article").fetchone()
+        overflow = count - self.max_articles
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM article WHERE pmid IN ("
+                "SELECT pmid FROM article ORDER BY last_accessed ASC LIMIT ?)",
+                (overflow,),
+            )
+            logger.info(f"Evicted {overflow} articles from the PubMed cache")
+
+    # SQLite là blocking I/O, các phiên bản async chạy trên thread pool
+    async def aget_search(self, query: str, max_results: int) -> Optional[List[str]]:
+        return await asyncio.to_thread(self.get_search, query, max_results)
+
+    async def aput_search(self, query: str, max_results: int, pmids: List[str]):
+        await asyncio.to_thread(self.put_search, query, max_results, pmids)
+
+    async def aget_articles(self, pmids: Iterable[str]) -> Dict[str, Dict]:
+        return await asyncio.to_thread(self.get_articles, list(pmids))
+
+    async def aput_articles(self, articles: Dict[str, Dict]) -> None:
+        await asyncio.to_thread(self.put_articles, articles)
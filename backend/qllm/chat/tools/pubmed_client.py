@@ -0,0 +1,220 @@
+import logging
+import xml.etree.ElementTree as xml
+from typing import Dict, List, Optional, Set
+
+import httpx
+from llama_index.core.schema import Document
+
+from qllm.chat.tools.pubmed_cache import PubMedCache
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+fetch_seconds = metrics.histogram(
+    "pubmed_fetch_seconds", "Latency of PubMed E-utilities requests"
+)
+
+
+def parse_search_ids(content: bytes) -> List[str]:
+    root = xml.fromstring(content)
+    return [elem.text for elem in root.iter("Id") if elem.text]
+
+
+def _article_ids(article: xml.Element) -> Set[str]:
+    """
+    Ids an efetch record can be requested by: PMC id (with or without the
+    "PMC" prefix) and PMID.
+    """
+    return {
+        elem.text.strip().removeprefix("PMC")
+        for elem in article.iter("article-id")
+        if elem.get("pub-id-type") in ("pmc", "pmcid", "pmc-uid", "pmid") and elem.text
+    }
+
+
+def parse_articles(content: bytes, pmids: List[str]) -> Dict[str, Dict]:
+    """
+    Parse a (batched) efetch response into {pmid: article}. Each article is
+    matched to a requested id by the ids it carries; articles without one are
+    skipped, so a dropped or reordered record never gets another id's text.
+    """
+    root = xml.fromstring(content)
+    elements = [root] if root.tag == "article" else list(root.iter("article"))
+
+    articles = {}
+    for element in elements:
+        ids = _article_ids(element)
+        pmid = next((pmid for pmid in pmids if pmid in ids), None)
+        if pmid is None or pmid in articles:
+            logger.warning(f"Skipping efetch article with unexpected ids {ids}")
+            continue
+
+        raw_text = ""
+        title = ""
+        journal = ""
+        for node in element.iter():
+            if node.tag == "article-title" and not title:
+                title = node.text or ""
+            elif node.tag == "journal-title" and not journal:
+                journal = node.text or ""
+
+            if node.text:
+                raw_text += node.text.strip() + " "
+
+        articles[pmid] = {
+            "title": title,
+            "journal": journal,
+            "url": f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{pmid}/",
+            "text": raw_text,
+        }
+    return articles
+
+
+def to_documents(pmids: List[str], articles: Dict[str, Dict]) -> List[Document]:
+    return [
+        Document(
+            text=articles[pmid]["text"],
+            extra_info={
+                "Title of this paper": articles[pmid]["title"],
+                "Journal it was published in:": articles[pmid]["journal"],
+                "URL": articles[pmid]["url"],
+            },
+        )
+        for pmid in pmids
+        if pmid in articles
+    ]
+
+
+class PubMedClient:
+    """
+    PubMed (PMC) search over the NCBI E-utilities with a disk cache.
+    Missing articles are fetched with a single batched efetch request.
+    The HTTP clients are created on first use and kept for the lifetime of the
+    tool, so searches reuse their pooled connections to NCBI.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.PUBMED_EUTILS_URL,
+        api_key: Optional[str] = settings.PUBMED_API_KEY,
+        cache: Optional[PubMedCache] = None,
+        timeout: float = settings.PUBMED_TIMEOUT_SECONDS,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.cache = cache
+        self.timeout = timeout
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._client: Optional[httpx.Client] = None
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(timeout=self.timeout)
+        return self._aclient
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _params(self, **kwargs) -> Dict:
+        params = {"tool": "qllm", "db": "pmc", **kwargs}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+
+    def _search_request(self, query: str, max_results: int):
+        return (
+            f"{self.base_url}/esearch.fcgi",
+            self._params(term=query, retmax=max_results),
+        )
+
+    def _fetch_request(self, pmids: List[str]):
+        return f"{self.base_url}/efetch.fcgi", self._params(id=",".join(pmids))
+
+    async def asearch(self, query: str, max_results: int = 2) -> List[Document]:
+        pmids = None
+        if self.cache:
+            pmids = await self.cache.aget_search(query, max_results)
+        if pmids is None:
+            url, params = self._search_request(query, max_results)
+            with fetch_seconds.time():
+                resp = await self.aclient.get(url, params=params)
+            resp.raise_for_status()
+            pmids = parse_search_ids(resp.content)
+            if self.cache:
+                await self.cache.aput_search(query, max_results, pmids)
+
+        articles = {}
+        if self.cache:
+            articles = await self.cache.aget_articles(pmids)
+        missing = [pmid for pmid in pmids if pmid not in articles]
+        if missing:
+            url, params = self._fetch_request(missing)
+            with fetch_seconds.time():
+                resp = await self.aclient.get(url, params=params)
+            resp.raise_for_status()
+            fetched = parse_articles(resp.content, missing)
+            if self.cache:
+                await self.cache.aput_articles(fetched)
+            articles.update(fetched)
+
+        return to_documents(pmids, articles)
+
+    def search(self, query: str, max_results: int = 2) -> List[Document]:
+        pmids = None
+        if self.cache:
+            pmids = self.cache.get_search(query, max_results)
+        if pmids is None:
+            url, params = self._search_request(query, max_results)
+            with fetch_seconds.time():
+                resp = self.client.get(url, params=params)
+            resp.raise_for_status()
+            pmids = parse_search_ids(resp.content)
+            if self.cache:
+                self.cache.put_search(query, max_results, pmids)
+
+        articles = {}
+        if self.cache:
+            articles = self.cache.get_articles(pmids)
+        missing = [pmid for pmid in pmids if pmid not in articles]
+        if missing:
+            url, params = self._fetch_request(missing)
+            with fetch_seconds.time():
+                resp = self.client.get(url, params=params)
+            resp.raise_for_status()
+            fetched = parse_articles(resp.content, missing)
+            if self.cache:
+                self.cache.put_articles(fetched)
+            articles.update(fetched)
+
+        return to_documents(pmids, articles)
+
+
+pubmed_client: Optional[PubMedClient] = None
+
+
+def get_pubmed_client() -> PubMedClient:
+    global pubmed_client
+    if pubmed_client is None:
+        pubmed_client = PubMedClient(cache=PubMedCache.from_settings())
+    return pubmed_client
+
+
+async def close_pubmed_client() -> None:
+    """
+    Called from the app lifespan on shutdown.
+    """
+    if pubmed_client is not None:
+        await pubmed_client.aclose()
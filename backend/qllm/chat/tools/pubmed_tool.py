@@ -4,9 +4,10 @@ from llama_index.core.base.response.schema import Response
 from llama_index.core.query_engine.custom import CustomQueryEngine
 from llama_index.core.schema import Document
 from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.readers.papers import PubmedReader
 from pydantic import Field
 
+from qllm.chat.tools.pubmed_client import get_pubmed_client
+
 
 class PubMedQueryEngine(CustomQueryEngine):
     """Custom query engine để tìm kiếm trên PubMed."""
@@ -25,30 +26,42 @@ class PubMedQueryEngine(CustomQueryEngine):
         Returns:
             Response: Kết quả tìm kiếm được định dạng
         """
-        loader = PubmedReader()
-        documents: List[Document] = loader.load_data(
-            search_query=query_str, max_results=self.max_results
+        documents = get_pubmed_client().search(query_str, max_results=self.max_results)
+        return format_pubmed_response(documents)
+
+    async def acustom_query(self, query_str: str) -> Response:
+        """
+        Phiên bản async của custom_query, không block event loop nên các
+        sub-question của SubQuestionQueryEngine chạy song song.
+        """
+        documents = await get_pubmed_client().asearch(
+            query_str, max_results=self.max_results
         )
+        return format_pubmed_response(documents)
+
+
+def format_pubmed_response(documents: List[Document]) -> Response:
+    if not documents or len(documents) == 0:
+        response_text = "Không tìm thấy bài báo nào phù hợp với từ khóa tìm kiếm."
+    else:
+        # Tạo response text từ documents
+        response_text = ""
+        for idx, doc in enumerate(documents, 1):
+            extra_info = doc.extra_info
+            max_length = min(100, len(doc.text))
+
+            response_text += f"\nBài báo {idx}:\n"
+            response_text += (
+                f"Tiêu đề: {extra_info.get('Title of this paper', 'N/A')}\n"
+            )
+            response_text += (
+                f"Tạp chí: {extra_info.get('Journal it was published in:', 'N/A')}\n"
+            )
+            response_text += f"URL: {extra_info.get('URL', 'N/A')}\n"
+            response_text += f"Nội dung:\n{doc.text[:max_length]}\n"
+            response_text += "-" * 50 + "\n"
 
-        if not documents or len(documents) == 0:
-            response_text = "Không tìm thấy bài báo nào phù hợp với từ khóa tìm kiếm."
-        else:
-            # Tạo response text từ documents
-            response_text = ""
-            for idx, doc in enumerate(documents, 1):
-                extra_info = doc.extra_info
-                max_length = min(100, len(doc.text))
-
-                response_text += f"\nBài báo {idx}:\n"
-                response_text += (
-                    f"Tiêu đề: {extra_info.get('Title of this paper', 'N/A')}\n"
-                )
-                response_text += f"Tạp chí: {extra_info.get('Journal it was published in:', 'N/A')}\n"
-                response_text += f"URL: {extra_info.get('URL', 'N/A')}\n"
-                response_text += f"Nội dung:\n{doc.text[:max_length]}\n"
-                response_text += "-" * 50 + "\n"
-
-        return Response(response=response_text)
+    return Response(response=response_text)
 
 
 def get_tools() -> List[QueryEngineTool]:
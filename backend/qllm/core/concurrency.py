@@ -0,0 +1,278 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Deque, Optional, TypeVar
+
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    Run blocking (CPU-bound) calls on a dedicated thread pool so they never block
+    the event loop. At most `max_concurrency` calls run at once; the others wait
+    on a semaphore and are reported by the `<name>_queue_depth` gauge.
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+
+        metrics.gauge(
+            f"{name}_queue_depth",
+            f"Calls waiting for a free {name} worker",
+            fn=lambda: self._waiting,
+        )
+        metrics.gauge(
+            f"{name}_in_flight",
+            f"Calls currently running on the {name} pool",
+            fn=lambda: self._running,
+        )
+        self._wait_seconds = metrics.histogram(
+            f"{name}_wait_seconds", f"Time spent waiting for a free {name} worker"
+        )
+        self._run_seconds = metrics.histogram(
+            f"{name}_run_seconds", f"Time spent running on the {name} pool"
+        )
+
+    def _ensure_started(self):
+        # Khởi tạo lười để semaphore gắn với event loop đang chạy
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix=self.name
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+
+        self._waiting += 1
+        try:
+            with self._wait_seconds.time():
+                await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            with self._run_seconds.time():
+                return await loop.run_in_executor(
+                    self._executor, partial(func, *args, **kwargs)
+                )
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._semaphore = None
+
+
+class AsyncRWLock:
+    """
+    Readers–writer lock for coroutines: any number of readers at once, writers
+    alone. Waiting writers block new readers so a steady stream of reads cannot
+    starve them.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @property
+    def readers(self) -> int:
+        return self._readers
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writer and not self._waiting_writers
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writer and not self._readers
+                )
+            finally:
+                self._waiting_writers -= 1
+                # Writer bị huỷ khi đang chờ thì phải đánh thức các reader
+                self._condition.notify_all()
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be queued (queue full) or waited too long.
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Global concurrency limit with per-user fair queuing.
+
+    At most `max_concurrency` requests hold a slot. Waiting requests are kept in
+    one FIFO per key (user) and a freed slot goes to the next key round-robin,
+    so a user sending a burst only delays their own requests. Requests are
+    rejected when `max_queue` requests (or `max_queue_per_key` of one key) are
+    already waiting, or after waiting `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_per_key: int,
+        timeout: Optional[float] = None,
+        retry_after: int = 5,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._running = 0
+        self._waiting = 0
+        # key -> các request đang chờ, theo thứ tự vòng round-robin
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+        metrics.gauge(
+            f"{name}_in_flight",
+            f"Requests holding a {name} slot",
+            fn=lambda: self._running,
+        )
+        metrics.gauge(
+            f"{name}_queue_depth",
+            f"Requests waiting for a {name} slot",
+            fn=lambda: self._waiting,
+        )
+        metrics.gauge(
+            f"{name}_queued_keys",
+            f"Users with requests waiting for a {name} slot",
+            fn=lambda: len(self._queues),
+        )
+        self._wait_seconds = metrics.histogram(
+            f"{name}_wait_seconds",
+            f"Time spent waiting for a {name} slot",
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+        )
+        self._rejected = metrics.counter(
+            f"{name}_rejected_total", f"Requests rejected by {name}"
+        )
+
+    async def acquire(self, key: str) -> Callable[[], None]:
+        """
+        Wait for a slot and return the function releasing it. Calling the
+        release function more than once is harmless.
+        """
+        if self._running < self.max_concurrency and not self._waiting:
+            self._running += 1
+            self._wait_seconds.observe(0)
+            return self._releaser()
+
+        queue = self._queues.get(key)
+        if self._waiting >= self.max_queue or (
+            queue is not None and len(queue) >= self.max_queue_per_key
+        ):
+            self._rejected.inc()
+            raise AdmissionRejected(f"{self.name} queue is full", self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self._waiting += 1
+        try:
+            with self._wait_seconds.time():
+                await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot đã được trao đúng lúc request bị huỷ: trả lại cho người khác
+                self._release()
+            else:
+                future.cancel()
+                self._discard(key, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._rejected.inc()
+                raise AdmissionRejected(
+                    f"Timed out waiting for a {self.name} slot", self.retry_after
+                ) from e
+            raise
+        return self._releaser()
+
+    @asynccontextmanager
+    async def slot(self, key: str) -> AsyncIterator[None]:
+        release = await self.acquire(key)
+        try:
+            yield
+        finally:
+            release()
+
+    def _releaser(self) -> Callable[[], None]:
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release()
+
+        return release
+
+    def _release(self) -> None:
+        # Trao slot trực tiếp cho request kế tiếp, lần lượt theo từng user
+        while self._queues:
+            key, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                self._queues[key] = queue
+            if not future.done():
+                self._waiting -= 1
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _discard(self, key: str, future: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[key]
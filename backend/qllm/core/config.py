@@ -46,6 +46,15 @@ class ApplicationSetting(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     PORT: int = 10000
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 11520
+    # bcrypt runs on a dedicated thread pool, at most this many hashes at once
+    PASSWORD_HASH_CONCURRENCY: int = 4
+
+    # Authenticated user cache (get_current_user)
+    ## Set USER_CACHE_REDIS_URL to share the cache between workers
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_REDIS_URL: Optional[str] = None
     UVICORN_WORKER_COUNT: Optional[int] = None
     BACKEND_CORS_ORIGINS: Annotated[
         List[AnyUrl] | str,
@@ -63,12 +72,115 @@ class ApplicationSetting(BaseSettings):
 
     # Database config
     DATABASE_URL: Annotated[str, BeforeValidator(replace_postgresql_asyncpg)]
+    ## DB_MAX_CONNECTIONS is shared by all UVICORN_WORKER_COUNT workers, each worker
+    ## derives its pool size from it unless DB_POOL_SIZE / DB_MAX_OVERFLOW are set
+    DB_MAX_CONNECTIONS: int = 16
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    DB_QUERY_CACHE_SIZE: int = 1000
+    DB_ECHO: bool = False
 
     # LLM Config
     LLM_TEMPERATURE: float = 0.5
     LLM_MAX_TOKENS: int | None = None  # Default or set a specific value
     EMBEDDING_DIM: int = 1536
     EMBEDDING_MODEL: Optional[str] = None
+    ## Concurrent embedding requests are micro-batched (up to
+    ## EMBEDDING_MAX_BATCH_SIZE texts, waiting at most EMBEDDING_MAX_WAIT_MS)
+    ## and cached in an LRU of EMBEDDING_CACHE_SIZE vectors
+    EMBEDDING_SERVICE_ENABLED: bool = True
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_CACHE_SIZE: int = 10000
+
+    # Semantic response cache
+    ## Only standalone questions (no chat history) are looked up / stored
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1024
+
+    # Chat history
+    ## The chat path only sends the last CHAT_HISTORY_WINDOW messages that fit
+    ## in CHAT_HISTORY_MAX_TOKENS to the agent
+    CHAT_HISTORY_WINDOW: int = 20
+    CHAT_HISTORY_MAX_TOKENS: int = 3000
+    ## Older messages are folded into Conversation.summary once the history goes
+    ## over budget; the last CHAT_SUMMARY_KEEP_MESSAGES stay verbatim
+    CHAT_SUMMARY_ENABLED: bool = True
+    CHAT_SUMMARY_KEEP_MESSAGES: int = 6
+    CONVERSATION_PAGE_SIZE: int = 50
+    CONVERSATION_MAX_PAGE_SIZE: int = 200
+
+    # Chat admission control (per worker)
+    ## At most CHAT_MAX_CONCURRENCY answers are generated at once; further chat
+    ## requests wait and are admitted round-robin across users. Requests over
+    ## CHAT_MAX_QUEUE (or CHAT_MAX_QUEUE_PER_USER for one user) waiting, or
+    ## waiting longer than CHAT_QUEUE_TIMEOUT_SECONDS, get 429 with Retry-After
+    CHAT_MAX_CONCURRENCY: int = 8
+    CHAT_MAX_QUEUE: int = 32
+    CHAT_MAX_QUEUE_PER_USER: int = 4
+    CHAT_QUEUE_TIMEOUT_SECONDS: float = 30
+    CHAT_RETRY_AFTER_SECONDS: int = 5
+
+    # Streaming answers
+    ## Partial answers are checkpointed every N tokens or T seconds; PENDING
+    ## answers without a checkpoint for STREAM_STALE_SECONDS are marked ERROR
+    STREAM_CHECKPOINT_TOKENS: int = 32
+    STREAM_CHECKPOINT_SECONDS: float = 1.0
+    ## Answers still planning (no token yet) are checkpointed every N seconds,
+    ## must stay well below STREAM_STALE_SECONDS
+    STREAM_HEARTBEAT_SECONDS: float = 30
+    STREAM_STALE_SECONDS: int = 120
+    STREAM_SWEEP_INTERVAL_SECONDS: int = 60
+    ## The client connection is checked every N seconds while an answer is
+    ## generated; a disconnect cancels the generation and marks it CANCELLED
+    STREAM_DISCONNECT_POLL_SECONDS: float = 0.5
+
+    # Message persistence
+    ## fire_and_forget: answers are sent before their rows are committed
+    ## flush_before_done: [DONE] / the HTTP response wait for the commit
+    MESSAGE_PERSISTENCE_MODE: Literal["fire_and_forget", "flush_before_done"] = (
+        "flush_before_done"
+    )
+    MESSAGE_WRITER_BATCH_SIZE: int = 200
+    MESSAGE_WRITER_QUEUE_SIZE: int = 10000
+
+    # Uploads & ingestion
+    ## Uploaded files are streamed to UPLOAD_DIR/<user_id>/ and indexed by the
+    ## background pipeline: parse -> chunk -> batched embedding -> batched upsert
+    UPLOAD_DIR: str = "data/uploads"
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_ALLOWED_EXTENSIONS: List[str] = [".pdf", ".txt", ".md", ".docx"]
+    INGEST_QUEUE_SIZE: int = 32
+    INGEST_PARSE_WORKERS: int = 2
+    INGEST_EMBED_WORKERS: int = 2
+    INGEST_UPSERT_WORKERS: int = 1
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_CHUNK_SIZE: int = 1024
+    INGEST_CHUNK_OVERLAP: int = 100
+    ## Content hashes of already indexed documents/chunks, for incremental
+    ## re-indexing of the document corpus
+    INGEST_MANIFEST_PATH: str = "data/ingest_manifest.sqlite3"
+
+    # Index service (python -m qllm.index)
+    ## Queries run concurrently; inserts are batched (INDEX_INSERT_BATCH_SIZE
+    ## files or INDEX_INSERT_MAX_WAIT_MS) and persisted every
+    ## INDEX_PERSIST_INTERVAL_SECONDS
+    INDEX_SERVICE_HOST: str = "127.0.0.1"
+    INDEX_SERVICE_PORT: int = 5602
+    INDEX_DIR: str = "./.index"
+    INDEX_DOCUMENT_DIR: str = "./documents"
+    INDEX_MANIFEST_PATH: str = "./.index_manifest.sqlite3"
+    INDEX_INSERT_BATCH_SIZE: int = 16
+    INDEX_INSERT_MAX_WAIT_MS: float = 50.0
+    INDEX_PERSIST_INTERVAL_SECONDS: float = 30.0
+    INDEX_QUERY_CONCURRENCY: int = 32
 
     # OpenAI Config
     LLM_OPENAI_MODEL: Optional[str] = "gpt-4o-mini"
@@ -82,6 +194,94 @@ class ApplicationSetting(BaseSettings):
     QDRANT_URL: Optional[str] = None
     QDRANT_API_KEY: Optional[str] = None
     COLLECTION_NAME: str = "document"
+    MEMORY_COLLECTION_NAME: str = "memory"
+    ## Collection layout, applied when a collection is created
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    ## Per-tenant graph links, so user-filtered searches stay on the HNSW path
+    QDRANT_HNSW_PAYLOAD_M: Optional[int] = 16
+    QDRANT_HNSW_ON_DISK: bool = False
+    QDRANT_VECTORS_ON_DISK: bool = False
+    QDRANT_PAYLOAD_ON_DISK: bool = True
+    ## Keyword payload indexes are created on startup (also on existing
+    ## collections); user_id is declared as the tenant key
+    QDRANT_PAYLOAD_INDEXES_ENABLED: bool = True
+    ## Quantization of the document collection: none, scalar (int8, 4x smaller)
+    ## or binary (32x smaller). Searches read the quantized vectors and rescore
+    ## `limit * oversampling` candidates with the original vectors. Existing
+    ## collections are converted with `python -m qllm.services.qdrant_service migrate`
+    QDRANT_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_SCALAR_QUANTILE: float = 0.99
+    QDRANT_SEARCH_OVERSAMPLING: float = 2.0
+    QDRANT_SEARCH_RESCORE: bool = True
+    QDRANT_SEARCH_HNSW_EF: Optional[int] = None
+    ## Hybrid search on the document collection: dense + BM25 sparse vectors
+    ## fused with reciprocal rank fusion. Uses named vectors, so an existing
+    ## dense-only collection has to be re-ingested under a new COLLECTION_NAME
+    QDRANT_HYBRID_ENABLED: bool = False
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    BM25_AVG_DOC_LENGTH: float = 256
+
+    # Retrieval Config (defaults of IndexConfig)
+    ## Most chunks of the medical records handed to synthesis
+    TOP_K: int = 5
+    ## Candidates fetched by each of the dense and sparse searches, and the
+    ## pool the reranker and MMR choose the TOP_K chunks from
+    RETRIEVAL_CANDIDATE_POOL: int = 20
+    ## Drop chunks scoring below the cutoff. The score is cosine similarity for
+    ## dense search, RRF for hybrid, the MMR score with MMR and the
+    ## cross-encoder score when reranking
+    RETRIEVAL_SCORE_CUTOFF: Optional[float] = None
+    ## Maximal marginal relevance: 1.0 ranks by relevance only, lower values
+    ## favour chunks that differ from the ones already picked
+    RETRIEVAL_MMR_ENABLED: bool = False
+    RETRIEVAL_MMR_THRESHOLD: float = 0.7
+    ## Adaptive top-k: stop adding chunks once their tokens fill the budget
+    RETRIEVAL_MAX_CONTEXT_TOKENS: Optional[int] = 3000
+    ## Local cross-encoder (FastEmbed) reranking of the candidate pool
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "Xenova/ms-marco-MiniLM-L-6-v2"
+
+    # Response synthesis
+    ## tree_summarize: retrieved chunks are packed into as few prompts as fit the
+    ## model context, packs are summarized concurrently and the final pass
+    ## streams. compact: same packing, packs refined one after another (the
+    ## behaviour before this setting existed; set it to keep answers unchanged).
+    ## refine: one LLM call per chunk
+    SYNTHESIS_MODE: Literal["tree_summarize", "compact", "refine"] = "tree_summarize"
+    ## Tokens of a packed prompt (default: the model context window)
+    SYNTHESIS_MAX_PACK_TOKENS: Optional[int] = None
+
+    # Query Router
+    ## Answer greetings and single-fact / follow-up questions about the user's
+    ## own records with one LLM call instead of the agent; anything else, and
+    ## lookups that find no record chunks, still go to the agent
+    ROUTER_ENABLED: bool = True
+    ## Longer messages always go to the agent
+    ROUTER_MAX_SIMPLE_WORDS: int = 30
+    ## When the rules are unsure, compare the message embedding with example
+    ## messages of each route (reuses the semantic cache embedding if any)
+    ROUTER_EMBEDDING_ENABLED: bool = False
+    ROUTER_EMBEDDING_MIN_SIMILARITY: float = 0.5
+
+    # Chat Engine
+    ## planner: one LLM call plans sub-queries tagged by source (medical records,
+    ## PubMed), they run concurrently and one LLM call writes the answer.
+    ## agent: the ReAct agent over per-source SubQuestionQueryEngines
+    CHAT_ENGINE_MODE: Literal["planner", "agent"] = "planner"
+    PLANNER_MAX_SUBQUERIES: int = 4
+    ## Sub-queries of one message running at the same time
+    PLANNER_MAX_CONCURRENCY: int = 4
+
+    # PubMed Config
+    PUBMED_EUTILS_URL: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    PUBMED_API_KEY: Optional[str] = None
+    PUBMED_TIMEOUT_SECONDS: float = 15.0
+    PUBMED_CACHE_PATH: str = "data/pubmed_cache.sqlite3"
+    PUBMED_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    PUBMED_CACHE_MAX_ARTICLES: int = 5000
 
     # Deployment
     RENDER: bool = False
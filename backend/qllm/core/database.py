@@ -1,10 +1,111 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import logging
+import time
+from typing import Tuple
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
 
 DATABASE_URL = settings.DATABASE_URL
 
+pool_wait_seconds = metrics.histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+pool_timeouts = metrics.counter(
+    "db_pool_timeouts_total", "Connection checkouts that hit DB_POOL_TIMEOUT"
+)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_seconds.observe(time.perf_counter() - start)
+
+
+def pool_sizing() -> Tuple[int, int]:
+    """
+    (pool_size, max_overflow) for this worker. DB_MAX_CONNECTIONS is the budget
+    for the whole deployment and is split evenly between the uvicorn workers;
+    DB_POOL_SIZE / DB_MAX_OVERFLOW override the derived values.
+    """
+    workers = max(settings.UVICORN_WORKER_COUNT or 1, 1)
+    per_worker = max(settings.DB_MAX_CONNECTIONS // workers, 1)
+
+    pool_size = settings.DB_POOL_SIZE
+    if pool_size is None:
+        # Giữ sẵn khoảng 3/4 số connection, phần còn lại cho lúc cao điểm
+        pool_size = max(per_worker * 3 // 4, 1)
+
+    max_overflow = settings.DB_MAX_OVERFLOW
+    if max_overflow is None:
+        max_overflow = max(per_worker - pool_size, 0)
+    return pool_size, max_overflow
+
+
+def create_engine_from_settings(url: str = DATABASE_URL) -> AsyncEngine:
+    """
+    The single async engine of the process, configured from the DB_* settings.
+    """
+    pool_size, max_overflow = pool_sizing()
+
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        # Cache prepared statements của asyncpg trên mỗi connection
+        connect_args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+
+    pool = engine.sync_engine.pool
+    metrics.gauge(
+        "db_pool_size", "Configured connections kept in the pool", fn=pool.size
+    )
+    metrics.gauge(
+        "db_pool_checked_out", "Connections currently checked out", fn=pool.checkedout
+    )
+    metrics.gauge(
+        "db_pool_overflow",
+        "Connections opened beyond the pool size (negative: pool not full yet)",
+        fn=pool.overflow,
+    )
+    metrics.gauge(
+        "db_pool_checked_in", "Idle connections in the pool", fn=pool.checkedin
+    )
+
+    logger.info(
+        f"Database pool: pool_size={pool_size} max_overflow={max_overflow} "
+        f"timeout={settings.DB_POOL_TIMEOUT}s"
+    )
+    return engine
+
 
-print("DATABASE_URL: ", DATABASE_URL)
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+engine = create_engine_from_settings()
+# autoflush giữ mặc định như get_db trước đây: các truy vấn thấy thay đổi chưa commit
+async_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
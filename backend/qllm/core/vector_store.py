@@ -1,20 +1,196 @@
 import logging
+from typing import Any, Dict, List, Optional
 
-from llama_index.core.vector_stores.types import VectorStore
+from llama_index.core.indices.query.embedding_utils import get_top_k_mmr_embeddings
+from llama_index.core.vector_stores.types import (
+    VectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
 from llama_index.vector_stores.qdrant import QdrantVectorStore
+from llama_index.vector_stores.qdrant.base import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
 from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Fusion,
+    FusionQuery,
+    Prefetch,
+    ScoredPoint,
+    SearchParams,
+    SparseVector,
+)
 
 from qllm.core.config import settings
-from qllm.services.qdrant_service import init_qdrant
+from qllm.services.bm25 import BM25SparseEncoder
+from qllm.services.qdrant_service import init_qdrant, quantization_config, search_params
 
 logger = logging.getLogger("uvicorn")
 
+# Các mode còn lại giữ nguyên xử lý của QdrantVectorStore
+QUERY_API_MODES = (
+    VectorStoreQueryMode.DEFAULT,
+    VectorStoreQueryMode.SPARSE,
+    VectorStoreQueryMode.HYBRID,
+    VectorStoreQueryMode.MMR,
+)
+
+
+class SearchParamsQdrantVectorStore(QdrantVectorStore):
+    """
+    QdrantVectorStore that sends `search_params` (quantization oversampling and
+    rescoring, hnsw_ef) with dense queries, which the upstream store drops, and
+    runs hybrid queries as a single Query API call: dense and BM25 sparse
+    prefetches of `sparse_top_k` candidates fused by Qdrant with RRF.
+
+    MMR queries (ignored upstream) fetch `mmr_candidates` candidates with
+    their dense vectors, fused with BM25 on hybrid collections, and pick
+    `similarity_top_k` of them by maximal marginal relevance.
+    """
+
+    search_params: Optional[SearchParams] = None
+
+    def __init__(
+        self, *args: Any, search_params: Optional[SearchParams] = None, **kwargs: Any
+    ):
+        # QdrantVectorStore.__init__ không chuyển tiếp các field lạ cho pydantic
+        super().__init__(*args, **kwargs)
+        self.search_params = search_params
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode not in QUERY_API_MODES:
+            return super().query(query, **kwargs)
+        response = self._client.query_points(**self._query_request(query, **kwargs))
+        return self._query_result(query, response.points, **kwargs)
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        if query.mode not in QUERY_API_MODES:
+            return await super().aquery(query, **kwargs)
+        response = await self._aclient.query_points(
+            **self._query_request(query, **kwargs)
+        )
+        return self._query_result(query, response.points, **kwargs)
+
+    def _query_request(self, query: VectorStoreQuery, **kwargs: Any) -> Dict[str, Any]:
+        query_filter = kwargs.get("qdrant_filters")
+        if query_filter is None:
+            query_filter = self._build_query_filter(query)
+        request = {
+            "collection_name": self.collection_name,
+            "query_filter": query_filter,
+            "limit": query.similarity_top_k,
+            "with_payload": True,
+        }
+        mode = query.mode
+
+        if mode == VectorStoreQueryMode.MMR:
+            request["limit"] = max(
+                kwargs.get("mmr_candidates") or settings.RETRIEVAL_CANDIDATE_POOL,
+                query.similarity_top_k,
+            )
+            request["with_vectors"] = (
+                [DENSE_VECTOR_NAME] if self.enable_hybrid else True
+            )
+            hybrid = self.enable_hybrid and self._sparse_query_fn is not None
+            mode = (
+                VectorStoreQueryMode.HYBRID if hybrid else VectorStoreQueryMode.DEFAULT
+            )
+
+        if mode == VectorStoreQueryMode.DEFAULT:
+            return {
+                **request,
+                "query": query.query_embedding,
+                "using": DENSE_VECTOR_NAME if self.enable_hybrid else None,
+                "search_params": self.search_params,
+            }
+
+        if not self.enable_hybrid or self._sparse_query_fn is None:
+            raise ValueError(
+                "Sparse and hybrid search are not enabled. Please build the "
+                "vector store with `enable_hybrid=True`."
+            )
+        indices, values = self._sparse_query_fn([query.query_str])
+        sparse_query = SparseVector(indices=indices[0], values=values[0])
+        if mode == VectorStoreQueryMode.SPARSE:
+            return {
+                **request,
+                "query": sparse_query,
+                "using": SPARSE_VECTOR_NAME,
+                "limit": query.sparse_top_k or query.similarity_top_k,
+            }
+
+        candidates = max(
+            query.sparse_top_k or settings.RETRIEVAL_CANDIDATE_POOL,
+            request["limit"],
+        )
+        return {
+            **request,
+            "prefetch": [
+                Prefetch(
+                    query=query.query_embedding,
+                    using=DENSE_VECTOR_NAME,
+                    filter=query_filter,
+                    params=self.search_params,
+                    limit=candidates,
+                ),
+                Prefetch(
+                    query=sparse_query,
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=candidates,
+                ),
+            ],
+            "query": FusionQuery(fusion=Fusion.RRF),
+        }
+
+    def _query_result(
+        self, query: VectorStoreQuery, points: List[ScoredPoint], **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        if query.mode == VectorStoreQueryMode.MMR and points:
+            embeddings = [
+                (
+                    point.vector[DENSE_VECTOR_NAME]
+                    if isinstance(point.vector, dict)
+                    else point.vector
+                )
+                for point in points
+            ]
+            scores, positions = get_top_k_mmr_embeddings(
+                query.query_embedding,
+                embeddings,
+                similarity_top_k=query.similarity_top_k,
+                embedding_ids=list(range(len(points))),
+                mmr_threshold=kwargs.get("mmr_threshold"),
+            )
+            points = [
+                points[position].model_copy(update={"score": score})
+                for score, position in zip(scores, positions)
+            ]
+        return self.parse_to_query_result(points)
+
+
 init_index = False
 singleton_vector_store = None
+singleton_async_client: AsyncQdrantClient | None = None
+
+
+def hybrid_kwargs() -> Dict[str, Any]:
+    """
+    QdrantVectorStore arguments that write and query BM25 sparse vectors.
+    """
+    if not settings.QDRANT_HYBRID_ENABLED:
+        return {}
+    encoder = BM25SparseEncoder()
+    return {
+        "enable_hybrid": True,
+        "sparse_doc_fn": encoder.encode_documents,
+        "sparse_query_fn": encoder.encode_queries,
+    }
 
 
 def get_vector_store() -> VectorStore:
-    global singleton_vector_store
+    global singleton_vector_store, singleton_async_client
     if singleton_vector_store is not None:
         return singleton_vector_store
 
@@ -33,15 +209,28 @@ def get_vector_store() -> VectorStore:
         )
         client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
 
-    singleton_vector_store = QdrantVectorStore(
+    singleton_async_client = aclient
+    singleton_vector_store = SearchParamsQdrantVectorStore(
         client=client,
         aclient=aclient,
         collection_name=settings.COLLECTION_NAME,
+        quantization_config=quantization_config(),
+        search_params=search_params(),
+        **hybrid_kwargs(),
     )
 
     return singleton_vector_store
 
 
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Async Qdrant client shared with the vector store singleton.
+    """
+    if singleton_async_client is None:
+        get_vector_store()
+    return singleton_async_client
+
+
 async def run_init_vector_store():
     global init_index
     if init_index:
@@ -1,8 +1,13 @@
+import asyncio
 import logging
 import os
-from multiprocessing import Lock
-from multiprocessing.managers import BaseManager
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
+import uvicorn
+from fastapi import FastAPI, HTTPException
 from llama_index.core import (
     SimpleDirectoryReader,
     StorageContext,
@@ -10,84 +15,341 @@ from llama_index.core import (
     load_index_from_storage,
 )
 from llama_index.core.base.response.schema import RESPONSE_TYPE
-from llama_index.core.schema import QueryType
+from llama_index.core.schema import Document, MetadataMode, QueryBundle
+from llama_index.core.settings import Settings
+from pydantic import BaseModel
 
-from qllm.core.config import configure_logging
+from qllm.core.concurrency import AsyncRWLock, BoundedExecutor
+from qllm.core.config import settings
+from qllm.core.logger import configure_logging
+from qllm.core.metrics import metrics
+from qllm.services.ingestion_manifest import IngestionManifest, SyncPlan
 
-configure_logging()
+logger = logging.getLogger("uvicorn")
 
-index_lock = Lock()
-index: VectorStoreIndex | None = None
+query_seconds = metrics.histogram("index_query_seconds", "Latency of index queries")
+insert_seconds = metrics.histogram(
+    "index_insert_seconds", "Latency of an insert batch (load, embed and write)"
+)
+insert_batch_size = metrics.histogram(
+    "index_insert_batch_size",
+    "Files inserted per index write",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+persist_seconds = metrics.histogram(
+    "index_persist_seconds", "Latency of persisting the index to disk"
+)
+
+
+@dataclass
+class InsertRequest:
+    filepath: str
+    doc_id: Optional[str]
+    done: asyncio.Future
+
+
+def load_documents(filepath: str) -> List[Document]:
+    if os.path.isdir(filepath):
+        reader = SimpleDirectoryReader(filepath, filename_as_id=True)
+    else:
+        reader = SimpleDirectoryReader(input_files=[filepath], filename_as_id=True)
+    return reader.load_data()
+
+
+class IndexService:
+    """
+    Local VectorStoreIndex served to concurrent callers.
+
+    Queries share one cached query engine; retrieval runs concurrently on a
+    bounded thread pool under the read side of an AsyncRWLock. Inserts are
+    queued and written in batches by a single writer: files are loaded, diffed
+    against the ingestion manifest and embedded outside the lock, so the write
+    lock only covers the in-memory update. Persisting is deferred to a periodic
+    task; on startup the manifest forgets documents whose chunks did not make
+    it to disk.
+    """
 
+    def __init__(
+        self,
+        index_dir: str = settings.INDEX_DIR,
+        document_dir: str = settings.INDEX_DOCUMENT_DIR,
+        manifest_path: str = settings.INDEX_MANIFEST_PATH,
+        insert_batch_size: int = settings.INDEX_INSERT_BATCH_SIZE,
+        insert_max_wait_ms: float = settings.INDEX_INSERT_MAX_WAIT_MS,
+        persist_interval_seconds: float = settings.INDEX_PERSIST_INTERVAL_SECONDS,
+        query_concurrency: int = settings.INDEX_QUERY_CONCURRENCY,
+        **query_engine_kwargs,
+    ):
+        self.index_dir = index_dir
+        self.document_dir = document_dir
+        self.manifest = IngestionManifest(manifest_path)
+        self.insert_batch_size = insert_batch_size
+        self.insert_max_wait_ms = insert_max_wait_ms
+        self.persist_interval_seconds = persist_interval_seconds
+        self.query_engine_kwargs = query_engine_kwargs
 
-def initialize_index():
-    global index, index_lock
+        self.index: Optional[VectorStoreIndex] = None
+        self.lock = AsyncRWLock()
+        # Retrieval trên vector store cục bộ tốn CPU (numpy, Python) nên chạy
+        # trên thread pool thay vì chặn event loop
+        self.query_executor = BoundedExecutor("index_query", query_concurrency)
+        # Writer và persist loại trừ nhau mà không chặn reader: nếu persist giữ
+        # read lock, writer đang chờ sẽ chặn mọi query mới cho tới khi persist xong
+        self._write_mutex = asyncio.Lock()
+        self._query_engine = None
+        self._inserts: Optional[asyncio.Queue] = None
+        # Số batch đã ghi vào index trong bộ nhớ nhưng chưa persist
+        self._unpersisted = 0
+        self._tasks: List[asyncio.Task] = []
 
-    index_dir = "./.index"
-    document_dir = "./documents"
+        metrics.gauge(
+            "index_pending_inserts",
+            "Insert requests waiting for the index writer",
+            fn=lambda: self._inserts.qsize() if self._inserts else 0,
+        )
+        metrics.gauge(
+            "index_unpersisted_batches",
+            "Insert batches written in memory but not yet persisted",
+            fn=lambda: self._unpersisted,
+        )
 
-    storage_context = StorageContext.from_defaults(persist_dir=index_dir)
-    with index_lock:
-        try:
-            if os.path.exists(index_dir):
-                logging.info("Index directory exists. Loading index from storage.")
-                index = load_index_from_storage(storage_context)
-            else:
-                logging.info("Index directory not found. Creating a new index.")
-                dir_reader = SimpleDirectoryReader(document_dir)
-                documents = dir_reader.load_data()
+    def _load_index(self) -> VectorStoreIndex:
+        if os.path.exists(self.index_dir):
+            logger.info("Index directory exists. Loading index from storage.")
+            storage_context = StorageContext.from_defaults(persist_dir=self.index_dir)
+            index = load_index_from_storage(storage_context)
+            # Các batch chưa kịp persist trước khi process dừng sẽ được ingest lại
+            self.manifest.retain(set(index.docstore.docs))
+            return index
 
-                index = VectorStoreIndex.from_documents(
-                    documents=documents, storage_context=storage_context
+        logger.info("Index directory not found. Creating a new index.")
+        documents = SimpleDirectoryReader(
+            self.document_dir, filename_as_id=True
+        ).load_data()
+        # Ghi nhận các chunk vào manifest để những lần insert sau chỉ embed
+        # phần thay đổi
+        plan = self.manifest.plan(documents, Settings.transformations)
+        index = VectorStoreIndex(
+            nodes=plan.new_nodes, storage_context=StorageContext.from_defaults()
+        )
+        index.storage_context.persist(self.index_dir)
+        self.manifest.commit(plan)
+        logger.info("Index created and persisted successfully.")
+        return index
+
+    async def start(self) -> None:
+        self.index = await asyncio.to_thread(self._load_index)
+        # Query engine chỉ tạo một lần, nó đọc trực tiếp index nên vẫn thấy
+        # các node được insert sau này
+        self._query_engine = self.index.as_query_engine(**self.query_engine_kwargs)
+        self._inserts = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run_writer()),
+            asyncio.create_task(self._run_persister()),
+        ]
+
+    async def stop(self) -> None:
+        await self._inserts.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.persist()
+        self.query_executor.shutdown()
+
+    async def query(self, query_text: str) -> RESPONSE_TYPE:
+        """
+        Retrieve under the read lock, then synthesize the answer outside it so
+        a waiting writer is only held up by retrieval, not by LLM calls.
+        """
+        with query_seconds.time():
+            query_bundle = QueryBundle(query_text)
+            async with self.lock.read():
+                nodes = await self.query_executor.run(
+                    self._query_engine.retrieve, query_bundle
                 )
-                index.storage_context.persist(index_dir)
-                logging.info("Index created and persisted successfully.")
-        except Exception as e:
-            logging.error(f"Error during index initialization: {e}", exc_info=True)
+            return await self._query_engine.asynthesize(query_bundle, nodes)
+
+    async def insert(self, filepath: str, doc_id: Optional[str] = None) -> SyncPlan:
+        """
+        Queue a file (or directory) for insertion and wait until it is in the
+        in-memory index. It is persisted by the next periodic persist.
+        """
+        done = asyncio.get_running_loop().create_future()
+        await self._inserts.put(InsertRequest(filepath, doc_id, done))
+        return await done
+
+    async def _run_writer(self) -> None:
+        while True:
+            batch = [await self._inserts.get()]
+            deadline = time.monotonic() + self.insert_max_wait_ms / 1000
+            while len(batch) < self.insert_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._inserts.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
 
+            try:
+                with insert_seconds.time():
+                    plan = await self._write_batch(batch)
+                for request in batch:
+                    if not request.done.done():
+                        request.done.set_result(plan)
+            except Exception as e:
+                logger.error(f"Error during document insertion: {e}", exc_info=True)
+                for request in batch:
+                    if not request.done.done():
+                        request.done.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._inserts.task_done()
 
-def query_index(query_text: QueryType) -> RESPONSE_TYPE:
-    global index
+    async def _write_batch(self, batch: List[InsertRequest]) -> SyncPlan:
+        insert_batch_size.observe(len(batch))
+        # Cùng một file được insert nhiều lần trong batch thì chỉ xử lý một lần
+        requests: Dict[Tuple[str, Optional[str]], InsertRequest] = {
+            (os.path.abspath(request.filepath), request.doc_id): request
+            for request in batch
+        }
+        plan = await asyncio.to_thread(self._plan, list(requests.values()))
+        logger.info(f"Ingestion plan: {plan.summary()}")
 
+        new_nodes = plan.new_nodes
+        if new_nodes:
+            embeddings = await Settings.embed_model.aget_text_embedding_batch(
+                [
+                    node.get_content(metadata_mode=MetadataMode.EMBED)
+                    for node in new_nodes
+                ]
+            )
+            for node, embedding in zip(new_nodes, embeddings):
+                node.embedding = embedding
+
+        if plan.documents or plan.deleted_documents:
+            async with self._write_mutex, self.lock.write():
+                if plan.stale_node_ids:
+                    self.index.delete_nodes(
+                        plan.stale_node_ids, delete_from_docstore=True
+                    )
+                if new_nodes:
+                    # Node đã có embedding nên insert_nodes không gọi model
+                    self.index.insert_nodes(new_nodes)
+                self._unpersisted += 1
+            await asyncio.to_thread(self.manifest.commit, plan)
+        return plan
+
+    def _plan(self, requests: List[InsertRequest]) -> SyncPlan:
+        doc_keys: Dict[int, str] = {}
+        documents: List[Document] = []
+        for request in requests:
+            for document in load_documents(request.filepath):
+                doc_keys[id(document)] = request.doc_id or document.doc_id
+                documents.append(document)
+        return self.manifest.plan(
+            documents,
+            Settings.transformations,
+            doc_key_fn=lambda document: doc_keys[id(document)],
+        )
+
+    async def _run_persister(self) -> None:
+        while True:
+            await asyncio.sleep(self.persist_interval_seconds)
+            try:
+                await self.persist()
+            except Exception as e:
+                logger.error(f"Error while persisting the index: {e}", exc_info=True)
+
+    async def persist(self) -> None:
+        """
+        Persist the index if it changed. Queries keep running; writes wait
+        until the persist is done.
+        """
+        if not self._unpersisted:
+            return
+        async with self._write_mutex:
+            batches, self._unpersisted = self._unpersisted, 0
+            with persist_seconds.time():
+                await asyncio.to_thread(
+                    self.index.storage_context.persist, self.index_dir
+                )
+        logger.info(f"Index persisted ({batches} insert batches).")
+
+
+index_service: Optional[IndexService] = None
+
+
+class QueryRequest(BaseModel):
+    query: str
+
+
+class InsertIndexRequest(BaseModel):
+    filepath: str
+    doc_id: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global index_service
+
+    from qllm.init_setting import init_openai
+
+    init_openai()
+    index_service = IndexService()
+    await index_service.start()
+    yield
+    await index_service.stop()
+
+
+app = FastAPI(title="qllm index service", lifespan=lifespan)
+
+
+@app.post("/query")
+async def query_index(request: QueryRequest):
     try:
-        logging.info(f"Executing query: {query_text}")
-        query_engine = index.as_query_engine()
-        queried_text = query_engine.query(query_text)
-        logging.info(f"Query executed successfully.")
-        return queried_text
+        logger.info(f"Executing query: {request.query}")
+        response = await index_service.query(request.query)
     except Exception as e:
-        logging.error(f"Error during query execution: {e}", exc_info=True)
-        raise
+        logger.error(f"Error during query execution: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "response": str(response),
+        "source_nodes": [
+            {
+                "node_id": source.node.node_id,
+                "score": source.score,
+                "text": source.node.get_content(),
+                "metadata": source.node.metadata,
+            }
+            for source in response.source_nodes
+        ],
+    }
 
 
-def insert_into_index(filepath, doc_id: str | None = None):
-    global index, index_lock
+@app.post("/insert")
+async def insert_into_index(request: InsertIndexRequest):
+    if not os.path.exists(request.filepath):
+        raise HTTPException(status_code=404, detail="File not found")
 
+    logger.info(
+        f"Inserting document from: {request.filepath} with doc_id: {request.doc_id}"
+    )
     try:
-        logging.info(f"Inserting document from: {filepath} with doc_id: {doc_id}")
-        documents = SimpleDirectoryReader(filepath).load_data()[0]
-        if doc_id is not None:
-            documents.doc_id = doc_id
-
-        with index_lock:
-            index.insert(documents)
-            index.storage_context.persist()
-            logging.info(f"Document inserted and index persisted successfully.")
+        plan = await index_service.insert(request.filepath, request.doc_id)
     except Exception as e:
-        logging.error(f"Error during document insertion: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"summary": plan.summary()}
 
 
-if __name__ == "__main__":
-    try:
-        logging.info("Starting application.")
-        initialize_index()
+def start():
+    os.makedirs("log", exist_ok=True)
+    configure_logging()
+    logger.info("Starting index service.")
+    uvicorn.run(app, host=settings.INDEX_SERVICE_HOST, port=settings.INDEX_SERVICE_PORT)
 
-        manager = BaseManager(("127.0.0.1", 5602), b"Password")
-        manager.register("query_index", query_index)
-        manager.register("insert_into_index", insert_into_index)
-        server = manager.get_server()
 
-        logging.info("Server started. Waiting for connections.")
-        server.serve_forever()
-    except Exception as e:
-        logging.critical(f"Critical error in main process: {e}", exc_info=True)
+if __name__ == "__main__":
+    start()
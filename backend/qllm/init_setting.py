@@ -1,7 +1,12 @@
+import logging
+
 from llama_index.core.callbacks import CallbackManager, LlamaDebugHandler
 from llama_index.core.settings import Settings
 
 from qllm.core.config import settings as app_settings
+from qllm.services.embedding_service import init_embedding_service
+
+logger = logging.getLogger("uvicorn")
 
 
 def init_debug_handler():
@@ -10,6 +15,17 @@ def init_debug_handler():
     Settings.callback_manager = CallbackManager([llama_debug])
 
 
+def init_tokenizer(model: str):
+    import tiktoken
+
+    # Đếm token bằng tokenizer của model (gpt-4o dùng o200k_base, không phải
+    # cl100k_base mặc định) để gói ngữ cảnh và cắt lịch sử cho đúng
+    try:
+        Settings.tokenizer = tiktoken.encoding_for_model(model).encode
+    except Exception as e:
+        logger.warning(f"No tiktoken encoding for {model}, using the default: {e}")
+
+
 def init_openai():
     from llama_index.core.constants import DEFAULT_TEMPERATURE
     from llama_index.embeddings.openai import OpenAIEmbedding
@@ -25,12 +41,17 @@ def init_openai():
         ),
         max_tokens=int(max_tokens) if max_tokens is not None else None,
     )
+    init_tokenizer(app_settings.LLM_OPENAI_MODEL)
 
     dimensions = app_settings.EMBEDDING_DIM
     embedding_model = app_settings.EMBEDDING_MODEL
-    Settings.embed_model = OpenAIEmbedding(
-        model=embedding_model or "text-embedding-3-small",
-        dimensions=dimensions,
+    # OpenAI embed query và document bằng cùng một model nên gộp chung batch
+    Settings.embed_model = init_embedding_service(
+        OpenAIEmbedding(
+            model=embedding_model or "text-embedding-3-small",
+            dimensions=dimensions,
+        ),
+        query_as_text=True,
     )
 
     init_debug_handler()
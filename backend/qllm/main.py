@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 from contextlib import asynccontextmanager
@@ -13,11 +14,17 @@ from llama_index.core.node_parser.text.utils import split_by_sentence_tokenizer
 from sqlalchemy.engine import Engine, create_engine
 
 # from qllm.core.utils import mount_static_files
+from qllm.api.middlewares.jwt import password_hasher
 from qllm.api.routers import api_router
+from qllm.chat.engine import init_chat_engine_factory
+from qllm.chat.tools.pubmed_client import close_pubmed_client
 from qllm.core.config import AppEnvironment, settings
+from qllm.core.database import engine as db_engine
 from qllm.core.vector_store import get_vector_store, run_init_vector_store
 from qllm.init_setting import init_openai
 from qllm.services.db.wait_for_db import check_database_connection
+from qllm.services.ingestion import init_ingestion_pipeline
+from qllm.services.message_writer import message_writer, run_stale_message_sweeper
 
 logger = logging.getLogger("uvicorn")
 
@@ -58,7 +65,7 @@ async def lifespan(app: FastAPI):
     cfg.set_main_option("script_location", script_location)
 
     cfg.set_main_option("sqlalchemy.url", db_url)
-    engine = create_engine(db_url, echo=True)
+    engine = create_engine(db_url, echo=settings.DB_ECHO)
     if not check_current_head(cfg, engine):
         logger.info(
             "Database is not up to date. Please run `poetry run alembic upgrade head`"
@@ -67,12 +74,16 @@ async def lifespan(app: FastAPI):
         alembic_args = ["--raiseerr", "upgrade", "head"]
         alembic.config.main(argv=alembic_args)
         logger.info("Migrations complete")
+    engine.dispose()
     # initialize pg vector store singleton
     vector_store = get_vector_store()
     await run_init_vector_store()
 
     init_openai()
 
+    # Build the shared chat engine resources once for the whole process
+    init_chat_engine_factory(vector_store=vector_store)
+
     try:
         # Some setup is required to initialize the llama-index sentence splitter
         # for checking dependencies
@@ -80,9 +91,21 @@ async def lifespan(app: FastAPI):
     except FileExistsError:
         # Sometimes seen in deployments, should be benign.
         logger.info("Tried to re-download NLTK files but already exists.")
+
+    await message_writer.start()
+    # Pipeline index file upload (parse -> chunk -> embed -> upsert) chạy nền
+    ingestion_pipeline = init_ingestion_pipeline(vector_store=vector_store)
+    # Đánh dấu ERROR các câu trả lời PENDING bị bỏ dở (worker chết giữa chừng)
+    stale_message_sweeper = asyncio.create_task(run_stale_message_sweeper())
     yield
     # This section is run on app shutdown
+    stale_message_sweeper.cancel()
+    await ingestion_pipeline.stop()
+    await message_writer.stop()
+    await close_pubmed_client()
     await vector_store.close()
+    password_hasher.shutdown()
+    await db_engine.dispose()
 
 
 app = FastAPI(
@@ -104,6 +127,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Message-Id"],
     )
 else:
     origins = [
@@ -121,6 +145,7 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Message-Id"],
     )
 
 app.include_router(api_router, prefix=settings.API_PREFIX)
@@ -1,9 +1,21 @@
 from datetime import UTC, datetime
 from enum import Enum
 
-from sqlalchemy import JSON, UUID, Column, DateTime, Float, ForeignKey, String, Text
+from sqlalchemy import (
+    JSON,
+    UUID,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.dialects.postgresql import ENUM, JSONB
 from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql import func
 
 from .base import Base
 
@@ -41,6 +53,9 @@ class Conversation(Base):
     # Other columns
     title = Column(String, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
+    # Tóm tắt các message cũ, đã gộp tới message có created_at = summarized_until
+    summary = Column(Text, nullable=True)
+    summarized_until = Column(DateTime, nullable=True)
 
     # Relationships
     messages = relationship(
@@ -63,6 +78,8 @@ class MessageStatusEnum(str, Enum):
     PENDING = "PENDING"
     SUCCESS = "SUCCESS"
     ERROR = "ERROR"
+    # Client ngắt kết nối khi câu trả lời đang được sinh
+    CANCELLED = "CANCELLED"
 
 
 class MessageSubProcessStatusEnum(str, Enum):
@@ -105,6 +122,11 @@ class Message(Base):
     A message in a conversation
     """
 
+    # Lịch sử chat được đọc theo (conversation_id, created_at) mới nhất trước
+    __table_args__ = (
+        Index("ix_message_conversation_id_created_at", "conversation_id", "created_at"),
+    )
+
     conversation_id = Column(
         UUID(as_uuid=True), ForeignKey("conversation.id"), index=True
     )
@@ -136,11 +158,24 @@ class MessageSubProcess(Base):
     metadata_map = Column(JSONB, nullable=True)
 
 
+class MedicalRecordStatusEnum(str, Enum):
+    PENDING = "PENDING"  # Đã upload, đang chờ trong hàng đợi ingestion
+    PROCESSING = "PROCESSING"
+    INDEXED = "INDEXED"
+    ERROR = "ERROR"
+
+
 class MedicalRecord(Base):
     user_id = Column(UUID, ForeignKey("user.id"), nullable=False)
     file_name = Column(String(255), nullable=False)
     file_path = Column(Text, nullable=False)
     description = Column(Text, nullable=True)
+    status = Column(
+        to_pg_enum(MedicalRecordStatusEnum),
+        nullable=False,
+        default=MedicalRecordStatusEnum.PENDING,
+    )
+    chunk_count = Column(Integer, nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="medical_records")
@@ -172,6 +207,7 @@ class Memory(Base):
     meta_data = Column(JSON)  # Lưu trữ metadata bổ sung
     embedding = Column(JSON)  # Vector embedding của memory
     importance_score = Column(Float, default=0.0)  # Điểm quan trọng của memory
+    last_accessed = Column(DateTime, server_default=func.now(), nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="memories")
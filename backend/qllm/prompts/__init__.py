@@ -17,6 +17,7 @@ DEFAULT_PROMPTS = {
     },
     "query_transform": {"file": "query_transform.txt", "kwargs": {}},
     "synthesis": {"file": "synthesis.txt", "kwargs": {}},
+    "summary": {"file": "summary.txt", "kwargs": {"max_words": 250}},
 }
 
 
@@ -0,0 +1,66 @@
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from qllm.core.config import settings
+
+# Giữ nguyên mã ICD (E11.9), chỉ số xét nghiệm (7.2), đơn vị (mmol/l) và tên
+# thuốc có gạch nối thành một token thay vì tách nhỏ
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,/\-+]\w+)*")
+
+BatchSparseEncoding = Tuple[List[List[int]], List[List[float]]]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def token_id(token: str) -> int:
+    # hash() của Python đổi theo từng process nên không dùng được làm chỉ số
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFF
+
+
+class BM25SparseEncoder:
+    """
+    BM25 term weights as Qdrant sparse vectors.
+
+    Documents carry the saturated, length-normalised term frequency; queries
+    carry 1.0 per term. The IDF factor is applied by Qdrant at search time
+    (sparse vector `modifier=IDF`), so the collection statistics stay correct
+    as records are added and deleted without re-encoding anything.
+    """
+
+    def __init__(
+        self,
+        k1: float = settings.BM25_K1,
+        b: float = settings.BM25_B,
+        avg_doc_length: float = settings.BM25_AVG_DOC_LENGTH,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length
+
+    def _document_vector(self, text: str) -> Dict[int, float]:
+        tokens = tokenize(text)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+        vector: Dict[int, float] = {}
+        for token, tf in Counter(tokens).items():
+            index = token_id(token)
+            vector[index] = vector.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+        return vector
+
+    def encode_documents(self, texts: List[str]) -> BatchSparseEncoding:
+        return _as_batch([self._document_vector(text) for text in texts])
+
+    def encode_queries(self, texts: List[str]) -> BatchSparseEncoding:
+        return _as_batch(
+            [{token_id(token): 1.0 for token in tokenize(text)} for text in texts]
+        )
+
+
+def _as_batch(vectors: List[Dict[int, float]]) -> BatchSparseEncoding:
+    indices = [list(vector.keys()) for vector in vectors]
+    values = [list(vector.values()) for vector in vectors]
+    return indices, values
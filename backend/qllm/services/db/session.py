@@ -1,22 +1,6 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+# Engine và session factory dùng chung được định nghĩa ở qllm.core.database
+from qllm.core.database import DATABASE_URL, async_session_maker, engine
 
-from qllm.core.config import settings
+SessionLocal = async_session_maker
 
-# Database connection settings
-DATABASE_URL = settings.DATABASE_URL
-
-
-# Create the SQLAlchemy engine
-engine = create_async_engine(
-    str(DATABASE_URL),
-    pool_pre_ping=True,
-    pool_size=4,  # Number of connections to keep open in the pool
-    max_overflow=4,  # Number of connections that can be opened beyond the pool_size
-    pool_recycle=3600,  # Recycle connections after 1 hour
-    pool_timeout=120,  # Raise an exception after 2 minutes if no connection is available from the pool
-)
-
-# Create a configured "Session" class
-SessionLocal = async_sessionmaker(
-    bind=engine, autocommit=False, autoflush=False, expire_on_commit=False
-)
+__all__ = ["DATABASE_URL", "engine", "SessionLocal"]
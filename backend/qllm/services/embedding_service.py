@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from cachetools import LRUCache
+from llama_index.core.base.embeddings.base import Embedding
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+QUERY = "query"
+TEXT = "text"
+
+embedding_requests = metrics.counter(
+    "embedding_requests_total", "Texts requested from the embedding service"
+)
+embedding_cache_hits = metrics.counter(
+    "embedding_cache_hits_total", "Embeddings served from the LRU cache"
+)
+embedding_inflight_dedup = metrics.counter(
+    "embedding_inflight_dedup_total",
+    "Embedding requests joined to an identical request already in flight",
+)
+embedding_model_calls = metrics.counter(
+    "embedding_model_calls_total", "Calls made to the underlying embedding model"
+)
+embedding_batch_size = metrics.histogram(
+    "embedding_batch_size",
+    "Texts sent per call to the underlying embedding model",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+embedding_batch_seconds = metrics.histogram(
+    "embedding_batch_seconds", "Latency of calls to the underlying embedding model"
+)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Tránh cảnh báo "exception was never retrieved" khi mọi caller đã bị huỷ
+    if not future.cancelled():
+        future.exception()
+
+
+class _Batch:
+    """Texts waiting to be sent together to the embedding model."""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.texts: List[str] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+class CoalescingEmbedding(BaseEmbedding):
+    """
+    Shared embedding service wrapping another embedding model.
+
+    Concurrent async requests are micro-batched (up to `max_batch_size` texts,
+    waiting at most `max_wait_ms` for more), identical texts in flight share
+    one request, and results are kept in an LRU keyed by model name, mode and
+    content hash. Sync calls only use the cache.
+    """
+
+    max_batch_size: int = 64
+    max_wait_ms: float = 5.0
+    query_as_text: bool = False
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: LRUCache = PrivateAttr()
+    _cache_lock: threading.Lock = PrivateAttr()
+    _loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(default=None)
+    _inflight: Dict[str, asyncio.Future] = PrivateAttr(default_factory=dict)
+    _batches: Dict[str, _Batch] = PrivateAttr(default_factory=dict)
+    _tasks: Set[asyncio.Task] = PrivateAttr(default_factory=set)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_batch_size: int = settings.EMBEDDING_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.EMBEDDING_MAX_WAIT_MS,
+        cache_size: int = settings.EMBEDDING_CACHE_SIZE,
+        query_as_text: bool = False,
+        **kwargs,
+    ):
+        """
+        `query_as_text`: the model embeds queries and documents the same way
+        (e.g. OpenAI text-embedding-3-*), so queries can share text batches.
+        """
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=max_batch_size,
+            callback_manager=embed_model.callback_manager,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            query_as_text=query_as_text,
+            **kwargs,
+        )
+        self._inner = embed_model
+        self._cache = LRUCache(maxsize=max(cache_size, 1))
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CoalescingEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _mode(self, mode: str) -> str:
+        return TEXT if self.query_as_text else mode
+
+    def _key(self, mode: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{self._mode(mode)}:{digest}"
+
+    def _cache_get(self, key: str) -> Optional[Embedding]:
+        with self._cache_lock:
+            return self._cache.get(key)
+
+    def _cache_set(self, key: str, embedding: Embedding) -> None:
+        with self._cache_lock:
+            self._cache[key] = embedding
+
+    # Sync API: chỉ dùng cache, không gộp batch
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_embeddings(QUERY, [query])[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_embeddings(TEXT, [text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._get_embeddings(TEXT, texts)
+
+    def _get_embeddings(self, mode: str, texts: List[str]) -> List[Embedding]:
+        embedding_requests.inc(len(texts))
+        keys = [self._key(mode, text) for text in texts]
+        results = [self._cache_get(key) for key in keys]
+        missing = {key: text for key, text, r in zip(keys, texts, results) if r is None}
+        embedding_cache_hits.inc(len(texts) - len(missing))
+        if missing:
+            embeddings = self._call_inner_sync(mode, list(missing.values()))
+            computed = dict(zip(missing, embeddings))
+            for key, embedding in computed.items():
+                self._cache_set(key, embedding)
+            results = [
+                r if r is not None else computed[k] for k, r in zip(keys, results)
+            ]
+        return results
+
+    def _call_inner_sync(self, mode: str, texts: List[str]) -> List[Embedding]:
+        embedding_model_calls.inc()
+        embedding_batch_size.observe(len(texts))
+        with embedding_batch_seconds.time():
+            if self._mode(mode) == QUERY:
+                return [self._inner._get_query_embedding(text) for text in texts]
+            return self._inner._get_text_embeddings(texts)
+
+    # Async API: gộp các request đồng thời thành batch
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aget_embeddings(QUERY, [query]))[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_embeddings(TEXT, [text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aget_embeddings(TEXT, texts)
+
+    async def _aget_embeddings(self, mode: str, texts: List[str]) -> List[Embedding]:
+        self._bind_loop()
+        embedding_requests.inc(len(texts))
+        mode = self._mode(mode)
+
+        futures: List[asyncio.Future] = []
+        for text in texts:
+            key = self._key(mode, text)
+            cached = self._cache_get(key)
+            if cached is not None:
+                embedding_cache_hits.inc()
+                future = self._loop.create_future()
+                future.set_result(cached)
+            elif key in self._inflight:
+                embedding_inflight_dedup.inc()
+                future = self._inflight[key]
+            else:
+                future = self._loop.create_future()
+                future.add_done_callback(_consume_exception)
+                self._inflight[key] = future
+                self._enqueue(mode, key, text)
+            futures.append(future)
+
+        # shield: một caller bị huỷ không được huỷ future dùng chung
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Future gắn với event loop, đổi loop thì bỏ trạng thái cũ
+            self._loop = loop
+            self._inflight = {}
+            self._batches = {}
+
+    def _enqueue(self, mode: str, key: str, text: str) -> None:
+        batch = self._batches.get(mode)
+        if batch is None:
+            batch = self._batches[mode] = _Batch()
+            batch.flush_handle = self._loop.call_later(
+                self.max_wait_ms / 1000, self._flush, mode
+            )
+        batch.keys.append(key)
+        batch.texts.append(text)
+        if len(batch.texts) >= self.max_batch_size:
+            self._flush(mode)
+
+    def _flush(self, mode: str) -> None:
+        batch = self._batches.pop(mode, None)
+        if batch is None:
+            return
+        batch.flush_handle.cancel()
+        task = self._loop.create_task(self._run_batch(mode, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, mode: str, batch: _Batch) -> None:
+        embedding_model_calls.inc()
+        embedding_batch_size.observe(len(batch.texts))
+        start = time.perf_counter()
+        try:
+            if mode == QUERY:
+                embeddings = await asyncio.gather(
+                    *(self._inner._aget_query_embedding(text) for text in batch.texts)
+                )
+            else:
+                embeddings = await self._inner._aget_text_embeddings(batch.texts)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch.texts)} texts failed: {e}")
+            for key in batch.keys:
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            embedding_batch_seconds.observe(time.perf_counter() - start)
+
+        for key, embedding in zip(batch.keys, embeddings):
+            self._cache_set(key, embedding)
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(embedding)
+
+
+def init_embedding_service(embed_model: BaseEmbedding, **kwargs) -> BaseEmbedding:
+    """
+    Wrap `embed_model` in the shared CoalescingEmbedding unless disabled.
+    """
+    if not settings.EMBEDDING_SERVICE_ENABLED or isinstance(
+        embed_model, CoalescingEmbedding
+    ):
+        return embed_model
+    return CoalescingEmbedding(embed_model, **kwargs)
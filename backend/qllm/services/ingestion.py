@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+from uuid import UUID
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode
+from llama_index.core.settings import Settings
+from llama_index.core.vector_stores.types import VectorStore
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import FieldCondition, Filter, FilterSelector, MatchValue
+from sqlalchemy import update
+
+from qllm.core.config import settings
+from qllm.core.database import async_session_maker
+from qllm.core.metrics import metrics
+from qllm.core.vector_store import get_async_qdrant_client
+from qllm.models import model
+
+logger = logging.getLogger("uvicorn")
+
+
+class StageMetrics:
+    """
+    Items processed, busy time and throughput (items / busy second) of a stage.
+    """
+
+    def __init__(self, stage: str, unit: str):
+        self.items = metrics.counter(
+            f"ingest_{stage}_items_total", f"{unit} processed by the {stage} stage"
+        )
+        self.seconds = metrics.histogram(
+            f"ingest_{stage}_seconds", f"Latency of one {stage} step"
+        )
+        metrics.gauge(
+            f"ingest_{stage}_items_per_second",
+            f"Throughput of the {stage} stage ({unit} per busy second)",
+            fn=lambda: self.items.value / self.seconds.sum if self.seconds.sum else 0,
+        )
+
+
+stage_metrics = {
+    "parse": StageMetrics("parse", "documents"),
+    "chunk": StageMetrics("chunk", "chunks"),
+    "embed": StageMetrics("embed", "chunks"),
+    "upsert": StageMetrics("upsert", "points"),
+}
+jobs_completed = metrics.counter(
+    "ingest_jobs_completed_total", "Medical records indexed successfully"
+)
+jobs_failed = metrics.counter("ingest_jobs_failed_total", "Medical records that failed")
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+@dataclass
+class IngestionJob:
+    record_id: UUID
+    user_id: UUID
+    file_path: str
+    file_name: str
+    nodes: List[BaseNode] = field(default_factory=list)
+    remaining_batches: int = 0
+    failed: bool = False
+
+
+class IngestionPipeline:
+    """
+    Async ingestion of uploaded medical records:
+    parse -> chunk -> batched embedding -> batched Qdrant upsert.
+
+    Stages are connected by bounded queues and run by a fixed number of workers,
+    so a large upload only occupies pipeline workers (parsing and chunking run
+    on threads) and a full intake queue is reported to the caller instead of
+    piling up work.
+
+    A record that fails at any stage has the points of its already upserted
+    batches removed from Qdrant, so it is either fully indexed or not at all.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embed_model: Optional[BaseEmbedding] = None,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+        parse_workers: int = settings.INGEST_PARSE_WORKERS,
+        embed_workers: int = settings.INGEST_EMBED_WORKERS,
+        upsert_workers: int = settings.INGEST_UPSERT_WORKERS,
+        embed_batch_size: int = settings.INGEST_EMBED_BATCH_SIZE,
+        chunk_size: int = settings.INGEST_CHUNK_SIZE,
+        chunk_overlap: int = settings.INGEST_CHUNK_OVERLAP,
+        aclient: Optional[AsyncQdrantClient] = None,
+        collection_name: str = settings.COLLECTION_NAME,
+    ):
+        self.vector_store = vector_store
+        self._embed_model = embed_model
+        self._aclient = aclient
+        self.collection_name = collection_name
+        self.parse_workers = parse_workers
+        self.embed_workers = embed_workers
+        self.upsert_workers = upsert_workers
+        self.embed_batch_size = embed_batch_size
+        self.splitter = SentenceSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+
+        self._intake: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._to_embed: asyncio.Queue = asyncio.Queue(maxsize=parse_workers)
+        self._to_upsert: asyncio.Queue = asyncio.Queue(maxsize=embed_workers * 2)
+        self._workers: List[asyncio.Task] = []
+
+        for name, queue in (
+            ("intake", self._intake),
+            ("embed", self._to_embed),
+            ("upsert", self._to_upsert),
+        ):
+            metrics.gauge(
+                f"ingest_{name}_queue_depth",
+                f"Items waiting in the ingestion {name} queue",
+                fn=queue.qsize,
+            )
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model or Settings.embed_model
+
+    @property
+    def aclient(self) -> AsyncQdrantClient:
+        return self._aclient or get_async_qdrant_client()
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        for _ in range(self.parse_workers):
+            self._workers.append(asyncio.create_task(self._parse_worker()))
+        for _ in range(self.embed_workers):
+            self._workers.append(asyncio.create_task(self._embed_worker()))
+        for _ in range(self.upsert_workers):
+            self._workers.append(asyncio.create_task(self._upsert_worker()))
+        logger.info(f"Ingestion pipeline started with {len(self._workers)} workers")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def is_full(self) -> bool:
+        return self._intake.full()
+
+    def submit(self, job: IngestionJob) -> None:
+        """
+        Queue an uploaded file. Raises IngestionQueueFull instead of waiting.
+        """
+        try:
+            self._intake.put_nowait(job)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull()
+
+    async def _parse_worker(self) -> None:
+        while True:
+            job = await self._intake.get()
+            try:
+                await self._set_status(job, model.MedicalRecordStatusEnum.PROCESSING)
+                job.nodes = await self._parse_and_chunk(job)
+                if not job.nodes:
+                    await self._complete(job)
+                    continue
+
+                batches = []
+                for start in range(0, len(job.nodes), self.embed_batch_size):
+                    end = start + self.embed_batch_size
+                    batches.append(job.nodes[start:end])
+                job.remaining_batches = len(batches)
+                for batch in batches:
+                    # Chờ khi hàng đợi embed đầy (backpressure)
+                    await self._to_embed.put((job, batch))
+            except Exception as e:
+                await self._fail(job, "parse", e)
+
+    async def _parse_and_chunk(self, job: IngestionJob) -> List[BaseNode]:
+        start = time.perf_counter()
+        documents = await asyncio.to_thread(
+            SimpleDirectoryReader(input_files=[job.file_path]).load_data
+        )
+        stage_metrics["parse"].seconds.observe(time.perf_counter() - start)
+        stage_metrics["parse"].items.inc(len(documents))
+
+        for document in documents:
+            document.metadata.update(
+                {
+                    "user_id": str(job.user_id),
+                    "medical_record_id": str(job.record_id),
+                    "file_name": job.file_name,
+                }
+            )
+            document.excluded_embed_metadata_keys.extend(
+                ["user_id", "medical_record_id"]
+            )
+            document.excluded_llm_metadata_keys.extend(["user_id", "medical_record_id"])
+
+        start = time.perf_counter()
+        nodes = await asyncio.to_thread(
+            self.splitter.get_nodes_from_documents, documents
+        )
+        stage_metrics["chunk"].seconds.observe(time.perf_counter() - start)
+        stage_metrics["chunk"].items.inc(len(nodes))
+        return nodes
+
+    async def _embed_worker(self) -> None:
+        while True:
+            job, batch = await self._to_embed.get()
+            if job.failed:
+                continue
+            try:
+                start = time.perf_counter()
+                embeddings = await self.embed_model.aget_text_embedding_batch(
+                    [node.get_content(metadata_mode="embed") for node in batch]
+                )
+                stage_metrics["embed"].seconds.observe(time.perf_counter() - start)
+                stage_metrics["embed"].items.inc(len(batch))
+
+                for node, embedding in zip(batch, embeddings):
+                    node.embedding = embedding
+                await self._to_upsert.put((job, batch))
+            except Exception as e:
+                await self._fail(job, "embed", e)
+
+    async def _upsert_worker(self) -> None:
+        while True:
+            job, batch = await self._to_upsert.get()
+            if job.failed:
+                continue
+            try:
+                start = time.perf_counter()
+                await self.vector_store.async_add(batch)
+                stage_metrics["upsert"].seconds.observe(time.perf_counter() - start)
+                stage_metrics["upsert"].items.inc(len(batch))
+
+                if job.failed:
+                    # Job lỗi trong lúc batch này đang ghi: xóa lại các điểm vừa ghi
+                    await self._delete_points(job)
+                    continue
+                job.remaining_batches -= 1
+                if job.remaining_batches == 0:
+                    await self._complete(job)
+            except Exception as e:
+                await self._fail(job, "upsert", e)
+
+    async def _complete(self, job: IngestionJob) -> None:
+        await self._set_status(
+            job, model.MedicalRecordStatusEnum.INDEXED, chunk_count=len(job.nodes)
+        )
+        job.nodes = []
+        jobs_completed.inc()
+        logger.info(f"Indexed medical record {job.record_id} ({job.file_name})")
+
+    async def _fail(self, job: IngestionJob, stage: str, error: Exception) -> None:
+        if job.failed:
+            return
+        job.failed = True
+        job.nodes = []
+        jobs_failed.inc()
+        logger.error(
+            f"Ingestion of medical record {job.record_id} failed at {stage}: {error}"
+        )
+        # Xóa các batch đã ghi vào Qdrant trước khi lỗi
+        await self._delete_points(job)
+        try:
+            await self._set_status(
+                job, model.MedicalRecordStatusEnum.ERROR, chunk_count=0
+            )
+        except Exception as e:
+            logger.error(f"Could not mark medical record {job.record_id} failed: {e}")
+
+    async def _delete_points(self, job: IngestionJob) -> None:
+        try:
+            await self.aclient.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(
+                    filter=Filter(
+                        must=[
+                            FieldCondition(
+                                key="medical_record_id",
+                                match=MatchValue(value=str(job.record_id)),
+                            )
+                        ]
+                    )
+                ),
+            )
+        except Exception as e:
+            logger.error(
+                f"Could not remove chunks of medical record {job.record_id}: {e}"
+            )
+
+    async def _set_status(
+        self, job: IngestionJob, status: model.MedicalRecordStatusEnum, **values
+    ) -> None:
+        async with async_session_maker() as db:
+            await db.execute(
+                update(model.MedicalRecord)
+                .where(model.MedicalRecord.id == job.record_id)
+                .values(status=status, **values)
+            )
+            await db.commit()
+
+
+ingestion_pipeline: Optional[IngestionPipeline] = None
+
+
+def init_ingestion_pipeline(vector_store: VectorStore, **kwargs) -> IngestionPipeline:
+    """
+    Build and start the process-wide pipeline. Called once from the app lifespan.
+    """
+    global ingestion_pipeline
+    ingestion_pipeline = IngestionPipeline(vector_store, **kwargs)
+    ingestion_pipeline.start()
+    return ingestion_pipeline
+
+
+def get_ingestion_pipeline() -> Optional[IngestionPipeline]:
+    return ingestion_pipeline
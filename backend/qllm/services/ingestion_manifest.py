@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from uuid import NAMESPACE_URL, uuid5
+
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import (
+    BaseNode,
+    Document,
+    MetadataMode,
+    NodeRelationship,
+    TransformComponent,
+)
+from llama_index.core.settings import Settings
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+
+logger = logging.getLogger("uvicorn")
+
+documents_skipped = metrics.counter(
+    "ingest_manifest_documents_skipped_total",
+    "Documents skipped because their content hash did not change",
+)
+chunks_skipped = metrics.counter(
+    "ingest_manifest_chunks_skipped_total",
+    "Chunks of changed documents that were already indexed",
+)
+chunks_added = metrics.counter(
+    "ingest_manifest_chunks_added_total", "New or modified chunks embedded and upserted"
+)
+chunks_deleted = metrics.counter(
+    "ingest_manifest_chunks_deleted_total",
+    "Chunks removed from the vector store (modified or deleted documents)",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document (
+    doc_key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunk (
+    node_id TEXT PRIMARY KEY,
+    doc_key TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_chunk_doc_key ON chunk (doc_key);
+"""
+
+
+def content_hash(node: BaseNode) -> str:
+    # Hash đúng phần nội dung được đưa vào embedding (text + metadata embed)
+    content = node.get_content(metadata_mode=MetadataMode.EMBED)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def chunk_node_id(doc_key: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """
+    Deterministic node (Qdrant point) id of a chunk: unchanged chunks keep
+    their id across runs, so re-upserting them is idempotent.
+    """
+    return str(uuid5(NAMESPACE_URL, f"{doc_key}#{chunk_hash}#{occurrence}"))
+
+
+@dataclass
+class DocumentPlan:
+    """What has to change in the vector store for one document."""
+
+    doc_key: str
+    doc_hash: str
+    chunk_hashes: Dict[str, str] = field(default_factory=dict)  # node_id -> hash
+    new_nodes: List[BaseNode] = field(default_factory=list)
+    stale_node_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SyncPlan:
+    documents: List[DocumentPlan] = field(default_factory=list)
+    # Document không còn trong corpus: doc_key -> node ids cần xoá
+    deleted_documents: Dict[str, List[str]] = field(default_factory=dict)
+    skipped_documents: int = 0
+    skipped_chunks: int = 0
+
+    @property
+    def new_nodes(self) -> List[BaseNode]:
+        return [node for plan in self.documents for node in plan.new_nodes]
+
+    @property
+    def stale_node_ids(self) -> List[str]:
+        stale = [node_id for plan in self.documents for node_id in plan.stale_node_ids]
+        for node_ids in self.deleted_documents.values():
+            stale.extend(node_ids)
+        return stale
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.documents)} documents changed, "
+            f"{self.skipped_documents} unchanged, "
+            f"{len(self.deleted_documents)} deleted; "
+            f"{len(self.new_nodes)} chunks to embed, "
+            f"{self.skipped_chunks} reused, {len(self.stale_node_ids)} to delete"
+        )
+
+
+class IngestionManifest:
+    """
+    On-disk (SQLite) record of what is already in the vector store: the content
+    hash of every ingested document and the hash and node id of each of its
+    chunks. Used to turn a re-ingest into an incremental job proportional to the
+    diff: unchanged documents are skipped before chunking, unchanged chunks of a
+    modified document are not re-embedded, and chunks that disappeared are
+    deleted from the vector store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_settings(cls) -> "IngestionManifest":
+        return cls(path=settings.INGEST_MANIFEST_PATH)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def document_hashes(self) -> Dict[str, str]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT doc_key, content_hash FROM document"))
+
+    def chunk_ids(self, doc_keys: Iterable[str]) -> Dict[str, Set[str]]:
+        doc_keys = list(doc_keys)
+        result: Dict[str, Set[str]] = {doc_key: set() for doc_key in doc_keys}
+        if not doc_keys:
+            return result
+
+        placeholders = ",".join("?" * len(doc_keys))
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT doc_key, node_id FROM chunk WHERE doc_key IN ({placeholders})",
+                doc_keys,
+            )
+            for doc_key, node_id in rows:
+                result[doc_key].add(node_id)
+        return result
+
+    def plan(
+        self,
+        documents: Sequence[Document],
+        transformations: Sequence[TransformComponent],
+        delete_missing: bool = False,
+        doc_key_fn: Callable[[Document], str] = lambda doc: doc.doc_id,
+    ) -> SyncPlan:
+        """
+        Diff `documents` against the manifest. Only changed documents are run
+        through `transformations`; their chunks get deterministic ids and only
+        the ones not already indexed end up in `new_nodes`. With
+        `delete_missing`, known documents absent from `documents` are scheduled
+        for deletion (use it when `documents` is the whole corpus).
+        """
+        known = self.document_hashes()
+        sync_plan = SyncPlan()
+
+        changed: Dict[str, Tuple[str, List[Document]]] = {}
+        seen: Set[str] = set()
+        for doc in documents:
+            doc_key = doc_key_fn(doc)
+            seen.add(doc_key)
+            doc_hash = content_hash(doc)
+            if doc_key in changed:
+                # Nhiều document cùng key (VD: các trang của một file PDF)
+                previous_hash, docs = changed[doc_key]
+                docs.append(doc)
+                changed[doc_key] = (_combine(previous_hash, doc_hash), docs)
+            else:
+                changed[doc_key] = (doc_hash, [doc])
+
+        for doc_key in list(changed):
+            if known.get(doc_key) == changed[doc_key][0]:
+                del changed[doc_key]
+                sync_plan.skipped_documents += 1
+
+        existing = self.chunk_ids(changed)
+        for doc_key, (doc_hash, docs) in changed.items():
+            nodes = run_transformations(docs, transformations)
+            plan = self._plan_document(doc_key, doc_hash, nodes, existing[doc_key])
+            sync_plan.skipped_chunks += len(plan.chunk_hashes) - len(plan.new_nodes)
+            sync_plan.documents.append(plan)
+
+        if delete_missing:
+            missing = [doc_key for doc_key in known if doc_key not in seen]
+            sync_plan.deleted_documents = {
+                doc_key: sorted(node_ids)
+                for doc_key, node_ids in self.chunk_ids(missing).items()
+            }
+        return sync_plan
+
+    @staticmethod
+    def _plan_document(
+        doc_key: str, doc_hash: str, nodes: List[BaseNode], existing: Set[str]
+    ) -> DocumentPlan:
+        plan = DocumentPlan(doc_key=doc_key, doc_hash=doc_hash)
+        occurrences: Counter = Counter()
+        renamed: Dict[str, str] = {}
+        for node in nodes:
+            chunk_hash = content_hash(node)
+            node_id = chunk_node_id(doc_key, chunk_hash, occurrences[chunk_hash])
+            occurrences[chunk_hash] += 1
+            renamed[node.node_id] = node_id
+            node.id_ = node_id
+            plan.chunk_hashes[node_id] = chunk_hash
+            if node_id not in existing:
+                plan.new_nodes.append(node)
+
+        # Cập nhật quan hệ prev/next sang id mới
+        for node in nodes:
+            for relation in (NodeRelationship.PREVIOUS, NodeRelationship.NEXT):
+                related = node.relationships.get(relation)
+                if related is not None and related.node_id in renamed:
+                    related.node_id = renamed[related.node_id]
+
+        plan.stale_node_ids = sorted(existing - set(plan.chunk_hashes))
+        return plan
+
+    def commit(self, sync_plan: SyncPlan) -> None:
+        """
+        Record a plan once its changes are in the vector store.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            for plan in sync_plan.documents:
+                conn.execute("DELETE FROM chunk WHERE doc_key = ?", (plan.doc_key,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunk (node_id, doc_key, chunk_hash) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (node_id, plan.doc_key, chunk_hash)
+                        for node_id, chunk_hash in plan.chunk_hashes.items()
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO document "
+                    "(doc_key, content_hash, updated_at) VALUES (?, ?, ?)",
+                    (plan.doc_key, plan.doc_hash, now),
+                )
+            for doc_key in sync_plan.deleted_documents:
+                conn.execute("DELETE FROM chunk WHERE doc_key = ?", (doc_key,))
+                conn.execute("DELETE FROM document WHERE doc_key = ?", (doc_key,))
+
+        documents_skipped.inc(sync_plan.skipped_documents)
+        chunks_skipped.inc(sync_plan.skipped_chunks)
+        chunks_added.inc(len(sync_plan.new_nodes))
+        chunks_deleted.inc(len(sync_plan.stale_node_ids))
+
+    def retain(self, node_ids: Set[str]) -> int:
+        """
+        Forget documents that have chunks missing from `node_ids` (the nodes
+        actually in the index), so they are re-ingested next time. Returns the
+        number of documents forgotten.
+        """
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute("SELECT doc_key, node_id FROM chunk").fetchall()
+            missing = {doc_key for doc_key, node_id in rows if node_id not in node_ids}
+            for doc_key in missing:
+                conn.execute("DELETE FROM chunk WHERE doc_key = ?", (doc_key,))
+                conn.execute("DELETE FROM document WHERE doc_key = ?", (doc_key,))
+        if missing:
+            logger.warning(
+                f"{len(missing)} documents in the ingestion manifest are not in "
+                f"the index and will be re-ingested"
+            )
+        return len(missing)
+
+
+def _combine(*hashes: str) -> str:
+    return hashlib.sha256("".join(hashes).encode("utf-8")).hexdigest()
+
+
+async def sync_documents(
+    documents: Sequence[Document],
+    vector_store: BasePydanticVectorStore,
+    manifest: IngestionManifest,
+    transformations: Optional[Sequence[TransformComponent]] = None,
+    embed_model: Optional[BaseEmbedding] = None,
+    delete_missing: bool = False,
+    embed_batch_size: int = settings.INGEST_EMBED_BATCH_SIZE,
+) -> SyncPlan:
+    """
+    Incrementally bring `vector_store` in line with `documents`: embed and
+    upsert only new or modified chunks, then delete stale ones.
+    """
+    transformations = transformations or Settings.transformations
+    embed_model = embed_model or Settings.embed_model
+
+    sync_plan = await asyncio.to_thread(
+        manifest.plan, documents, transformations, delete_missing
+    )
+    logger.info(f"Ingestion plan: {sync_plan.summary()}")
+
+    new_nodes = sync_plan.new_nodes
+    for start in range(0, len(new_nodes), embed_batch_size):
+        end = start + embed_batch_size
+        batch = new_nodes[start:end]
+        embeddings = await embed_model.aget_text_embedding_batch(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        )
+        for node, embedding in zip(batch, embeddings):
+            node.embedding = embedding
+        await vector_store.async_add(batch)
+
+    stale_node_ids = sync_plan.stale_node_ids
+    if stale_node_ids:
+        await vector_store.adelete_nodes(node_ids=stale_node_ids)
+
+    await asyncio.to_thread(manifest.commit, sync_plan)
+    return sync_plan
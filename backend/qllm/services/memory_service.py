@@ -1,24 +1,46 @@
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
-from uuid import uuid4
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
 
 from llama_index.core.embeddings import BaseEmbedding
-from llama_index.core.schema import NodeWithScore
-from llama_index.core.vector_stores.types import VectorStore
-from sqlalchemy import select
+from llama_index.core.schema import NodeWithScore, TextNode
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchAny,
+    MatchValue,
+    PointStruct,
+)
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from qllm.core.config import settings
+from qllm.core.vector_store import get_async_qdrant_client
 from qllm.models.model import Memory, MemoryIndex, MemoryType
 
+# (content, memory_type, metadata, importance_score)
+MemoryInput = Tuple[Dict[str, Any], MemoryType, Optional[Dict], float]
+
 
 class MemoryService:
+    """
+    Long-term user memories stored in Postgres with their embeddings in Qdrant.
+    All Qdrant calls go through the async client so they never block the event loop.
+    """
+
     def __init__(
-        self, db: AsyncSession, vector_store: VectorStore, embed_model: BaseEmbedding
+        self,
+        db: AsyncSession,
+        embed_model: BaseEmbedding,
+        aclient: Optional[AsyncQdrantClient] = None,
+        collection_name: str = settings.MEMORY_COLLECTION_NAME,
     ):
         self.db = db
-        self.vector_store = vector_store
+        self.aclient = aclient or get_async_qdrant_client()
         self.embed_model = embed_model
+        self.collection_name = collection_name
 
     async def add_memory(
         self,
@@ -31,31 +53,61 @@ class MemoryService:
         """
         Thêm một memory mới cho user.
         """
-        # Tạo embedding cho content
-        text_content = str(content)  # Convert content to string for embedding
-        embedding = await self.embed_model.aembed_query(text_content)
-
-        # Tạo memory record
-        memory = Memory(
-            id=str(uuid4()),
-            user_id=user_id,
-            type=memory_type,
-            content=content,
-            metadata=metadata or {},
-            embedding=embedding,
-            importance_score=importance_score,
+        memories = await self.add_memories(
+            user_id, [(content, memory_type, metadata, importance_score)]
         )
+        return memories[0]
+
+    async def add_memories(
+        self, user_id: str, items: List[MemoryInput]
+    ) -> List[Memory]:
+        """
+        Thêm nhiều memory cùng lúc: một lần embed theo batch, một lần commit
+        và một lần upsert vào Qdrant.
+        """
+        # Tạo embedding cho content
+        texts = [str(content) for content, _, _, _ in items]
+        embeddings = await self.embed_model.aget_text_embedding_batch(texts)
+
+        memories = [
+            Memory(
+                id=uuid4(),
+                user_id=user_id,
+                type=memory_type,
+                content=content,
+                meta_data=metadata or {},
+                embedding=embedding,
+                importance_score=importance_score,
+            )
+            for (content, memory_type, metadata, importance_score), embedding in zip(
+                items, embeddings
+            )
+        ]
 
         # Lưu vào database
-        self.db.add(memory)
+        self.db.add_all(memories)
         await self.db.commit()
 
         # Lưu vào vector store
-        self.vector_store.add(
-            [text_content], [embedding], [{"memory_id": memory.id, "user_id": user_id}]
+        await self.aclient.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(
+                    id=str(memory.id),
+                    vector=embedding,
+                    payload={
+                        "text": text,
+                        "memory_id": str(memory.id),
+                        "user_id": str(user_id),
+                        "type": memory.type.value,
+                    },
+                )
+                for memory, text, embedding in zip(memories, texts, embeddings)
+            ],
+            wait=False,
         )
 
-        return memory
+        return memories
 
     async def query_memories(
         self,
@@ -68,29 +120,55 @@ class MemoryService:
         Tìm kiếm các memories liên quan đến query.
         """
         # Tạo embedding cho query
-        query_embedding = await self.embed_model.aembed_query(query)
+        query_embedding = await self.embed_model.aget_query_embedding(query)
 
         # Tìm kiếm trong vector store
-        filter_dict = {"user_id": user_id}
+        conditions = [
+            FieldCondition(key="user_id", match=MatchValue(value=str(user_id)))
+        ]
         if memory_type:
-            filter_dict["type"] = memory_type.value
-
-        results = self.vector_store.similarity_search_with_score(
-            query_embedding, k=top_k, filter=filter_dict
+            conditions.append(
+                FieldCondition(key="type", match=MatchValue(value=memory_type.value))
+            )
+
+        response = await self.aclient.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            query_filter=Filter(must=conditions),
+            limit=top_k,
+            with_payload=True,
         )
+        results = [
+            NodeWithScore(
+                node=TextNode(
+                    id_=str(point.id),
+                    text=point.payload.get("text", ""),
+                    metadata=point.payload,
+                ),
+                score=point.score,
+            )
+            for point in response.points
+        ]
 
         # Cập nhật last_accessed cho các memories được truy xuất
-        for node in results:
-            memory_id = node.metadata["memory_id"]
-            stmt = select(Memory).where(Memory.id == memory_id)
-            memory = (await self.db.execute(stmt)).scalar_one_or_none()
-            if memory:
-                memory.last_accessed = datetime.utcnow()
-
-        await self.db.commit()
+        await self._touch_memories([node.metadata["memory_id"] for node in results])
 
         return results
 
+    async def _touch_memories(self, memory_ids: List[str]):
+        """
+        Cập nhật last_accessed của các memories bằng một câu UPDATE duy nhất.
+        """
+        if not memory_ids:
+            return
+
+        await self.db.execute(
+            update(Memory)
+            .where(Memory.id.in_([UUID(str(memory_id)) for memory_id in memory_ids]))
+            .values(last_accessed=datetime.utcnow())
+        )
+        await self.db.commit()
+
     async def update_memory_importance(self, memory_id: str, importance_delta: float):
         """
         Cập nhật điểm quan trọng của memory.
@@ -110,17 +188,36 @@ class MemoryService:
         """
         cutoff_date = datetime.utcnow() - timedelta(days=threshold_days)
 
-        stmt = select(Memory).where(
+        stmt = select(Memory.id).where(
             Memory.user_id == user_id,
             Memory.last_accessed < cutoff_date,
             Memory.importance_score < importance_threshold,
         )
 
-        old_memories = (await self.db.execute(stmt)).scalars().all()
-
-        # Xóa từ vector store và database
-        for memory in old_memories:
-            await self.db.delete(memory)
-            self.vector_store.delete(filter={"memory_id": memory.id})
-
+        old_memory_ids = [str(memory_id) for memory_id in (await self.db.scalars(stmt))]
+        if not old_memory_ids:
+            return
+
+        # Xóa từ vector store và database, mỗi nơi một lệnh
+        await self.aclient.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(
+                    must=[
+                        FieldCondition(
+                            key="user_id", match=MatchValue(value=str(user_id))
+                        ),
+                        FieldCondition(
+                            key="memory_id", match=MatchAny(any=old_memory_ids)
+                        ),
+                    ]
+                )
+            ),
+            wait=False,
+        )
+        await self.db.execute(
+            delete(Memory).where(
+                Memory.id.in_([UUID(memory_id) for memory_id in old_memory_ids])
+            )
+        )
         await self.db.commit()
@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncGenerator, Dict, List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import insert, update
+
+from qllm.core.config import settings
+from qllm.core.database import async_session_maker
+from qllm.core.metrics import metrics
+from qllm.models import model
+
+logger = logging.getLogger("uvicorn")
+
+checkpoint_writes = metrics.counter(
+    "message_checkpoint_writes_total",
+    "Partial assistant answers queued for writing while streaming",
+)
+writer_batch_size = metrics.histogram(
+    "message_writer_batch_size",
+    "Operations written per message writer transaction",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+writer_batch_seconds = metrics.histogram(
+    "message_writer_batch_seconds", "Latency of message writer transactions"
+)
+writer_errors = metrics.counter(
+    "message_writer_errors_total", "Message writer transactions that failed"
+)
+writer_failed_ops = metrics.counter(
+    "message_writer_failed_ops_total",
+    "Message operations that failed even when written on their own",
+)
+stale_messages_swept = metrics.counter(
+    "stale_messages_swept_total",
+    "PENDING assistant messages marked as ERROR by the stale sweeper",
+)
+
+# Các câu trả lời đang được stream trong process này, dùng cho resume
+active_streams: Dict[UUID, "MessageStream"] = {}
+# Giữ tham chiếu tới các task finish chạy nền để không bị GC
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def message_values(message: model.Message) -> Dict:
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "content": message.content,
+        "role": message.role,
+        "status": message.status,
+        "created_at": message.created_at,
+        "updated_at": message.updated_at,
+    }
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Tránh cảnh báo "exception was never retrieved" với fire_and_forget
+    if not future.cancelled():
+        future.exception()
+
+
+@dataclass
+class WriteOp:
+    kind: str  # "insert" | "update"
+    values: List[Dict]
+    done: asyncio.Future
+
+
+class MessageWriter:
+    """
+    Single background writer for chat messages. Inserts and updates are queued
+    and written in order; everything queued while a transaction runs goes into
+    the next one (one bulk INSERT + one bulk UPDATE per transaction), so request
+    handlers never wait on a commit unless they await the returned future.
+    When a batch fails it is rolled back and its operations are retried one per
+    transaction, so only the futures of the failing operations get the error.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.MESSAGE_WRITER_BATCH_SIZE,
+        max_queue_size: int = settings.MESSAGE_WRITER_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        metrics.gauge(
+            "message_writer_queue_depth",
+            "Message writes waiting for the background writer",
+            fn=lambda: self._queue.qsize() if self._queue else 0,
+        )
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Write everything still queued, then stop the background task.
+        """
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        self._task = None
+        self._queue = None
+
+    async def insert(self, *messages: model.Message) -> asyncio.Future:
+        return await self._put(
+            "insert", [message_values(message) for message in messages]
+        )
+
+    async def update(
+        self, message_id: UUID, content: str, status: model.MessageStatusEnum
+    ) -> asyncio.Future:
+        return await self._put(
+            "update",
+            [
+                {
+                    "id": message_id,
+                    "content": content,
+                    "status": status,
+                    "updated_at": utcnow(),
+                }
+            ],
+        )
+
+    async def _put(self, kind: str, values: List[Dict]) -> asyncio.Future:
+        """
+        Queue a write and return a future resolved once it is committed.
+        """
+        await self.start()
+        done = asyncio.get_running_loop().create_future()
+        done.add_done_callback(_consume_exception)
+        await self._queue.put(WriteOp(kind=kind, values=values, done=done))
+        return done
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._write(batch)
+                for op in batch:
+                    if not op.done.done():
+                        op.done.set_result(None)
+            except Exception as e:
+                writer_errors.inc()
+                if len(batch) == 1:
+                    self._fail(batch[0], e)
+                else:
+                    # Batch gồm message của nhiều user: một dòng lỗi (FK sau khi
+                    # xoá conversation, id cũ...) không được kéo theo các dòng khác
+                    logger.warning(
+                        f"Failed to write {len(batch)} message operations, "
+                        f"retrying them one by one: {e}"
+                    )
+                    await self._write_each(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_each(self, batch: List[WriteOp]) -> None:
+        # Giữ đúng thứ tự: update của một message luôn sau insert của nó
+        for op in batch:
+            try:
+                await self._write([op])
+            except Exception as e:
+                self._fail(op, e)
+            else:
+                if not op.done.done():
+                    op.done.set_result(None)
+
+    def _fail(self, op: WriteOp, error: Exception) -> None:
+        writer_failed_ops.inc()
+        ids = [values["id"] for values in op.values]
+        logger.error(f"Failed to {op.kind} messages {ids}: {error}")
+        if not op.done.done():
+            op.done.set_exception(error)
+
+    async def _write(self, batch: List[WriteOp]) -> None:
+        inserts = [
+            values for op in batch if op.kind == "insert" for values in op.values
+        ]
+        # Chỉ giữ lần cập nhật cuối cùng của mỗi message
+        updates = {
+            values["id"]: values
+            for op in batch
+            if op.kind == "update"
+            for values in op.values
+        }
+
+        writer_batch_size.observe(len(batch))
+        with writer_batch_seconds.time():
+            async with async_session_maker() as db:
+                if inserts:
+                    await db.execute(insert(model.Message), inserts)
+                if updates:
+                    await db.execute(update(model.Message), list(updates.values()))
+                await db.commit()
+
+
+message_writer = MessageWriter()
+
+
+class MessageStream:
+    """
+    Tokens of an assistant message being streamed. Tokens are kept in a list and
+    checkpointed to the Message row by a background task every
+    `checkpoint_tokens` tokens or `checkpoint_seconds`, so appending never waits
+    on the database. Without new tokens (planning, slow first token) the row is
+    still touched every `heartbeat_seconds`, so the stale sweeper of another
+    worker never takes a live answer for a crashed one. Reconnecting clients can
+    `follow` the stream from an offset.
+    """
+
+    def __init__(
+        self,
+        message_id: UUID,
+        conversation_id: Optional[UUID] = None,
+        checkpoint_tokens: int = settings.STREAM_CHECKPOINT_TOKENS,
+        checkpoint_seconds: float = settings.STREAM_CHECKPOINT_SECONDS,
+        heartbeat_seconds: float = settings.STREAM_HEARTBEAT_SECONDS,
+    ):
+        self.message_id = message_id
+        self.conversation_id = conversation_id
+        self.checkpoint_tokens = checkpoint_tokens
+        self.checkpoint_seconds = checkpoint_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.tokens: List[str] = []
+        self.status = model.MessageStatusEnum.PENDING
+        self.done = False
+
+        self._written_tokens = 0
+        self._written_at = time.monotonic()
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "MessageStream":
+        active_streams[self.message_id] = self
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def content(self) -> str:
+        return "".join(self.tokens)
+
+    def append(self, token: str) -> None:
+        self.tokens.append(token)
+        if len(self.tokens) - self._written_tokens >= self.checkpoint_tokens:
+            self._wake.set()
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self) -> None:
+        while not self.done:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.checkpoint_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.done:
+                continue
+            if len(self.tokens) == self._written_tokens and (
+                time.monotonic() - self._written_at < self.heartbeat_seconds
+            ):
+                continue
+            await self._write(model.MessageStatusEnum.PENDING)
+
+    async def _write(self, status: model.MessageStatusEnum) -> asyncio.Future:
+        self._written_tokens = len(self.tokens)
+        self._written_at = time.monotonic()
+        checkpoint_writes.inc()
+        return await message_writer.update(self.message_id, self.content(), status)
+
+    async def finish(self, status: model.MessageStatusEnum, wait: bool = False) -> None:
+        """
+        Stop checkpointing and queue the final content and status. With `wait`
+        the call returns only once they are committed.
+        """
+        if self.done:
+            return
+        self.done = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+
+        written = await self._write(status)
+        self.status = status
+        active_streams.pop(self.message_id, None)
+        self._notify()
+        if wait:
+            await written
+
+    def finish_in_background(self, status: model.MessageStatusEnum) -> None:
+        """
+        Dùng khi generator bị đóng (client ngắt kết nối) và không thể await.
+        """
+        if self.done:
+            return
+        task = asyncio.create_task(self.finish(status))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def follow(self, offset: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yield the content from character `offset`, then every new token until
+        the stream finishes.
+        """
+        content = self.content()
+        index = len(self.tokens)
+        if content[offset:]:
+            yield content[offset:]
+
+        while True:
+            changed = self._changed
+            if index < len(self.tokens):
+                yield "".join(self.tokens[index:])
+                index = len(self.tokens)
+            elif self.status != model.MessageStatusEnum.PENDING:
+                return
+            else:
+                await changed.wait()
+
+
+async def sweep_stale_messages(
+    stale_seconds: float = settings.STREAM_STALE_SECONDS,
+) -> int:
+    """
+    Mark assistant messages that stayed PENDING without a checkpoint for more
+    than `stale_seconds` (crashed worker) as ERROR, keeping their partial content.
+    """
+    cutoff = utcnow() - timedelta(seconds=stale_seconds)
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(model.Message)
+            .where(
+                model.Message.role == model.MessageRoleEnum.ASSISTANT,
+                model.Message.status == model.MessageStatusEnum.PENDING,
+                model.Message.updated_at < cutoff,
+                model.Message.id.not_in(list(active_streams)),
+            )
+            .values(status=model.MessageStatusEnum.ERROR, updated_at=utcnow())
+        )
+        await db.commit()
+
+    if result.rowcount:
+        stale_messages_swept.inc(result.rowcount)
+        logger.info(f"Marked {result.rowcount} stale PENDING messages as ERROR")
+    return result.rowcount
+
+
+async def run_stale_message_sweeper(
+    interval_seconds: float = settings.STREAM_SWEEP_INTERVAL_SECONDS,
+):
+    """
+    Background task started from the app lifespan.
+    """
+    while True:
+        try:
+            await sweep_stale_messages()
+        except Exception as e:
+            logger.warning(f"Stale message sweep failed: {e}")
+        await asyncio.sleep(interval_seconds)
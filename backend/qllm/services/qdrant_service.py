@@ -1,8 +1,27 @@
 import logging
+from typing import Any, Dict, Optional
 
+from llama_index.vector_stores.qdrant.base import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
 from qdrant_client import AsyncQdrantClient
-from qdrant_client.http.exceptions import UnexpectedResponse
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    Distance,
+    HnswConfigDiff,
+    KeywordIndexParams,
+    KeywordIndexType,
+    Modifier,
+    QuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVectorParams,
+    VectorParams,
+    VectorParamsDiff,
+)
 
 from qllm.core.config import settings
 
@@ -12,50 +31,269 @@ logger = logging.getLogger("uvicorn")
 logger = logging.getLogger(__name__)
 
 
-async def init_qdrant():
+# Trường payload dùng để tách dữ liệu theo bệnh nhân (tenant)
+TENANT_FIELD = "user_id"
+
+
+def payload_indexes(collection_name: str) -> Dict[str, KeywordIndexParams]:
+    """
+    Keyword indexes for the payload fields each collection is filtered on.
+    """
+    indexes = {
+        TENANT_FIELD: KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+    }
+    if collection_name == settings.MEMORY_COLLECTION_NAME:
+        # MemoryService lọc theo user_id, type và memory_id
+        fields = ("type", "memory_id")
+    else:
+        # doc_id: QdrantVectorStore xoá node theo ref_doc_id
+        fields = ("medical_record_id", "doc_id")
+    for field in fields:
+        indexes[field] = KeywordIndexParams(type=KeywordIndexType.KEYWORD)
+    return indexes
+
+
+def quantization_config(
+    mode: str = settings.QDRANT_QUANTIZATION,
+) -> Optional[QuantizationConfig]:
+    """
+    Qdrant quantization config for `none`, `scalar` (int8) or `binary`.
+    """
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=settings.QDRANT_SCALAR_QUANTILE,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
+        )
+    if mode == "binary":
+        return BinaryQuantization(
+            binary=BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def search_params(mode: str = settings.QDRANT_QUANTIZATION) -> Optional[SearchParams]:
     """
-    Initialize Qdrant client asynchronously, check if the 'document' collection exists,
-    and create it only if it does not exist.
+    Search params of a collection quantized with `mode`: oversample on the
+    quantized vectors, then rescore the candidates with the original ones.
     """
+    if mode == "none":
+        if settings.QDRANT_SEARCH_HNSW_EF is None:
+            return None
+        return SearchParams(hnsw_ef=settings.QDRANT_SEARCH_HNSW_EF)
+    return SearchParams(
+        hnsw_ef=settings.QDRANT_SEARCH_HNSW_EF,
+        quantization=QuantizationSearchParams(
+            rescore=settings.QDRANT_SEARCH_RESCORE,
+            oversampling=settings.QDRANT_SEARCH_OVERSAMPLING,
+        ),
+    )
+
+
+def collection_quantization(collection_name: str) -> str:
+    # Chỉ collection tài liệu được lượng tử hoá, collection memory nhỏ và cần
+    # độ chính xác đầy đủ
+    if collection_name == settings.COLLECTION_NAME:
+        return settings.QDRANT_QUANTIZATION
+    return "none"
+
+
+def collection_hybrid(collection_name: str) -> bool:
+    return (
+        collection_name == settings.COLLECTION_NAME and settings.QDRANT_HYBRID_ENABLED
+    )
+
+
+def collection_config(
+    vector_size: int = settings.EMBEDDING_DIM,
+    quantization: str = "none",
+    hybrid: bool = False,
+) -> Dict[str, Any]:
+    """
+    Keyword arguments of `create_collection` built from ApplicationSetting.
+    Hybrid collections use the named dense and sparse vectors QdrantVectorStore
+    writes; BM25 IDF is computed by Qdrant (`Modifier.IDF`).
+    """
+    vectors_config = VectorParams(
+        size=vector_size,
+        distance=Distance.COSINE,
+        on_disk=settings.QDRANT_VECTORS_ON_DISK,
+    )
+    hybrid_config = {}
+    if hybrid:
+        vectors_config = {DENSE_VECTOR_NAME: vectors_config}
+        hybrid_config["sparse_vectors_config"] = {
+            SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+        }
+    return {
+        "vectors_config": vectors_config,
+        **hybrid_config,
+        "hnsw_config": HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            payload_m=settings.QDRANT_HNSW_PAYLOAD_M,
+            on_disk=settings.QDRANT_HNSW_ON_DISK,
+        ),
+        "on_disk_payload": settings.QDRANT_PAYLOAD_ON_DISK,
+        "quantization_config": quantization_config(quantization),
+    }
+
+
+async def ensure_payload_indexes(client: AsyncQdrantClient, collection_name: str):
+    """
+    Create the missing payload indexes of a collection (existing ones are kept).
+    """
+    info = await client.get_collection(collection_name=collection_name)
+    existing = info.payload_schema or {}
+    for field_name, field_schema in payload_indexes(collection_name).items():
+        if field_name in existing:
+            continue
+        logger.info(f"Creating payload index '{collection_name}.{field_name}'")
+        await client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+            wait=True,
+        )
+
+
+async def ensure_collection(client: AsyncQdrantClient, collection_name: str):
+    """
+    Create the collection only if it does not exist, then make sure its payload
+    indexes exist.
+    """
+    if await client.collection_exists(collection_name=collection_name):
+        logger.info(
+            f"Collection '{collection_name}' already exists. Skipping creation."
+        )
+        info = await client.get_collection(collection_name=collection_name)
+        if collection_hybrid(collection_name) and not info.config.params.sparse_vectors:
+            # Qdrant không thêm được vector mới vào collection đã có
+            logger.warning(
+                f"Collection '{collection_name}' has no sparse vectors, hybrid "
+                "search needs a new collection: set COLLECTION_NAME and re-ingest."
+            )
+    else:
+        logger.info(
+            f"Collection '{collection_name}' does not exist. Creating it now..."
+        )
+        await client.create_collection(
+            collection_name=collection_name,
+            **collection_config(
+                quantization=collection_quantization(collection_name),
+                hybrid=collection_hybrid(collection_name),
+            ),
+        )
+        logger.info(f"New collection '{collection_name}' created.")
+
+    if settings.QDRANT_PAYLOAD_INDEXES_ENABLED:
+        await ensure_payload_indexes(client, collection_name)
+
+
+async def migrate_collection(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    quantization: str,
+    vectors_on_disk: Optional[bool] = None,
+):
+    """
+    Switch an existing collection to another quantization mode in place. Qdrant
+    rebuilds the quantized vectors in the background; searches keep working on
+    the current segments meanwhile. With quantization, moving the original
+    vectors to disk (`vectors_on_disk`) is what actually frees the RAM.
+    """
+    info = await client.get_collection(collection_name=collection_name)
+    logger.info(
+        f"Migrating '{collection_name}' ({info.points_count} points) "
+        f"to quantization={quantization}"
+    )
+    vectors_config = None
+    if vectors_on_disk is not None:
+        # Vector không đặt tên có key là "", collection hybrid dùng vector dense
+        # có tên
+        vector_name = ""
+        if isinstance(info.config.params.vectors, dict):
+            vector_name = DENSE_VECTOR_NAME
+        vectors_config = {vector_name: VectorParamsDiff(on_disk=vectors_on_disk)}
+    await client.update_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        quantization_config=quantization_config(quantization) or Disabled.DISABLED,
+    )
+    info = await client.get_collection(collection_name=collection_name)
+    logger.info(
+        f"Collection '{collection_name}' status: {info.status}, "
+        f"quantization: {info.config.quantization_config}"
+    )
+
+
+def create_client() -> AsyncQdrantClient:
     if settings.QDRANT_API_KEY and settings.QDRANT_URL:
         logger.info("Vector store using Qdrant Cloud")
-        client = AsyncQdrantClient(
+        return AsyncQdrantClient(
             url=settings.QDRANT_URL,
             api_key=settings.QDRANT_API_KEY,
         )
 
-    elif not settings.QDRANT_HOST or not settings.QDRANT_PORT:
+    if not settings.QDRANT_HOST or not settings.QDRANT_PORT:
         raise Exception("Missing Qdrant configuration.")
 
-    else:
-        logger.info(
-            f"Vector store using local Qdrant: {settings.QDRANT_HOST}:{settings.QDRANT_PORT}"
-        )
-        client = AsyncQdrantClient(port=settings.QDRANT_PORT, host=settings.QDRANT_HOST)
+    logger.info(
+        "Vector store using local Qdrant: "
+        f"{settings.QDRANT_HOST}:{settings.QDRANT_PORT}"
+    )
+    return AsyncQdrantClient(port=settings.QDRANT_PORT, host=settings.QDRANT_HOST)
 
-    # Check if the collection exists
-    try:
-        await client.get_collection(collection_name="document")
-        logger.info("Collection 'document' already exists. Skipping creation.")
-    except UnexpectedResponse as e:
-        if "404" in str(e):
-            # Collection does not exist, create it
-            logger.info("Collection 'document' does not exist. Creating it now...")
-            await client.create_collection(
-                collection_name="document",
-                vectors_config=VectorParams(
-                    size=settings.EMBEDDING_DIM, distance=Distance.COSINE
-                ),
-            )
-            logger.info("New collection 'document' created.")
-        else:
-            raise e  # Re-raise other errors
+
+async def init_qdrant():
+    """
+    Initialize Qdrant client asynchronously, check if the document and memory
+    collections exist, and create them only if they do not exist.
+    """
+    client = create_client()
+    for collection_name in (settings.COLLECTION_NAME, settings.MEMORY_COLLECTION_NAME):
+        await ensure_collection(client, collection_name)
 
     return client
 
 
+async def migrate(collection_name: str, quantization: str, vectors_on_disk):
+    client = create_client()
+    try:
+        await migrate_collection(client, collection_name, quantization, vectors_on_disk)
+    finally:
+        await client.close()
+
+
 if __name__ == "__main__":
-    # Initialize Qdrant
+    import argparse
     import asyncio
 
-    asyncio.run(init_qdrant())
+    parser = argparse.ArgumentParser(description="Qdrant collection management")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("init", help="create the collections and payload indexes")
+    migrate_parser = commands.add_parser(
+        "migrate", help="change the quantization of an existing collection"
+    )
+    migrate_parser.add_argument("--collection", default=settings.COLLECTION_NAME)
+    migrate_parser.add_argument(
+        "--quantization",
+        choices=("none", "scalar", "binary"),
+        default=settings.QDRANT_QUANTIZATION,
+    )
+    migrate_parser.add_argument(
+        "--vectors-on-disk", action=argparse.BooleanOptionalAction, default=None
+    )
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        asyncio.run(migrate(args.collection, args.quantization, args.vectors_on_disk))
+    else:
+        # Initialize Qdrant
+        asyncio.run(init_qdrant())
@@ -0,0 +1,141 @@
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from uuid import UUID
+
+from cachetools import TTLCache
+
+from qllm.core.config import settings
+from qllm.core.metrics import metrics
+from qllm.models.model import User
+
+logger = logging.getLogger("uvicorn")
+
+cache_hits = metrics.counter(
+    "user_cache_hits_total", "Authenticated users served from the user cache"
+)
+cache_misses = metrics.counter(
+    "user_cache_misses_total", "Authenticated users loaded from the database"
+)
+
+# Chỉ cache các cột cần cho request, không cache password_hash
+CACHED_FIELDS = ("id", "email", "created_at", "updated_at")
+
+
+def to_snapshot(user: User) -> Dict:
+    return {field: getattr(user, field) for field in CACHED_FIELDS}
+
+
+def from_snapshot(snapshot: Dict) -> User:
+    """
+    Build a detached User from a snapshot. Never add it to a session.
+    """
+    return User(**snapshot)
+
+
+class UserCache:
+    """
+    Short-lived cache of authenticated users keyed by the token subject (email).
+    In-process TTLCache by default, or Redis (USER_CACHE_REDIS_URL) so that all
+    workers share entries and invalidations.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 60,
+        max_size: int = 10000,
+        redis_url: Optional[str] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._local: TTLCache = TTLCache(maxsize=max_size, ttl=ttl_seconds)
+        self._redis = None
+        if redis_url:
+            # redis chỉ cần khi chạy nhiều worker, import khi được cấu hình
+            try:
+                from redis import asyncio as aioredis
+            except ImportError:
+                raise ImportError(
+                    "USER_CACHE_REDIS_URL is set but `redis` is not installed. "
+                    "Install it with `pip install redis`."
+                )
+            self._redis = aioredis.from_url(redis_url)
+
+        metrics.gauge(
+            "user_cache_entries",
+            "Entries currently held by the in-process user cache",
+            fn=lambda: len(self._local),
+        )
+
+    @classmethod
+    def from_settings(cls) -> "UserCache":
+        return cls(
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            max_size=settings.USER_CACHE_MAX_SIZE,
+            redis_url=settings.USER_CACHE_REDIS_URL,
+        )
+
+    @staticmethod
+    def _key(subject: str) -> str:
+        return f"qllm:user:{subject}"
+
+    async def get(self, subject: str) -> Optional[User]:
+        snapshot = self._local.get(subject)
+        if snapshot is None and self._redis is not None:
+            raw = await self._redis.get(self._key(subject))
+            if raw is not None:
+                snapshot = self._loads(raw)
+
+        if snapshot is None:
+            cache_misses.inc()
+            return None
+        cache_hits.inc()
+        return from_snapshot(snapshot)
+
+    async def set(self, subject: str, user: User) -> None:
+        snapshot = to_snapshot(user)
+        if self._redis is not None:
+            await self._redis.set(
+                self._key(subject), self._dumps(snapshot), ex=int(self.ttl_seconds)
+            )
+        else:
+            self._local[subject] = snapshot
+
+    async def invalidate(self, subject: str) -> None:
+        self._local.pop(subject, None)
+        if self._redis is not None:
+            await self._redis.delete(self._key(subject))
+
+    @staticmethod
+    def _dumps(snapshot: Dict) -> str:
+        return json.dumps(
+            {
+                "id": str(snapshot["id"]),
+                "email": snapshot["email"],
+                "created_at": snapshot["created_at"].isoformat(),
+                "updated_at": snapshot["updated_at"].isoformat(),
+            }
+        )
+
+    @staticmethod
+    def _loads(raw) -> Dict:
+        data = json.loads(raw)
+        return {
+            "id": UUID(data["id"]),
+            "email": data["email"],
+            "created_at": datetime.fromisoformat(data["created_at"]),
+            "updated_at": datetime.fromisoformat(data["updated_at"]),
+        }
+
+
+user_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> Optional[UserCache]:
+    """
+    Process-wide user cache, None when USER_CACHE_ENABLED is off.
+    """
+    global user_cache
+    if user_cache is None and settings.USER_CACHE_ENABLED:
+        user_cache = UserCache.from_settings()
+    return user_cache
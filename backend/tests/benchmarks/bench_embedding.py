@@ -0,0 +1,76 @@
+"""
+Throughput of concurrent embedding requests with and without the coalescing
+embedding service.
+
+Simulates many coroutines (chat turns, memory lookups, sub-questions) each
+embedding one text against a rate-limited fake model; a share of the texts
+repeat, as identical sub-questions and memories do:
+
+    python -m tests.benchmarks.bench_embedding
+    python -m tests.benchmarks.bench_embedding --requests 5000 --unique 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from llama_index.core.embeddings import BaseEmbedding
+
+from qllm.services.embedding_service import CoalescingEmbedding
+from tests.benchmarks.fakes import FakeEmbedding
+
+
+async def run_once(embed_model: BaseEmbedding, texts, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(text: str):
+        async with semaphore:
+            await embed_model.aget_query_embedding(text)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request(text) for text in texts))
+    return time.perf_counter() - started
+
+
+async def run(requests: int, unique: int, concurrency: int, max_wait_ms: float):
+    random.seed(0)
+    texts = [f"question {random.randrange(unique)}" for _ in range(requests)]
+
+    fake = FakeEmbedding()
+    models = {
+        "direct": fake,
+        "coalescing": CoalescingEmbedding(
+            fake, max_batch_size=64, max_wait_ms=max_wait_ms, query_as_text=True
+        ),
+        "coalescing (no cache)": CoalescingEmbedding(
+            fake,
+            max_batch_size=64,
+            max_wait_ms=max_wait_ms,
+            cache_size=1,
+            query_as_text=True,
+        ),
+    }
+    for name, embed_model in models.items():
+        fake.reset()
+        elapsed = await run_once(embed_model, texts, concurrency)
+        print(
+            f"{name:<22} requests={requests} model_calls={fake.calls} "
+            f"texts_embedded={fake.texts} "
+            f"throughput={requests / elapsed:.0f} req/s elapsed={elapsed:.2f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--unique", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.unique, args.concurrency, args.max_wait_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Queries/sec of the index service while writers keep inserting documents.
+
+Compares the old BaseManager handlers (a query engine built per query and run
+on a server thread, every insert embedding and persisting under a global lock)
+with IndexService (cached query engine, readers–writer lock, batched inserts,
+deferred persist). Uses the fake embedding model and LLM, so it runs offline:
+
+    python -m tests.benchmarks.bench_index_service
+    python -m tests.benchmarks.bench_index_service --readers 32 --writers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from llama_index.core.settings import Settings
+
+from qllm.index import IndexService, load_documents
+from tests.benchmarks.fakes import FakeEmbedding, FakeLLM, offline_splitter
+
+QUERIES = [
+    "What is the normal blood pressure range?",
+    "How is type 2 diabetes treated?",
+    "Which symptoms suggest anemia?",
+    "What are the side effects of statins?",
+]
+
+
+def write_document(directory: str, number: int) -> str:
+    path = os.path.join(directory, f"doc_{number}.txt")
+    with open(path, "w") as f:
+        f.write(
+            "\n\n".join(
+                f"Section {i} of document {number}. "
+                + "Patients with hypertension should monitor blood pressure. " * 20
+                for i in range(5)
+            )
+        )
+    return path
+
+
+class LegacyIndex:
+    """The handlers of the old BaseManager server."""
+
+    def __init__(self, service: IndexService):
+        self.index = service.index
+        self.index_dir = service.index_dir
+        self.lock = threading.Lock()
+
+    def query(self, query_text: str):
+        query_engine = self.index.as_query_engine()
+        return query_engine.query(query_text)
+
+    def insert(self, filepath: str):
+        documents = load_documents(filepath)
+        with self.lock:
+            for document in documents:
+                self.index.insert(document)
+            self.index.storage_context.persist(self.index_dir)
+
+
+async def load_test(query, insert, readers, writers, seconds, incoming):
+    latencies = []
+    inserts = 0
+    numbers = count()
+    deadline = time.perf_counter() + seconds
+
+    async def reader(i: int):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await query(QUERIES[i % len(QUERIES)])
+            latencies.append(time.perf_counter() - started)
+
+    async def writer():
+        nonlocal inserts
+        while time.perf_counter() < deadline:
+            path = write_document(incoming, next(numbers))
+            await insert(path)
+            inserts += 1
+
+    await asyncio.gather(
+        *(reader(i) for i in range(readers)), *(writer() for _ in range(writers))
+    )
+    latencies.sort()
+    return {
+        "qps": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "inserts": inserts,
+    }
+
+
+def report(name: str, stats: dict):
+    print(
+        f"{name:<14} queries/s={stats['qps']:.0f} p50={stats['p50_ms']:.0f}ms "
+        f"p95={stats['p95_ms']:.0f}ms inserts={stats['inserts']}"
+    )
+
+
+async def run(readers: int, writers: int, seconds: float, documents: int):
+    Settings.embed_model = FakeEmbedding(call_latency_ms=50)
+    Settings.llm = FakeLLM(latency_ms=200)
+    Settings.transformations = [offline_splitter()]
+    Settings.tokenizer = str.split
+
+    for mode in ("legacy", "index service"):
+        with tempfile.TemporaryDirectory() as tmp:
+            document_dir = os.path.join(tmp, "documents")
+            incoming = os.path.join(tmp, "incoming")
+            os.makedirs(document_dir)
+            os.makedirs(incoming)
+            for number in range(documents):
+                write_document(document_dir, -number - 1)
+
+            service = IndexService(
+                index_dir=os.path.join(tmp, "index"),
+                document_dir=document_dir,
+                manifest_path=os.path.join(tmp, "manifest.sqlite3"),
+                persist_interval_seconds=1.0,
+            )
+            await service.start()
+
+            if mode == "legacy":
+                legacy = LegacyIndex(service)
+                # BaseManager phục vụ mỗi kết nối trên một thread riêng
+                pool = ThreadPoolExecutor(max_workers=readers + writers)
+                loop = asyncio.get_running_loop()
+
+                async def query(text):
+                    return await loop.run_in_executor(pool, legacy.query, text)
+
+                async def insert(path):
+                    return await loop.run_in_executor(pool, legacy.insert, path)
+
+                stats = await load_test(
+                    query, insert, readers, writers, seconds, incoming
+                )
+                pool.shutdown()
+            else:
+                stats = await load_test(
+                    service.query, service.insert, readers, writers, seconds, incoming
+                )
+            await service.stop()
+            report(mode, stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--documents", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.readers, args.writers, args.seconds, args.documents))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Latency of per-user filtered search with and without payload indexes.
+
+Fills two collections with the same random points spread over `--tenants`
+users: one created like `ensure_collection` does (keyword payload indexes, tenant
+field), one with only `VectorParams`. Each is searched unfiltered and filtered
+on `user_id`. Runs in Qdrant's local in-process mode by default:
+
+    python -m tests.benchmarks.bench_qdrant_filter
+    python -m tests.benchmarks.bench_qdrant_filter --points 1000000
+
+Local mode brute-forces every search and ignores payload indexes and HNSW, so
+both collections behave the same there; pass `--url http://localhost:6333` to
+measure the indexed collection against a real server.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PointStruct,
+    VectorParams,
+)
+
+from qllm.services.qdrant_service import (
+    TENANT_FIELD,
+    collection_config,
+    ensure_payload_indexes,
+)
+
+UPSERT_BATCH_SIZE = 1000
+
+
+async def fill(client: AsyncQdrantClient, collection_name: str, vectors, tenants):
+    for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+        end = start + UPSERT_BATCH_SIZE
+        await client.upsert(
+            collection_name=collection_name,
+            points=[
+                PointStruct(
+                    id=i,
+                    vector=vectors[i].tolist(),
+                    payload={TENANT_FIELD: f"user-{tenants[i]}", "doc_id": str(i)},
+                )
+                for i in range(start, min(end, len(vectors)))
+            ],
+            wait=True,
+        )
+
+
+async def search(client, collection_name, queries, tenants, filtered, top_k):
+    latencies = []
+    for i, query in enumerate(queries):
+        query_filter = None
+        if filtered:
+            query_filter = Filter(
+                must=[
+                    FieldCondition(
+                        key=TENANT_FIELD,
+                        match=MatchValue(value=f"user-{i % tenants}"),
+                    )
+                ]
+            )
+        started = time.perf_counter()
+        await client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            query_filter=query_filter,
+            limit=top_k,
+        )
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+async def run(points, dim, tenants, queries, top_k, url):
+    client = (
+        AsyncQdrantClient(url=url) if url else AsyncQdrantClient(location=":memory:")
+    )
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((points, dim), dtype=np.float32)
+    point_tenants = rng.integers(0, tenants, size=points)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+
+    indexed = "bench_filter_indexed"
+    plain = "bench_filter_plain"
+    for collection_name in (indexed, plain):
+        if await client.collection_exists(collection_name):
+            await client.delete_collection(collection_name)
+
+    started = time.perf_counter()
+    await client.create_collection(indexed, **collection_config(dim))
+    await ensure_payload_indexes(client, indexed)
+    await client.create_collection(
+        plain, vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+    )
+    for collection_name in (indexed, plain):
+        await fill(client, collection_name, vectors, point_tenants)
+    print(
+        f"{points} points, dim={dim}, {tenants} tenants "
+        f"({'server ' + url if url else 'local mode'}), "
+        f"loaded in {time.perf_counter() - started:.1f}s"
+    )
+
+    for collection_name in (indexed, plain):
+        for filtered in (False, True):
+            stats = await search(
+                client, collection_name, query_vectors, tenants, filtered, top_k
+            )
+            label = f"{collection_name[len('bench_filter_'):]} "
+            label += "filtered" if filtered else "unfiltered"
+            print(
+                f"{label:<20} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms"
+            )
+
+    for collection_name in (indexed, plain):
+        await client.delete_collection(collection_name)
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(args.points, args.dim, args.tenants, args.queries, args.top_k, args.url)
+    )
+
+
+if __name__ == "__main__":
+    main()
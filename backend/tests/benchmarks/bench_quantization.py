@@ -0,0 +1,238 @@
+"""
+Recall and latency of the document collection's quantization modes.
+
+Builds a clustered synthetic dataset (embedding-like: a few hundred topics,
+unit-normalised) and, for `none`, `scalar` (int8) and `binary`, reports
+recall@k against exact search, search latency and vector memory, with and
+without oversampling + full-precision rescoring:
+
+    python -m tests.benchmarks.bench_quantization
+    python -m tests.benchmarks.bench_quantization --points 50000 --oversampling 3
+
+Qdrant's local in-process mode ignores quantization, so by default the modes
+are simulated with numpy the way Qdrant scores them (int8 with a 0.99
+quantile range, sign bits compared by agreement). Only recall and memory carry
+over from the simulation; `--url http://localhost:6333` measures latency on a
+real server with collections created by `collection_config`.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    CollectionStatus,
+    PointStruct,
+    QuantizationSearchParams,
+    SearchParams,
+)
+
+from qllm.core.config import settings
+from qllm.services.qdrant_service import collection_config
+
+MODES = ("none", "scalar", "binary")
+UPSERT_BATCH_SIZE = 500
+
+
+def synthetic_dataset(points: int, dim: int, queries: int, topics: int = 200):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    data = centers[rng.integers(0, topics, size=points)]
+    data += 0.6 * rng.standard_normal((points, dim), dtype=np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    query_vectors = data[rng.integers(0, points, size=queries)]
+    # Nhiễu có chuẩn ~0.3 so với vector đơn vị
+    query_vectors = query_vectors + 0.3 / np.sqrt(dim) * rng.standard_normal(
+        (queries, dim), dtype=np.float32
+    )
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    query_vectors = query_vectors.astype(np.float32)
+    return data, query_vectors
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class SimulatedCollection:
+    """Quantized copy of the dataset scored like Qdrant scores it."""
+
+    def __init__(self, data: np.ndarray, mode: str):
+        self.data = data
+        self.mode = mode
+        if mode == "scalar":
+            self.low, self.high = np.quantile(
+                data,
+                [
+                    (1 - settings.QDRANT_SCALAR_QUANTILE) / 2,
+                    (1 + settings.QDRANT_SCALAR_QUANTILE) / 2,
+                ],
+            )
+            self.quantized = self._scalar(data)
+            # numpy không có phép nhân ma trận int8 nhanh, chấm điểm trên bản
+            # float32 của giá trị đã lượng tử hoá
+            self.scoring = self.quantized.astype(np.float32)
+        elif mode == "binary":
+            self.quantized = np.packbits(data > 0, axis=1)
+            self.scoring = np.where(data > 0, 1.0, -1.0).astype(np.float32)
+
+    def _scalar(self, vectors: np.ndarray) -> np.ndarray:
+        scaled = (vectors - self.low) / (self.high - self.low) * 255 - 128
+        return np.clip(np.rint(scaled), -128, 127).astype(np.int8)
+
+    @property
+    def vector_bytes(self) -> int:
+        if self.mode == "none":
+            return self.data.shape[1] * 4
+        return self.quantized.shape[1]
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.mode == "scalar":
+            return self.scoring @ self._scalar(query).astype(np.float32)
+        # Tích của hai vector ±1 = số bit trùng dấu trừ số bit khác dấu
+        return self.scoring @ np.where(query > 0, 1.0, -1.0).astype(np.float32)
+
+    def search(self, query: np.ndarray, limit: int, oversampling: float, rescore):
+        if self.mode == "none":
+            return top_k(self.data @ query, limit)
+        scores = self._approximate_scores(query)
+        if not rescore:
+            return top_k(scores, limit)
+        candidates = top_k(scores, int(limit * oversampling))
+        exact = self.data[candidates] @ query
+        return candidates[np.argsort(-exact)[:limit]]
+
+
+def recall(found, expected) -> float:
+    return len(set(found.tolist()) & set(expected.tolist())) / len(expected)
+
+
+def report(label: str, recalls, latencies, vector_bytes=None):
+    latencies = sorted(latencies)
+    line = (
+        f"{label:<24} recall={statistics.mean(recalls):.3f} "
+        f"p50={statistics.median(latencies) * 1000:.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms"
+    )
+    if vector_bytes is not None:
+        line += f" bytes/vector={vector_bytes}"
+    print(line)
+
+
+def run_simulated(data, query_vectors, limit, oversampling):
+    expected = [top_k(data @ query, limit) for query in query_vectors]
+    for mode in MODES:
+        collection = SimulatedCollection(data, mode)
+        variants = (
+            [("", False)] if mode == "none" else [("", False), (" rescore", True)]
+        )
+        for suffix, rescore in variants:
+            recalls, latencies = [], []
+            for query, truth in zip(query_vectors, expected):
+                started = time.perf_counter()
+                found = collection.search(query, limit, oversampling, rescore)
+                latencies.append(time.perf_counter() - started)
+                recalls.append(recall(found, truth))
+            report(mode + suffix, recalls, latencies, collection.vector_bytes)
+
+
+async def run_server(url, data, query_vectors, limit, oversampling):
+    client = AsyncQdrantClient(url=url)
+    dim = data.shape[1]
+    collections = {mode: f"bench_quantization_{mode}" for mode in MODES}
+    for mode, collection_name in collections.items():
+        if await client.collection_exists(collection_name):
+            await client.delete_collection(collection_name)
+        await client.create_collection(
+            collection_name, **collection_config(dim, quantization=mode)
+        )
+        for start in range(0, len(data), UPSERT_BATCH_SIZE):
+            await client.upsert(
+                collection_name=collection_name,
+                points=[
+                    PointStruct(id=i, vector=data[i].tolist())
+                    for i in range(start, min(start + UPSERT_BATCH_SIZE, len(data)))
+                ],
+            )
+        # Chờ Qdrant build xong HNSW và vector lượng tử hoá
+        while (
+            await client.get_collection(collection_name)
+        ).status != CollectionStatus.GREEN:
+            await asyncio.sleep(0.5)
+
+    async def search(collection_name, query, params):
+        response = await client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            limit=limit,
+            search_params=params,
+        )
+        return np.array([point.id for point in response.points])
+
+    expected = [
+        await search(collections["none"], query, SearchParams(exact=True))
+        for query in query_vectors
+    ]
+    for mode, collection_name in collections.items():
+        variants = [("", None)]
+        if mode != "none":
+            variants = [
+                (
+                    "",
+                    SearchParams(quantization=QuantizationSearchParams(rescore=False)),
+                ),
+                (
+                    " rescore",
+                    SearchParams(
+                        quantization=QuantizationSearchParams(
+                            rescore=True, oversampling=oversampling
+                        )
+                    ),
+                ),
+            ]
+        for suffix, params in variants:
+            recalls, latencies = [], []
+            for query, truth in zip(query_vectors, expected):
+                started = time.perf_counter()
+                found = await search(collection_name, query, params)
+                latencies.append(time.perf_counter() - started)
+                recalls.append(recall(found, truth))
+            report(mode + suffix, recalls, latencies)
+
+    for collection_name in collections.values():
+        await client.delete_collection(collection_name)
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--oversampling", type=float, default=settings.QDRANT_SEARCH_OVERSAMPLING
+    )
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    data, query_vectors = synthetic_dataset(args.points, args.dim, args.queries)
+    print(
+        f"{args.points} points, dim={args.dim}, top_k={args.top_k}, "
+        f"oversampling={args.oversampling} "
+        f"({'server ' + args.url if args.url else 'numpy simulation'})"
+    )
+    if args.url:
+        asyncio.run(
+            run_server(args.url, data, query_vectors, args.top_k, args.oversampling)
+        )
+    else:
+        run_simulated(data, query_vectors, args.top_k, args.oversampling)
+
+
+if __name__ == "__main__":
+    main()
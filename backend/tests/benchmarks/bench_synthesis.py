@@ -0,0 +1,109 @@
+"""
+LLM calls and wall time of compact, tree_summarize and refine synthesis.
+
+Synthesizes an answer over synthetic medical-record chunks with a local fake
+LLM (fixed latency per call, configurable context window) and reports, for
+every SYNTHESIS_MODE, the LLM calls, prompt characters and wall time relative
+to compact (the llama_index default used before SYNTHESIS_MODE existed), plus
+time to first token of streaming compact and tree_summarize:
+
+    python -m tests.benchmarks.bench_synthesis
+    python -m tests.benchmarks.bench_synthesis --chunks 40 --context-window 2048
+
+A small context window forces several packs, so tree_summarize has to answer
+them concurrently and summarize the answers in a second pass.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.settings import Settings
+
+from qllm.chat.history import count_tokens
+from qllm.chat.synthesizer import get_medical_response_synth
+from tests.benchmarks.bench_hybrid_retrieval import synthetic_records
+from tests.benchmarks.fakes import FakeLLM
+
+# compact là mặc định cũ, dùng làm mốc so sánh
+MODES = ("compact", "tree_summarize", "refine")
+QUERY = "Tóm tắt diễn biến HbA1c và thuốc điều trị tiểu đường của tôi trong năm qua"
+
+
+def synthetic_chunks(chunks: int, chunk_tokens: int) -> List[NodeWithScore]:
+    records = iter(synthetic_records(chunks * 50, users=1))
+    nodes = []
+    for i in range(chunks):
+        text = ""
+        while count_tokens(text) < chunk_tokens:
+            text += next(records).text + " "
+        nodes.append(
+            NodeWithScore(node=TextNode(text=text.strip()), score=1.0 - i / 100)
+        )
+    return nodes
+
+
+async def run(chunks, chunk_tokens, context_window, latency_ms, max_pack_tokens):
+    llm = FakeLLM(latency_ms=latency_ms, context_window=context_window)
+    Settings.llm = llm
+    nodes = synthetic_chunks(chunks, chunk_tokens)
+    print(
+        f"{chunks} chunks of ~{chunk_tokens} tokens, context window "
+        f"{context_window}, {latency_ms:.0f}ms per LLM call"
+    )
+
+    baseline = None
+    for mode in MODES:
+        synth = get_medical_response_synth(mode=mode, max_pack_tokens=max_pack_tokens)
+        llm.reset()
+        started = time.perf_counter()
+        await synth.asynthesize(QueryBundle(QUERY), nodes)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(
+            f"{mode:<24} calls={llm.calls:<4} prompt_chars={llm.prompt_chars:<8} "
+            f"wall={elapsed * 1000:.0f}ms ({elapsed / baseline:.2f}x compact)"
+        )
+
+    for mode in ("compact", "tree_summarize"):
+        synth = get_medical_response_synth(
+            streaming=True, mode=mode, max_pack_tokens=max_pack_tokens
+        )
+        llm.reset()
+        started = time.perf_counter()
+        response = await synth.asynthesize(QueryBundle(QUERY), nodes)
+        first_token = None
+        async for _ in response.async_response_gen():
+            if first_token is None:
+                first_token = time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        print(
+            f"{mode + ' (stream)':<24} calls={llm.calls:<4} "
+            f"first_token={first_token * 1000:.0f}ms wall={elapsed * 1000:.0f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--context-window", type=int, default=4096)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--max-pack-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            args.chunks,
+            args.chunk_tokens,
+            args.context_window,
+            args.latency_ms,
+            args.max_pack_tokens,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
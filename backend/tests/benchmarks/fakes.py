@@ -0,0 +1,255 @@
+"""
+Local stand-ins for remote models, used by the benchmarks.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import Embedding
+from llama_index.core.base.llms.generic_utils import (
+    completion_response_to_chat_response,
+)
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from pydantic import PrivateAttr
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding model with API-like latency: every call costs
+    `call_latency_ms` plus `per_text_latency_ms` per text, and at most
+    `max_concurrency` calls run at once (rate-limited endpoint).
+    """
+
+    embed_dim: int = 8
+    call_latency_ms: float = 20.0
+    per_text_latency_ms: float = 0.2
+    max_concurrency: int = 8
+
+    _calls: int = PrivateAttr(default=0)
+    _texts: int = PrivateAttr(default=0)
+    _semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def texts(self) -> int:
+        return self._texts
+
+    def reset(self) -> None:
+        self._calls = 0
+        self._texts = 0
+        self._semaphore = None
+
+    def _vector(self, text: str) -> Embedding:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255 for b in digest[: self.embed_dim]]
+
+    def _latency(self, count: int) -> float:
+        return (self.call_latency_ms + self.per_text_latency_ms * count) / 1000
+
+    def _embed(self, texts: List[str]) -> List[Embedding]:
+        self._calls += 1
+        self._texts += len(texts)
+        time.sleep(self._latency(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def _aembed(self, texts: List[str]) -> List[Embedding]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self._calls += 1
+            self._texts += len(texts)
+            await asyncio.sleep(self._latency(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed(texts)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aembed([query]))[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed([text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aembed(texts)
+
+
+class TopicEmbedding(BaseEmbedding):
+    """
+    Offline embedding with some semantics: the normalised mean of a fixed random
+    vector per word. Digits are masked first (E11.9 -> e##.#), imitating how
+    dense models place texts on the same topic close together but blur exact
+    codes, drug doses and lab values.
+    """
+
+    embed_dim: int = 256
+
+    _word_vectors: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TopicEmbedding"
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode()).digest()[:8], "big")
+            vector = np.random.default_rng(seed).standard_normal(self.embed_dim)
+            self._word_vectors[word] = vector
+        return vector
+
+    def _vector(self, text: str) -> Embedding:
+        words = re.findall(r"\w+(?:[.\-/]\w+)*", re.sub(r"\d", "#", text.lower()))
+        if not words:
+            return [0.0] * self.embed_dim
+        vector = np.mean([self._word_vector(word) for word in words], axis=0)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._vector(text)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._vector(query)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return self._vector(text)
+
+
+class FakeLLM(CustomLLM):
+    """
+    LLM answering with a fixed text after `latency_ms`; async calls sleep
+    without blocking the event loop. Counts calls and prompt characters.
+    """
+
+    latency_ms: float = 20.0
+    answer: str = "This is a fake answer."
+    context_window: int = 16384
+    num_output: int = 256
+
+    _calls: int = PrivateAttr(default=0)
+    _prompt_chars: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=self.num_output,
+            model_name="fake",
+        )
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def prompt_chars(self) -> int:
+        return self._prompt_chars
+
+    def reset(self) -> None:
+        self._calls = 0
+        self._prompt_chars = 0
+
+    def _record(self, prompt: str) -> None:
+        self._calls += 1
+        self._prompt_chars += len(prompt)
+
+    @llm_completion_callback()
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        self._record(prompt)
+        time.sleep(self.latency_ms / 1000)
+        return CompletionResponse(text=self.answer)
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        response = self.complete(prompt, formatted=formatted)
+
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for token in response.text.split(" "):
+                text += token + " "
+                yield CompletionResponse(text=text, delta=token + " ")
+
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        self._record(prompt)
+        await asyncio.sleep(self.latency_ms / 1000)
+        return CompletionResponse(text=self.answer)
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        response = await self.acomplete(prompt, formatted=formatted)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            for token in response.text.split(" "):
+                text += token + " "
+                yield CompletionResponse(text=text, delta=token + " ")
+
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponse:
+        prompt = self.messages_to_prompt(messages)
+        return completion_response_to_chat_response(
+            await self.acomplete(prompt, formatted=True)
+        )
+
+
+def offline_splitter(chunk_size: int = 256, chunk_overlap: int = 20):
+    """
+    SentenceSplitter that needs no tokenizer or NLTK downloads.
+    """
+    from llama_index.core.node_parser import SentenceSplitter
+
+    return SentenceSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        tokenizer=str.split,
+        chunking_tokenizer_fn=lambda text: text.split(". "),
+    )
@@ -0,0 +1,7 @@
+import os
+
+# Giá trị tối thiểu để qllm.core.config import được khi chạy test
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("BACKEND_CORS_ORIGINS", "http://localhost")
+os.environ.setdefault("FRONTEND_HOST", "http://localhost:3000")
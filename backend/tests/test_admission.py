@@ -0,0 +1,89 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from qllm.api.routers import conversation
+from qllm.core.concurrency import AdmissionController, AdmissionRejected
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def controller(**kwargs) -> AdmissionController:
+    options = dict(max_concurrency=1, max_queue=10, max_queue_per_key=10)
+    options.update(kwargs)
+    return AdmissionController("test_admission", **options)
+
+
+async def test_slots_alternate_between_users():
+    admission = controller()
+    release = await admission.acquire("holder")
+    order = []
+
+    async def request(key: str) -> None:
+        async with admission.slot(key):
+            order.append(key)
+
+    # alice gửi một loạt request trước, bob gửi sau
+    tasks = [asyncio.create_task(request("alice")) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("bob")))
+    await asyncio.sleep(0)
+
+    release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["alice", "bob", "alice", "alice"]
+
+
+async def test_full_queue_is_rejected_with_retry_after():
+    admission = controller(max_queue=2, max_queue_per_key=1, retry_after=7)
+    release = await admission.acquire("holder")
+    waiter = asyncio.create_task(admission.acquire("alice"))
+    await asyncio.sleep(0)
+
+    # alice đã có một request đang chờ
+    with pytest.raises(AdmissionRejected) as e:
+        await admission.acquire("alice")
+    assert e.value.retry_after == 7
+
+    bob = asyncio.create_task(admission.acquire("bob"))
+    await asyncio.sleep(0)
+    # Hàng đợi chung đã đầy
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire("carol")
+
+    release()
+    (await waiter)()
+    (await bob)()
+
+
+async def test_waiting_too_long_is_rejected():
+    admission = controller(timeout=0.01)
+    release = await admission.acquire("holder")
+
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire("alice")
+
+    # Request hết hạn đã rời hàng đợi, slot được trả lại bình thường
+    release()
+    (await admission.acquire("alice"))()
+
+
+async def test_admit_chat_returns_429_when_rejected(monkeypatch):
+    admission = controller(max_queue=0, retry_after=3)
+    monkeypatch.setattr(conversation, "chat_admission", admission)
+    release = await conversation.admit_chat(uuid4())
+
+    with pytest.raises(HTTPException) as e:
+        await conversation.admit_chat(uuid4())
+    assert e.value.status_code == 429
+    assert e.value.headers == {"Retry-After": "3"}
+
+    release()
@@ -0,0 +1,39 @@
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.core.settings import Settings
+
+from qllm.chat.engine import ChatEngineFactory
+from qllm.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def mock_models(monkeypatch):
+    monkeypatch.setattr(Settings, "_llm", MockLLM())
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+
+
+def test_planner_mode_does_not_build_the_agent(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_ENGINE_MODE", "planner")
+
+    factory = ChatEngineFactory()
+    chat_engine = factory.create()
+
+    assert factory.planner is not None
+    assert factory.agent_worker is None
+    assert factory.tools == []
+    assert chat_engine.agent is None
+
+
+def test_agent_mode_builds_the_agent_over_sub_question_engines(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_ENGINE_MODE", "agent")
+
+    factory = ChatEngineFactory()
+    chat_engine = factory.create()
+
+    assert factory.planner is None
+    assert [tool.metadata.name for tool in factory.tools] == [
+        "medical_records_engine",
+        "pubmed_engine",
+    ]
+    assert chat_engine.agent is not None
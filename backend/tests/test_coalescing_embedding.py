@@ -0,0 +1,104 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+from qllm.services.embedding_service import CoalescingEmbedding
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class StubEmbedding(BaseEmbedding):
+    """Records every batch and waits for `gate` before answering."""
+
+    _calls: List[List[str]] = PrivateAttr(default_factory=list)
+    _gate: asyncio.Event = PrivateAttr(default_factory=asyncio.Event)
+    _error: Optional[Exception] = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aget_text_embeddings([query]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._calls.append(list(texts))
+        await self._gate.wait()
+        if self._error is not None:
+            raise self._error
+        return [self._embed(text) for text in texts]
+
+
+@pytest.fixture
+def inner():
+    return StubEmbedding(model_name="stub")
+
+
+@pytest.fixture
+def service(inner):
+    return CoalescingEmbedding(inner, max_batch_size=8, max_wait_ms=1, cache_size=16)
+
+
+async def test_identical_texts_share_one_request(service, inner):
+    inner._gate.set()
+    results = await asyncio.gather(
+        service.aget_text_embedding("sốt"),
+        service.aget_text_embedding("sốt"),
+        service.aget_text_embedding("ho khan"),
+    )
+
+    assert results == [[3.0, 1.0], [3.0, 1.0], [7.0, 1.0]]
+    assert inner._calls == [["sốt", "ho khan"]]
+
+    # Lần sau lấy từ cache, không gọi model nữa
+    assert await service.aget_text_embedding("sốt") == [3.0, 1.0]
+    assert len(inner._calls) == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_others(service, inner):
+    first = asyncio.create_task(service.aget_text_embedding("đau đầu"))
+    second = asyncio.create_task(service.aget_text_embedding("đau đầu"))
+    while not inner._calls:
+        await asyncio.sleep(0.001)
+
+    first.cancel()
+    inner._gate.set()
+
+    assert await second == [7.0, 1.0]
+    assert first.cancelled()
+    assert inner._calls == [["đau đầu"]]
+
+
+async def test_failure_is_raised_to_every_waiter(service, inner):
+    inner._error = RuntimeError("model down")
+    inner._gate.set()
+    results = await asyncio.gather(
+        service.aget_text_embedding("sốt"),
+        service.aget_text_embedding("sốt"),
+        service.aget_text_embedding("ho khan"),
+        return_exceptions=True,
+    )
+
+    assert [type(r) for r in results] == [RuntimeError] * 3
+
+    # Lỗi không bị cache: lần sau gọi lại model
+    inner._error = None
+    assert await service.aget_text_embedding("sốt") == [3.0, 1.0]
+    assert len(inner._calls) == 2
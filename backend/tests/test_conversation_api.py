@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from qllm.api.deps import get_db
+from qllm.api.middlewares.jwt import get_current_active_user
+from qllm.api.routers.conversation import conversation_route
+from qllm.models import model
+from qllm.models.base import Base
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[
+                model.User.__table__,
+                model.Conversation.__table__,
+                model.Message.__table__,
+            ],
+        )
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user(session_maker):
+    async with session_maker() as db:
+        user = model.User(id=uuid4(), email="patient@example.com")
+        db.add(user)
+        await db.commit()
+    return user
+
+
+@pytest.fixture
+async def client(session_maker, user):
+    app = FastAPI()
+    app.include_router(conversation_route, prefix="/chat")
+
+    async def override_get_db():
+        async with session_maker() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+async def test_create_conversation(client, user):
+    response = await client.post("/chat")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["title"] == "New conversation"
+    assert body["user_id"] == str(user.id)
+    assert body["messages"] == []
+    assert body["next_cursor"] is None
+
+
+async def test_get_conversation_pages_messages(client, session_maker):
+    conversation_id = UUID((await client.post("/chat")).json()["id"])
+    start = datetime(2025, 1, 1)
+    async with session_maker() as db:
+        for i in range(3):
+            db.add(
+                model.Message(
+                    id=uuid4(),
+                    conversation_id=conversation_id,
+                    content=f"message {i}",
+                    role=model.MessageRoleEnum.USER,
+                    status=model.MessageStatusEnum.SUCCESS,
+                    created_at=start + timedelta(minutes=i),
+                    updated_at=start + timedelta(minutes=i),
+                )
+            )
+        await db.commit()
+
+    response = await client.get(f"/chat/{conversation_id}", params={"limit": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["content"] for m in body["messages"]] == ["message 1", "message 2"]
+    assert body["next_cursor"] is not None
+
+    response = await client.get(
+        f"/chat/{conversation_id}",
+        params={"limit": 2, "before": body["next_cursor"]},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["content"] for m in body["messages"]] == ["message 0"]
+    assert body["next_cursor"] is None
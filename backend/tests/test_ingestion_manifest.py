@@ -0,0 +1,91 @@
+from typing import List, Sequence
+
+import pytest
+from llama_index.core.schema import BaseNode, Document, TextNode, TransformComponent
+
+from qllm.services.ingestion_manifest import IngestionManifest
+
+
+class ParagraphSplitter(TransformComponent):
+    """Một chunk cho mỗi đoạn văn, không cần tokenizer."""
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs) -> List[BaseNode]:
+        return [
+            TextNode(text=paragraph)
+            for node in nodes
+            for paragraph in node.get_content().split("\n\n")
+        ]
+
+
+TRANSFORMATIONS = [ParagraphSplitter()]
+
+
+def document(doc_id: str, *paragraphs: str) -> Document:
+    return Document(text="\n\n".join(paragraphs), doc_id=doc_id)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.sqlite"))
+    manifest.commit(
+        manifest.plan(
+            [
+                document("diabetes", "Tiểu đường type 1", "Tiểu đường type 2"),
+                document("asthma", "Hen phế quản"),
+            ],
+            TRANSFORMATIONS,
+        )
+    )
+    return manifest
+
+
+def test_unchanged_documents_are_skipped(manifest):
+    plan = manifest.plan(
+        [
+            document("diabetes", "Tiểu đường type 1", "Tiểu đường type 2"),
+            document("asthma", "Hen phế quản"),
+        ],
+        TRANSFORMATIONS,
+    )
+
+    assert plan.skipped_documents == 2
+    assert plan.documents == []
+    assert plan.new_nodes == []
+    assert plan.stale_node_ids == []
+
+
+def test_modified_document_only_embeds_changed_chunks(manifest):
+    before = manifest.chunk_ids(["diabetes"])["diabetes"]
+    plan = manifest.plan(
+        [
+            document("diabetes", "Tiểu đường type 1", "Tiểu đường thai kỳ"),
+            document("asthma", "Hen phế quản"),
+        ],
+        TRANSFORMATIONS,
+    )
+
+    assert plan.skipped_documents == 1
+    assert plan.skipped_chunks == 1
+    assert [node.get_content() for node in plan.new_nodes] == ["Tiểu đường thai kỳ"]
+    # Chunk "type 2" cũ bị thay thế
+    assert len(plan.stale_node_ids) == 1
+    assert set(plan.stale_node_ids) < before
+
+    manifest.commit(plan)
+    after = manifest.chunk_ids(["diabetes"])["diabetes"]
+    assert after == (before - set(plan.stale_node_ids)) | {plan.new_nodes[0].node_id}
+
+
+def test_missing_documents_are_deleted_only_when_asked(manifest):
+    asthma_ids = sorted(manifest.chunk_ids(["asthma"])["asthma"])
+    documents = [document("diabetes", "Tiểu đường type 1", "Tiểu đường type 2")]
+
+    assert manifest.plan(documents, TRANSFORMATIONS).deleted_documents == {}
+
+    plan = manifest.plan(documents, TRANSFORMATIONS, delete_missing=True)
+    assert plan.deleted_documents == {"asthma": asthma_ids}
+    assert plan.stale_node_ids == asthma_ids
+
+    manifest.commit(plan)
+    assert "asthma" not in manifest.document_hashes()
+    assert manifest.chunk_ids(["asthma"]) == {"asthma": set()}
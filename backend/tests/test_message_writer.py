@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from qllm.models import model
+from qllm.models.base import Base
+from qllm.services import message_writer as writer_module
+from qllm.services.message_writer import MessageStream, MessageWriter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_maker(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[model.Message.__table__])
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(writer_module, "async_session_maker", session_maker)
+    yield session_maker
+    await engine.dispose()
+
+
+def message(message_id=None) -> model.Message:
+    now = datetime(2025, 1, 1)
+    return model.Message(
+        id=message_id or uuid4(),
+        conversation_id=uuid4(),
+        content="hello",
+        role=model.MessageRoleEnum.USER,
+        status=model.MessageStatusEnum.SUCCESS,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+async def test_failed_operation_does_not_fail_its_batch(session_maker):
+    existing = message()
+    async with session_maker() as db:
+        db.add(existing)
+        await db.commit()
+
+    writer = MessageWriter(batch_size=10)
+    good, bad, other = message(), message(existing.id), message()
+    # Được xếp hàng trước khi writer chạy nên nằm chung một batch
+    futures = [
+        await writer.insert(good),
+        await writer.insert(bad),
+        await writer.insert(other),
+        await writer.update(good.id, "edited", model.MessageStatusEnum.SUCCESS),
+    ]
+    await writer.stop()
+
+    assert futures[0].exception() is None
+    assert futures[1].exception() is not None
+    assert futures[2].exception() is None
+    assert futures[3].exception() is None
+    async with session_maker() as db:
+        rows = {m.id: m.content for m in await db.scalars(select(model.Message))}
+    assert rows == {existing.id: "hello", good.id: "edited", other.id: "hello"}
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.updates = []
+
+    async def update(self, message_id, content, status):
+        self.updates.append((content, status))
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+async def test_stream_without_tokens_is_checkpointed_on_heartbeat(monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(writer_module, "message_writer", writer)
+
+    # Chưa có token nào (đang lập kế hoạch) nhưng vẫn phải cập nhật updated_at
+    stream = MessageStream(
+        uuid4(), checkpoint_seconds=0.01, heartbeat_seconds=0.05
+    ).start()
+    await asyncio.sleep(0.2)
+    await stream.finish(model.MessageStatusEnum.SUCCESS)
+
+    heartbeats = writer.updates[:-1]
+    assert 2 <= len(heartbeats) <= 5
+    assert set(heartbeats) == {("", model.MessageStatusEnum.PENDING)}
+    assert writer.updates[-1] == ("", model.MessageStatusEnum.SUCCESS)
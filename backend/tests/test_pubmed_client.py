@@ -0,0 +1,57 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from example.pubmed_stub_server import StubHandler, efetch_xml, fake_ids
+from qllm.chat.tools.pubmed_cache import PubMedCache
+from qllm.chat.tools.pubmed_client import PubMedClient, parse_articles
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubHandler.requests_served = 0
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_articles_are_matched_by_id_not_position():
+    # efetch bỏ mất bài "2" và trả các bài còn lại theo thứ tự khác
+    content = efetch_xml(["3", "1", "99"]).encode()
+
+    articles = parse_articles(content, ["1", "2", "3"])
+
+    assert set(articles) == {"1", "3"}
+    assert articles["1"]["title"] == "Stub article 1"
+    assert articles["3"]["title"] == "Stub article 3"
+    assert "Body of stub article 3." in articles["3"]["text"]
+
+
+async def test_asearch_against_stub_server(stub_url, tmp_path):
+    cache = PubMedCache(str(tmp_path / "pubmed.sqlite3"))
+    client = PubMedClient(base_url=stub_url, api_key=None, cache=cache)
+    try:
+        documents = await client.asearch("metformin", max_results=2)
+        # Lần hai lấy từ cache, không gọi lại NCBI
+        cached = await client.asearch("metformin", max_results=2)
+    finally:
+        await client.aclose()
+
+    ids = fake_ids("metformin", 2)
+    assert [doc.metadata["Title of this paper"] for doc in documents] == [
+        f"Stub article {pmid}" for pmid in ids
+    ]
+    assert [doc.text for doc in cached] == [doc.text for doc in documents]
+    # Một esearch và một efetch gộp cho cả hai bài
+    assert StubHandler.requests_served == 2
@@ -0,0 +1,46 @@
+import pytest
+from llama_index.vector_stores.qdrant.base import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+from qdrant_client import AsyncQdrantClient
+
+from qllm.core.config import settings
+from qllm.services.qdrant_service import ensure_collection
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    # Qdrant chế độ local (in-memory) không hỗ trợ payload index
+    monkeypatch.setattr(settings, "QDRANT_PAYLOAD_INDEXES_ENABLED", False)
+    monkeypatch.setattr(settings, "QDRANT_QUANTIZATION", "none")
+    client = AsyncQdrantClient(location=":memory:")
+    yield client
+    await client.close()
+
+
+async def test_new_hybrid_collection_has_dense_and_sparse_vectors(client, monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_HYBRID_ENABLED", True)
+
+    await ensure_collection(client, settings.COLLECTION_NAME)
+
+    params = (await client.get_collection(settings.COLLECTION_NAME)).config.params
+    assert set(params.vectors) == {DENSE_VECTOR_NAME}
+    assert params.vectors[DENSE_VECTOR_NAME].size == settings.EMBEDDING_DIM
+    assert set(params.sparse_vectors) == {SPARSE_VECTOR_NAME}
+
+
+async def test_memory_collection_stays_dense_only(client, monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_HYBRID_ENABLED", True)
+
+    await ensure_collection(client, settings.MEMORY_COLLECTION_NAME)
+
+    params = (
+        await client.get_collection(settings.MEMORY_COLLECTION_NAME)
+    ).config.params
+    assert params.vectors.size == settings.EMBEDDING_DIM
+    assert not params.sparse_vectors
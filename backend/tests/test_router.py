@@ -0,0 +1,78 @@
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from qllm.chat.engine import ChatEngine
+from qllm.chat.router import QueryRouter, Route
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def router():
+    return QueryRouter(embedding_enabled=False)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "tác dụng phụ của metformin",
+        "HbA1c là gì",
+        "Bệnh tiểu đường type 2 có chữa khỏi được không?",
+        "What are the side effects of statins?",
+    ],
+)
+async def test_general_medical_questions_go_to_agent(router, message):
+    assert await router.route(message) == Route.AGENT
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Chỉ số HbA1c lần khám gần nhất của tôi là bao nhiêu?",
+        "Tôi đang dùng thuốc gì?",
+        "What was my last blood pressure reading?",
+    ],
+)
+async def test_own_record_questions_are_lookups(router, message):
+    assert await router.route(message) == Route.LOOKUP
+
+
+async def test_greetings_and_follow_ups(router):
+    history = [ChatMessage(role=MessageRole.USER, content="Tôi đang dùng thuốc gì?")]
+    assert await router.route("Xin chào bác sĩ") == Route.GREETING
+    assert await router.route("còn liều dùng thì sao?", history) == Route.FOLLOW_UP
+    # Không có lịch sử thì không phải câu hỏi nối tiếp
+    assert await router.route("còn liều dùng thì sao?") == Route.AGENT
+
+
+class StubRetriever:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    async def aretrieve(self, query_bundle):
+        return self.nodes
+
+
+def chat_engine(nodes) -> ChatEngine:
+    engine = ChatEngine.__new__(ChatEngine)
+    engine.router = QueryRouter(embedding_enabled=False)
+    engine.records_query_engine = StubRetriever(nodes)
+    return engine
+
+
+async def test_lookup_without_record_chunks_falls_back_to_agent():
+    message = "Kết quả xét nghiệm mỡ máu của tôi"
+    route, _, nodes = await chat_engine([])._route(message, None, None)
+    assert (route, nodes) == (Route.AGENT, [])
+
+    found = [NodeWithScore(node=TextNode(text="LDL 3.2 mmol/L"), score=0.9)]
+    route, query_bundle, nodes = await chat_engine(found)._route(message, None, None)
+    assert route == Route.LOOKUP
+    assert query_bundle.query_str == message
+    assert nodes == found
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from qllm.chat.cache import (
+    GLOBAL_SCOPE,
+    SemanticResponseCache,
+    resolve_cache_scope,
+    user_scope,
+)
+
+
+def unit(*values) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.mark.parametrize(
+    "tool_names", [["medical_records"], ["pubmed", "medical_records_engine"]]
+)
+def test_private_tool_answers_are_scoped_to_the_user(tool_names):
+    assert resolve_cache_scope(tool_names, "alice") == user_scope("alice")
+    # Không có user thì không được cache
+    assert resolve_cache_scope(tool_names, None) is None
+
+
+def test_public_tool_answers_are_global():
+    assert resolve_cache_scope(["pubmed"], "alice") == GLOBAL_SCOPE
+    assert resolve_cache_scope([], None) == GLOBAL_SCOPE
+
+
+def test_user_scoped_answer_is_not_served_to_other_users():
+    cache = SemanticResponseCache(similarity_threshold=0.9)
+    embedding = unit(1, 0, 0)
+    scope = resolve_cache_scope(["medical_records"], "alice")
+    cache.put(embedding, "kết quả xét nghiệm của tôi", "HbA1c 6.1%", scope=scope)
+
+    assert cache.get(embedding, "alice") == "HbA1c 6.1%"
+    assert cache.get(embedding, "bob") is None
+    assert cache.get(embedding) is None
+
+
+def test_global_answer_is_shared_and_threshold_applies():
+    cache = SemanticResponseCache(similarity_threshold=0.9)
+    cache.put(unit(1, 0, 0), "tiểu đường là gì", "Một bệnh chuyển hoá")
+
+    assert cache.get(unit(1, 0.1, 0), "bob") == "Một bệnh chuyển hoá"
+    assert cache.get(unit(0, 1, 0), "bob") is None
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+import llama_index.core
+import pytest
+from llama_index.core.base.llms.types import MessageRole
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from qllm.chat.engine import ConversationSummaryMemory
+from qllm.models import model
+from qllm.models.base import Base
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    # Một từ là một token
+    monkeypatch.setattr(llama_index.core, "global_tokenizer", str.split)
+
+
+@pytest.fixture
+async def session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[
+                model.User.__table__,
+                model.Conversation.__table__,
+                model.Message.__table__,
+            ],
+        )
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def acomplete(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=f"tóm tắt {len(self.prompts)}")
+
+
+async def test_fold_covers_messages_older_than_the_window(session_maker):
+    start = datetime(2025, 1, 1)
+    async with session_maker() as db:
+        user = model.User(id=uuid4(), email="patient@example.com")
+        conversation = model.Conversation(
+            id=uuid4(), title="c", user_id=user.id, created_at=start, updated_at=start
+        )
+        messages = [
+            model.Message(
+                id=uuid4(),
+                conversation_id=conversation.id,
+                content=f"tin nhắn {i}",
+                role=model.MessageRoleEnum.USER,
+                status=model.MessageStatusEnum.SUCCESS,
+                created_at=start + timedelta(minutes=i),
+                updated_at=start + timedelta(minutes=i),
+            )
+            for i in range(10)
+        ]
+        db.add_all([user, conversation, *messages])
+        await db.commit()
+
+        llm = RecordingLLM()
+        memory = ConversationSummaryMemory(
+            llm=llm, token_budget=10, keep_messages=2, window=4
+        )
+        chat_history = await memory.aload(db, conversation)
+
+    # 8 message cũ được gộp theo từng cửa sổ 4 message, không bỏ sót message nào
+    folded = "\n".join(llm.prompts)
+    assert len(llm.prompts) == 2
+    assert all(f"tin nhắn {i}\n" in folded + "\n" for i in range(8))
+    assert "tin nhắn 8" not in folded
+    assert conversation.summarized_until == messages[7].created_at
+    assert conversation.summary == "tóm tắt 2"
+
+    assert chat_history[0].role == MessageRole.SYSTEM
+    assert "tóm tắt 2" in chat_history[0].content
+    assert [m.content for m in chat_history[1:]] == ["tin nhắn 8", "tin nhắn 9"]